@@ -1,8 +1,10 @@
-from google import genai
 from google.genai import types
-from dotenv import load_dotenv
-import os
+from llm_client import generate
+from metrics import timed
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import json
+import os
 from typing_extensions import TypedDict, List
 from io import BytesIO
 from reportlab.lib.pagesizes import letter
@@ -10,8 +12,6 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, ListFlowable, ListItem
 from reportlab.lib import colors
 
-load_dotenv()
-
 class EssayProgress(TypedDict):
     """
     Represents the progress of a student based on past essays.
@@ -36,10 +36,36 @@ class AssignmentQuestions(TypedDict):
     expand_improve: str
     word_choice: List[str]
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+PROGRESS_MODEL = "gemini-2.0-pro-exp-02-05"
+# Bump when the progress prompts change so stored summaries are rebuilt
+PROGRESS_PROMPT_VERSION = "1"
+# Histories longer than this many characters are summarized with map-reduce
+PROGRESS_CHUNK_CHARS = int(os.getenv("PROGRESS_CHUNK_CHARS", "40000"))
+# Summaries merged per reduce call, and chunk/merge calls made at once
+PROGRESS_MERGE_FAN_IN = 4
+PROGRESS_MAP_WORKERS = int(os.getenv("PROGRESS_MAP_WORKERS", "4"))
 
-def analyze_student_progress(essays: List[str]):
-    prompt = f"""
+@timed("progress")
+def analyze_student_progress(essays: List[str], map_reduce: bool = None):
+    """
+    Summarize a student's recurring mistakes and improvements.
+    
+    Args:
+        essays (List[str]): Essays in the order they were written
+        map_reduce (bool, optional): Force map-reduce on or off; by default it is
+            used when the essays are longer than PROGRESS_CHUNK_CHARS
+    
+    Returns:
+        EssayProgress: The summary (or the raw response text if it wasn't valid JSON)
+    """
+    if map_reduce is None:
+        map_reduce = sum(len(essay) for essay in essays) > PROGRESS_CHUNK_CHARS
+    if map_reduce:
+        return analyze_student_progress_map_reduce(essays)
+    return _analyze_student_progress(essays)
+
+def _progress_prompt(essays: List[str]):
+    return f"""
             Analyze the following essays written by a student over time. 
             Identify:
             - Common recurring mistakes (list of strings)
@@ -49,9 +75,152 @@ def analyze_student_progress(essays: List[str]):
             {json.dumps(essays)}
             </essays>
             """
+
+def _analyze_student_progress(essays: List[str]):
+    response = generate(
+        model=PROGRESS_MODEL,
+        contents=[_progress_prompt(essays)],
+        config=types.GenerateContentConfig(
+            temperature=0,
+            response_mime_type="application/json",
+            response_schema=EssayProgress,
+        ),
+    )
+    
+    try:
+        return json.loads(response.text)
+    except json.JSONDecodeError:
+        print("Failed to parse response as JSON:", response.text)
+        return response.text
+
+def chunk_essays(essays: List[str], max_chars: int = None):
+    """Split essays, in order, into chunks of at most max_chars of text (one essay minimum)."""
+    max_chars = max_chars or PROGRESS_CHUNK_CHARS
+    chunks = []
+    size = 0
+    for essay in essays:
+        if chunks and size + len(essay) <= max_chars:
+            chunks[-1].append(essay)
+            size += len(essay)
+        else:
+            chunks.append([essay])
+            size = len(essay)
+    return chunks
+
+def merge_progress(summaries: List[EssayProgress]):
+    """Merge summaries of consecutive stretches of a student's essays into one."""
+    prompt = f"""
+            Each summary below describes a student's recurring mistakes and improvements over
+            a stretch of their essays, oldest stretch first. Merge them into one summary:
+            - Combine mistakes that describe the same problem
+            - Keep mistakes that still occur in the later stretches
+            - Treat mistakes that stop occurring in later stretches as improvements
+            
+            <summaries>
+            {json.dumps(summaries)}
+            </summaries>
+            """
     
-    response = client.models.generate_content(
-        model="gemini-2.0-pro-exp-02-05",
+    response = generate(
+        model=PROGRESS_MODEL,
+        contents=[prompt],
+        config=types.GenerateContentConfig(
+            temperature=0,
+            response_mime_type="application/json",
+            response_schema=EssayProgress,
+        ),
+    )
+    return _parse_progress(response)
+
+class ProgressParseError(ValueError):
+    """Raised inside map-reduce when a chunk or merge response is not valid JSON; holds the response text"""
+    def __init__(self, text):
+        super().__init__(f"Model returned a progress summary that is not valid JSON: {text[:200]}")
+        self.text = text
+
+def _parse_progress(response):
+    try:
+        progress = json.loads(response.text)
+    except json.JSONDecodeError:
+        progress = None
+    if not isinstance(progress, dict):
+        raise ProgressParseError(response.text)
+    return progress
+
+def analyze_student_progress_map_reduce(essays: List[str], chunk_chars: int = None,
+                                        fan_in: int = None, max_workers: int = None):
+    """
+    Summarize a long essay history without putting it in one prompt.
+    
+    Essays are split into chunks that are summarized in parallel (map), then
+    the summaries are merged `fan_in` at a time, level by level, until one is
+    left (reduce). Every prompt is bounded by the chunk size or fan-in, and
+    latency grows with the log of the history length rather than linearly.
+    
+    Returns:
+        EssayProgress: The summary, or like the single-call path, the raw
+        response text of the first chunk or merge that wasn't valid JSON
+    """
+    fan_in = max(2, fan_in or PROGRESS_MERGE_FAN_IN)
+    chunks = chunk_essays(essays, chunk_chars)
+    
+    def summarize(chunk):
+        response = generate(
+            model=PROGRESS_MODEL,
+            contents=[_progress_prompt(chunk)],
+            config=types.GenerateContentConfig(
+                temperature=0,
+                response_mime_type="application/json",
+                response_schema=EssayProgress,
+            ),
+        )
+        return _parse_progress(response)
+    
+    def reduce(group):
+        return group[0] if len(group) == 1 else merge_progress(group)
+    
+    with ThreadPoolExecutor(max_workers=max_workers or PROGRESS_MAP_WORKERS,
+                            thread_name_prefix='progress') as executor:
+        # Copy the caller's context into each call so scheduler priority and spans carry over
+        def run_all(function, items):
+            futures = [executor.submit(contextvars.copy_context().run, function, item) for item in items]
+            return [future.result() for future in futures]
+        
+        try:
+            level = run_all(summarize, chunks)
+            while len(level) > 1:
+                level = run_all(reduce, [level[i:i + fan_in] for i in range(0, len(level), fan_in)])
+        except ProgressParseError as e:
+            print("Failed to parse response as JSON:", e.text)
+            return e.text
+    return level[0]
+
+@timed("progress")
+def update_student_progress(progress: EssayProgress, essays: List[str]):
+    """
+    Fold newer essays into an existing progress summary.
+    
+    Only the summary and the new essays are sent, so the prompt stays the
+    same size however many essays the student wrote before.
+    """
+    prompt = f"""
+            Below is a summary of a student's recurring mistakes and improvements, built from
+            their earlier essays, followed by essays they wrote since. Update the summary:
+            - Keep mistakes that still occur in the newer essays
+            - Move mistakes the student no longer makes to improvements
+            - Add new recurring mistakes and notable improvements
+            
+            <summary>
+            {json.dumps(progress)}
+            </summary>
+            
+            <essays>
+            {json.dumps(essays)}
+            </essays>
+            """
+    
+    response = generate(
+        model=PROGRESS_MODEL,
         contents=[prompt],
         config=types.GenerateContentConfig(
             temperature=0,
@@ -66,6 +235,7 @@ def analyze_student_progress(essays: List[str]):
         print("Failed to parse response as JSON:", response.text)
         return response.text
 
+@timed("assignment")
 def generate_assignment_questions(common_mistakes: List[str]):
     """
     Generate a personalized writing assignment based on the provided common mistakes.
@@ -82,7 +252,7 @@ def generate_assignment_questions(common_mistakes: List[str]):
             </common_mistakes>
             """
     
-    response = client.models.generate_content(
+    response = generate(
         model="gemini-2.0-pro-exp-02-05",
         contents=[prompt],
         config=types.GenerateContentConfig(
@@ -98,6 +268,7 @@ def generate_assignment_questions(common_mistakes: List[str]):
         print("Failed to parse response as JSON:", response.text)
         return response.text
 
+@timed("pdf")
 def generate_assignment_pdf(assignment: AssignmentQuestions, due_date: str = None) -> bytes:
     """
     Generate a PDF blob containing the writing assignment.
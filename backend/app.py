@@ -1,26 +1,39 @@
-from flask import Flask, request, jsonify, send_file, render_template, Response
+from flask import Flask, request, jsonify, send_file, render_template, Response, g
 from werkzeug.utils import secure_filename
 import os
 import time
 import json
 import uuid
-import base64
 from datetime import datetime
-from queue import Queue
-import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import socket
+import threading
+import contextvars
 from flask_cors import CORS
 import PIL.Image
 from multimodal_extract_text import extract_text, clean_extracted_text  # Use the unified extraction function
-from scorer import grade_essay
-from grammar import corrections_from_essay
-from analyse_history import analyze_student_progress, generate_assignment_questions, generate_assignment_pdf
+from scorer import grade_essay, grade_essay_stream
+from grammar import check_grammar
+from local_checks import local_corrections
+from writing_style import determine_writing_style_hero, style_profile
+from style_profiles import fetch_essays, profile_essays, DEFAULT_PROFILE_ESSAYS, MAX_PROFILE_ESSAYS
 import logging
 from supabase_functions import get_supabase_client
+from progress_tracker import ProgressTracker, StudentScopeError
+from assignment_artifacts import AssignmentArtifacts, ASSIGNMENT_ID_PATTERN
+from job_queue import JobQueue, QueueFull
+from event_bus import create_event_bus
+from rubrics import get_registry, RubricError
+from batch_grading import grade_batch, fetch_ungraded_essays, checkpoint_path
+from essay_list import (PageCache, ListQueryError, parse_fields, parse_limit, parse_cursor,
+                        fetch_page, fetch_essay, render)
+from metrics import REGISTRY, HTTP_REQUEST_SECONDS, span, trace, start_trace, end_trace, log_event, log_payload
+from llm_scheduler import scheduler
+import result_cache
 
-# Configure logging
+# Configure logging; payloads are only logged at DEBUG, and then only a sample
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv('LOG_LEVEL', 'INFO').upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
@@ -33,43 +46,121 @@ UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'upload
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload
+app.config['UPLOAD_WORKERS'] = int(os.getenv('UPLOAD_WORKERS', '2'))
+app.config['UPLOAD_QUEUE_SIZE'] = int(os.getenv('UPLOAD_QUEUE_SIZE', '20'))
 
-# Store active sessions and their message queues
-sessions = {}
+# Background workers for PDF rendering + OCR, so uploads return immediately
+upload_jobs = JobQueue(
+    workers=app.config['UPLOAD_WORKERS'],
+    max_pending=app.config['UPLOAD_QUEUE_SIZE'],
+    name='upload'
+)
 
-# Lock for thread-safe session management
-session_lock = threading.Lock()
+# Whole-class grading runs one batch at a time; each batch is concurrent internally
+batch_jobs = JobQueue(workers=1, max_pending=5, retention=24 * 3600, name='batch')
 
-class MessageAnnouncer:
-    def __init__(self):
-        self.listeners = []
-        
-    def listen(self):
-        q = Queue(maxsize=5)
-        self.listeners.append(q)
-        return q
-        
-    def announce(self, msg):
-        # Don't block when listeners can't keep up
-        for i in reversed(range(len(self.listeners))):
-            try:
-                self.listeners[i].put_nowait(msg)
-            except:
-                del self.listeners[i]
+# Assignment questions + PDF are built off the request path and stored as files
+assignment_jobs = JobQueue(workers=2, max_pending=20, name='assignment')
+# Seconds /api/assignment-pdf waits for a build in progress before answering 202
+app.config['ASSIGNMENT_WAIT'] = float(os.getenv('ASSIGNMENT_WAIT', '60'))
+# Stored PDFs never change under the same id, so browsers may keep them
+app.config['ASSIGNMENT_MAX_AGE'] = 24 * 3600
 
-# Unified handler for both image and PDF uploads
-def handle_document_upload(session_id, file, is_pdf=False):
+# Load and validate every rubric version up front so a broken file fails at startup
+get_registry()
+
+# Shared pool for the LLM calls behind /api/essay-analysis
+analysis_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('ANALYSIS_WORKERS', '8')),
+    thread_name_prefix='analysis'
+)
+# Calls submitted to analysis_executor that haven't started yet
+analysis_waiting = 0
+analysis_waiting_lock = threading.Lock()
+
+def submit_analysis(fn, *args):
+    """Submit fn(*args) to analysis_executor in a copy of this context, counting it while it waits."""
+    global analysis_waiting
+    waiting = [True]
+    
+    def leave_queue():
+        global analysis_waiting
+        with analysis_waiting_lock:
+            if waiting[0]:
+                waiting[0] = False
+                analysis_waiting -= 1
+    
+    def run():
+        leave_queue()
+        return fn(*args)
+    
+    with analysis_waiting_lock:
+        analysis_waiting += 1
+    try:
+        future = analysis_executor.submit(contextvars.copy_context().run, run)
+    except Exception:
+        leave_queue()
+        raise
+    # Also covers calls cancelled before they started
+    future.add_done_callback(lambda _: leave_queue())
+    return future
+
+# Progress events per upload session, fanned out to SSE listeners. Set
+# EVENT_BUS=sqlite when running several worker processes on one host.
+event_bus = create_event_bus()
+
+# Rendered /api/list-essays pages, kept for LIST_CACHE_TTL seconds
+essay_pages = PageCache()
+
+# Rolling per-student progress summaries behind /api/student-progress
+progress_tracker = ProgressTracker()
+
+# Assignment PDFs keyed by the mistakes they target
+assignment_artifacts = AssignmentArtifacts(assignment_jobs)
+
+# Gauges read from the live objects whenever /metrics is scraped
+REGISTRY.callback('flair_queue_depth', 'Jobs waiting for a worker', ['queue'], lambda: {
+    ('upload',): upload_jobs.depth(),
+    ('batch',): batch_jobs.depth(),
+    ('assignment',): assignment_jobs.depth(),
+    ('analysis',): analysis_waiting,
+})
+REGISTRY.callback('flair_llm_waiting', 'Model calls waiting for rate-limit budget', ['model'],
+                  lambda: {(model,): stats['waiting'] for model, stats in scheduler.stats().items()})
+REGISTRY.callback('flair_llm_rate_factor', 'Fraction of the configured model quota the scheduler currently allows', ['model'],
+                  lambda: {(model,): stats['rateFactor'] for model, stats in scheduler.stats().items()})
+
+def _result_cache_stats():
+    return result_cache.get_cache().stats() if result_cache.CACHE_ENABLED else {}
+
+REGISTRY.callback('flair_result_cache_lookups_total', 'Result cache lookups in this process', ['result'],
+                  lambda: {(result,): _result_cache_stats().get(key, 0)
+                           for result, key in (('hit', 'hits'), ('miss', 'misses'))}, kind='counter')
+REGISTRY.callback('flair_result_cache_hit_ratio', 'Result cache hits over lookups in this process',
+                  function=lambda: _result_cache_stats().get('hit_rate', 0.0))
+REGISTRY.callback('flair_result_cache_bytes', 'Size of the result cache store',
+                  function=lambda: _result_cache_stats().get('bytes', 0))
+
+def save_upload(session_id, file):
+    """Save an uploaded file under the session directory, returning (filename, filepath)"""
+    # Create session directory if it doesn't exist
+    session_dir = os.path.join(app.config['UPLOAD_FOLDER'], session_id)
+    os.makedirs(session_dir, exist_ok=True)
+    
+    # Save file with unique name
+    timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    filename = f"{timestamp}-{secure_filename(file.filename)}"
+    filepath = os.path.join(session_dir, filename)
+    file.save(filepath)
+    return filename, filepath
+
+def process_document(session_id, filename, filepath, is_pdf=False):
+    """Extract text from a saved upload; runs on an upload worker"""
+    with trace(logger, 'upload-job', session=session_id, pdf=is_pdf):
+        return _process_document(session_id, filename, filepath, is_pdf)
+
+def _process_document(session_id, filename, filepath, is_pdf=False):
     try:
-        # Create session directory if it doesn't exist
-        session_dir = os.path.join(app.config['UPLOAD_FOLDER'], session_id)
-        os.makedirs(session_dir, exist_ok=True)
-        
-        # Save file with unique name
-        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
-        filename = f"{timestamp}-{secure_filename(file.filename)}"
-        filepath = os.path.join(session_dir, filename)
-        file.save(filepath)
-        
         # Create a notification callback for this session
         def notify_progress(data):
             notify_clients(session_id, data)
@@ -112,7 +203,44 @@ def handle_document_upload(session_id, file, is_pdf=False):
         error_msg = f"Error processing {'PDF' if is_pdf else 'image'}: {str(e)}"
         print(error_msg)
         notify_clients(session_id, {'status': 'error', 'message': error_msg})
+        raise RuntimeError(error_msg) from e
+
+# Unified handler for both image and PDF uploads
+def handle_document_upload(session_id, file, is_pdf=False):
+    """Save the upload and queue it for processing; returns (body, status[, headers])"""
+    try:
+        filename, filepath = save_upload(session_id, file)
+    except Exception as e:
+        error_msg = f"Error saving {'PDF' if is_pdf else 'image'}: {str(e)}"
+        print(error_msg)
+        notify_clients(session_id, {'status': 'error', 'message': error_msg})
         return {'error': error_msg}, 500
+    
+    try:
+        job_id = upload_jobs.submit(process_document, session_id, filename, filepath, is_pdf)
+    except QueueFull:
+        os.remove(filepath)
+        error_msg = 'Server is busy processing other uploads, please try again shortly'
+        notify_clients(session_id, {'status': 'error', 'message': error_msg})
+        return {'error': error_msg}, 429, {'Retry-After': '10'}
+    
+    notify_clients(session_id, {
+        'status': 'processing',
+        'message': 'Upload received, waiting for a free worker...',
+        'jobId': job_id
+    })
+    
+    # Results arrive over /api/upload-status; /api/upload-job can be polled instead
+    return {
+        'success': True,
+        'jobId': job_id,
+        'status': 'queued',
+        'statusUrl': f'/api/upload-job/{job_id}',
+        'fileInfo': {
+            'filename': filename,
+            'size': os.path.getsize(filepath)
+        }
+    }, 202
 
 @app.route('/api/upload/<session_id>', methods=['POST'])
 def upload_file(session_id):
@@ -127,9 +255,7 @@ def upload_file(session_id):
     
     if file and file.filename.lower().endswith(('.jpg', '.jpeg', '.png')):
         result = handle_document_upload(session_id, file, is_pdf=False)
-        if isinstance(result, tuple):  # Error case
-            return jsonify(result[0]), result[1]
-        return jsonify(result)
+        return (jsonify(result[0]),) + result[1:]
     else:
         notify_clients(session_id, {'status': 'error', 'message': 'Invalid image format'})
         return jsonify({'error': 'Invalid image format'}), 400
@@ -147,36 +273,28 @@ def upload_pdf(session_id):
     
     if file and file.filename.lower().endswith('.pdf'):
         result = handle_document_upload(session_id, file, is_pdf=True)
-        if isinstance(result, tuple):  # Error case
-            return jsonify(result[0]), result[1]
-        return jsonify(result)
+        return (jsonify(result[0]),) + result[1:]
     else:
         notify_clients(session_id, {'status': 'error', 'message': 'Invalid PDF format'})
         return jsonify({'error': 'Invalid PDF format'}), 400
 
 @app.route('/api/upload-status/<session_id>')
 def upload_status(session_id):
-    def stream():
-        with session_lock:
-            if session_id not in sessions:
-                sessions[session_id] = MessageAnnouncer()
-        
-        messages = sessions[session_id].listen()
-        
-        # Send initial status
-        yield f"data: {json.dumps({'status': 'waiting'})}\n\n"
-        
-        # Then stream updates
-        while True:
-            try:
-                msg = messages.get()  # Blocks until a message is available
-                yield f"data: {json.dumps(msg)}\n\n"
-            except Exception as e:
-                print(f"Error sending SSE update: {str(e)}")
-                yield f"data: {json.dumps({'status': 'error', 'message': 'Server error'})}\n\n"
-                break
-    
-    return Response(stream(), mimetype="text/event-stream")
+    # EventSource resends the id of the last event it saw when it reconnects
+    last_event_id = request.headers.get('Last-Event-ID')
+    return Response(
+        event_bus.stream(session_id, last_event_id),
+        mimetype="text/event-stream",
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/upload-job/<job_id>')
+def upload_job_status(job_id):
+    """Poll the state of a queued upload"""
+    job = upload_jobs.status(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
 
 @app.route('/api/uploaded-file/<session_id>')
 def get_uploaded_file(session_id):
@@ -215,6 +333,31 @@ def get_ip():
         s.close()
     return jsonify({'ip': local_ip})
 
+@app.before_request
+def start_request_trace():
+    g.trace_token = start_trace()
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    """Observe request latency and log the request's stage timings as one line."""
+    token = g.pop('trace_token', None)
+    if token is None:
+        return response
+    spans = end_trace(token)
+    elapsed = time.perf_counter() - g.pop('request_start')
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method, endpoint=endpoint, status=response.status_code)
+    if endpoint.startswith('/api/'):
+        log_event(logger, 'request', method=request.method, endpoint=endpoint, status=response.status_code,
+                  ms=round(elapsed * 1000, 1), spans=spans)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.after_request
 def after_request(response):
     header = response.headers
@@ -225,9 +368,7 @@ def after_request(response):
 
 def notify_clients(session_id, data):
     """Send SSE data to all clients for a given session"""
-    with session_lock:
-        if session_id in sessions:
-            sessions[session_id].announce(data)
+    event_bus.publish(session_id, data)
 
 @app.route('/api/analyze-essay', methods=['POST'])
 def analyze_essay():
@@ -242,7 +383,6 @@ def analyze_essay():
             
         essay_text = data['essay']
         logger.info(f"Essay length: {len(essay_text)} characters")
-        logger.debug(f"Essay preview: {essay_text[:100]}...")
         
         if not essay_text or len(essay_text.strip()) < 10:
             logger.error("Essay text too short")
@@ -250,17 +390,15 @@ def analyze_essay():
             
         # Call the grading function
         logger.info("Calling grade_essay function")
-        analysis_result = grade_essay(essay_text)
+        analysis_result = grade_essay(essay_text, rubric_version=data.get('rubricVersion'))
         
         logger.info("Analysis completed")
-        logger.debug(f"Analysis result: {analysis_result}")
         
         # If the result is a string (like JSON string), parse it
         if isinstance(analysis_result, str):
             import json
             try:
                 analysis_result = json.loads(analysis_result)
-                logger.debug("Successfully parsed string result as JSON")
             except json.JSONDecodeError as e:
                 logger.error(f"Failed to parse analysis result as JSON: {e}")
                 # If not valid JSON, return as is
@@ -272,37 +410,196 @@ def analyze_essay():
         }
         
         logger.info("Sending successful response")
-        logger.debug(f"Response data: {response_data}")
+        log_payload(logger, "Analysis response", response_data)
         
         return jsonify(response_data)
         
+    except RubricError as e:
+        logger.error(str(e))
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.exception("Error processing essay analysis")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/analyze-essay-stream', methods=['POST'])
+def analyze_essay_stream():
+    """
+    Grade an essay, streaming each rubric category as NDJSON as soon as it is scored.
+    
+    Lines are {"type": "score", "score": RubricScore}, then a final
+    {"type": "done", ...} with timings, or {"type": "error", "error": ...}.
+    """
+    logger.info("Received streaming essay analysis request")
+    
+    data = request.json
+    if not data or 'essay' not in data:
+        logger.error("No essay text provided in request")
+        return jsonify({'error': 'No essay text provided'}), 400
+        
+    essay_text = data['essay']
+    logger.info(f"Essay length: {len(essay_text)} characters")
+    
+    if not essay_text or len(essay_text.strip()) < 10:
+        logger.error("Essay text too short")
+        return jsonify({'error': 'Essay text is too short'}), 400
+    
+    try:
+        rubric = get_registry().get(data.get('rubricVersion'))
+    except RubricError as e:
+        logger.error(str(e))
+        return jsonify({'error': str(e)}), 400
+    
+    def generate():
+        start = time.perf_counter()
+        first_score = None
+        count = 0
+        try:
+            # The stream outlives the request trace, so this only feeds the stage histogram
+            with span('grade'):
+                for score in grade_essay_stream(essay_text, rubric_version=rubric['version']):
+                    if first_score is None:
+                        first_score = time.perf_counter() - start
+                        logger.info(f"Time to first rubric score: {first_score * 1000:.0f} ms")
+                    count += 1
+                    yield json.dumps({'type': 'score', 'score': score}) + "\n"
+        except Exception as e:
+            logger.exception("Error streaming essay analysis")
+            yield json.dumps({'type': 'error', 'error': str(e)}) + "\n"
+            return
+        total = time.perf_counter() - start
+        logger.info(f"Streamed {count} rubric scores in {total * 1000:.0f} ms")
+        yield json.dumps({
+            'type': 'done',
+            'count': count,
+            'timeToFirstScoreMs': round(first_score * 1000) if first_score is not None else None,
+            'totalMs': round(total * 1000)
+        }) + "\n"
+    
+    return Response(generate(), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/batch-grade', methods=['POST'])
+def batch_grade():
+    """
+    Queue a batch grading run.
+    
+    Body: {"essays": [{"id", "essay"}]} to grade the given texts, or
+    {"fromSupabase": true} to grade every un-graded row in Essays and write
+    the grades back. Optional: rubricVersion, concurrency, and checkpoint, the
+    name of a checkpoint to resume. Every run is checkpointed; the response
+    gives the name, and posting it back after an interrupted run skips the
+    essays already graded.
+    """
+    logger.info("Received batch grading request")
+    data = request.json or {}
+    from_supabase = bool(data.get('fromSupabase'))
+    essays = data.get('essays')
+    
+    if not from_supabase:
+        if not isinstance(essays, list) or not essays:
+            return jsonify({'error': 'Provide a non-empty essays list or set fromSupabase'}), 400
+        if any(not isinstance(item, dict) or not item.get('essay') for item in essays):
+            return jsonify({'error': 'Each essay must be an object with an essay field'}), 400
+        essays = [{'id': item.get('id', i), 'essay': item['essay']} for i, item in enumerate(essays)]
+    
+    try:
+        rubric = get_registry().get(data.get('rubricVersion'))
+    except RubricError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    checkpoint = str(data.get('checkpoint') or uuid.uuid4().hex)
+    try:
+        checkpoint_file = checkpoint_path(checkpoint)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def run(report):
+        with span('supabase'):
+            supabase = get_supabase_client() if from_supabase else None
+        items = fetch_ungraded_essays(supabase) if from_supabase else essays
+        logger.info(f"Batch grading {len(items)} essays")
+        try:
+            return grade_batch(items, concurrency=data.get('concurrency'), checkpoint_path=checkpoint_file,
+                               supabase=supabase, report=report, rubric_version=rubric['version'])
+        finally:
+            if supabase:
+                # Listed scores changed
+                essay_pages.clear()
+    
+    try:
+        job_id = batch_jobs.submit_with_progress(run)
+    except QueueFull:
+        return jsonify({'error': 'Too many batch runs queued, please try again later'}), 429, {'Retry-After': '60'}
+    
+    return jsonify({'success': True, 'jobId': job_id, 'checkpoint': checkpoint,
+                    'statusUrl': f'/api/batch-grade/{job_id}'}), 202
+
+@app.route('/api/batch-grade/<job_id>', methods=['GET'])
+def batch_grade_status(job_id):
+    """Progress, throughput and per-item failures of a batch grading run"""
+    job = batch_jobs.status(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
 @app.route('/api/list-essays', methods=['GET'])
 def list_essays():
-    """List all essays from Supabase"""
+    """
+    List essays from Supabase, one page at a time, newest first.
+    
+    Query parameters: limit (default 50, max 200), cursor (the nextCursor of
+    the previous page) and fields (comma-separated, default
+    id,title,created_at,scores). Responses carry an ETag, so a client sending
+    If-None-Match gets a 304 when the page hasn't changed.
+    """
     try:
-        logger.info("Fetching essays from Supabase")
-        supabase = get_supabase_client()
-        
-        # Get all essays, including the essay_body content
-        response = supabase.table("Essays").select("*").execute()
-        
-        if not response.data:
-            logger.info("No essays found in database")
-            return jsonify([])
-            
-        # Format the response to include any necessary fields
-        essays = response.data
-        logger.info(f"Found {len(essays)} essays")
-        
-        return jsonify(essays)
-        
+        fields = parse_fields(request.args.get('fields'))
+        limit = parse_limit(request.args.get('limit'))
+        cursor = parse_cursor(request.args.get('cursor'))
+    except ListQueryError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    key = (fields, limit, cursor)
+    cached = essay_pages.get(key)
+    if cached is None:
+        try:
+            logger.info(f"Fetching {limit} essays from Supabase (cursor {cursor})")
+            with span('supabase'):
+                page = fetch_page(get_supabase_client(), fields=fields, limit=limit, cursor=cursor)
+        except Exception as e:
+            logger.exception("Error fetching essays from Supabase")
+            return jsonify({'error': str(e)}), 500
+        cached = render(page)
+        essay_pages.set(key, cached)
+    
+    return conditional_json(*cached)
+
+@app.route('/api/essays/<int:essay_id>', methods=['GET'])
+def get_essay(essay_id):
+    """A single essay; fields as for /api/list-essays, default every field"""
+    try:
+        fields = parse_fields(request.args.get('fields')) if request.args.get('fields') else None
+    except ListQueryError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        with span('supabase'):
+            essay = fetch_essay(get_supabase_client(), essay_id, fields=fields)
     except Exception as e:
-        logger.exception("Error fetching essays from Supabase")
+        logger.exception("Error fetching essay from Supabase")
         return jsonify({'error': str(e)}), 500
+    if essay is None:
+        return jsonify({'error': 'Essay not found'}), 404
+    return conditional_json(*render(essay))
+
+def conditional_json(body, etag):
+    """A JSON response with an ETag, answered with 304 when If-None-Match matches"""
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Browsers may keep the page but must revalidate it each time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
 # Add this new route for writing style superhero recommendations
 
 @app.route('/api/writing-style', methods=['POST'])
@@ -324,11 +621,13 @@ def analyze_writing_style():
             return jsonify({'error': 'Essay text is too short for style analysis'}), 400
             
         # Analyze the writing style
-        style_hero = determine_writing_style_hero(essay_text)
+        profile = style_profile(essay_text)
+        style_hero = profile['hero']
         
         response_data = {
             'success': True,
-            'hero': style_hero
+            'hero': style_hero,
+            'features': profile['features']
         }
         
         logger.info(f"Writing style hero determined: {style_hero['name']}")
@@ -338,156 +637,65 @@ def analyze_writing_style():
         logger.exception("Error analyzing writing style")
         return jsonify({'error': str(e)}), 500
 
-def determine_writing_style_hero(essay_text):
+@app.route('/api/style-profiles', methods=['GET'])
+def style_profiles():
     """
-    Analyze essay text and determine which writing style superhero best matches.
+    Writing-style heroes and features for many essays at once.
     
-    Returns a dictionary with hero details.
+    Query parameters: studentId (default: every essay in the table, i.e. the
+    class; filtering needs STUDENT_COLUMN) and limit (newest essays to include, default 500, max 2000).
+    Returns each essay's hero and features, how many essays each hero got and
+    the distribution of every feature.
     """
-    import re
-    from collections import Counter
-    import random
-    
-    # Extract basic text features
-    sentences = re.split(r'[.!?]+', essay_text)
-    sentences = [s.strip() for s in sentences if s.strip()]
-    
-    words = essay_text.lower().split()
-    unique_words = set(words)
-    
-    # Calculate basic metrics
-    avg_sentence_length = sum(len(s.split()) for s in sentences) / max(len(sentences), 1)
-    vocabulary_richness = len(unique_words) / max(len(words), 1)
-    
-    # Look for descriptive words
-    descriptive_words = ['beautiful', 'amazing', 'wonderful', 'incredible', 'stunning', 
-                        'gorgeous', 'fascinating', 'lovely', 'colorful', 'vivid', 'bright',
-                        'brilliant', 'magnificent', 'fantastic', 'extraordinary']
-    
-    descriptive_count = sum(1 for word in words if word in descriptive_words)
-    descriptive_ratio = descriptive_count / max(len(words), 1)
-    
-    # Look for complex sentence structures
-    complex_indicators = [', which', ', where', ', when', ', who', ', because', 
-                        '; however', '; therefore', ', though', ', although', ', yet']
-    
-    complex_count = sum(1 for indicator in complex_indicators if indicator in essay_text.lower())
-    complex_ratio = complex_count / max(len(sentences), 1)
-    
-    # Check for active voice vs passive voice
-    passive_indicators = [' is ', ' are ', ' was ', ' were ', ' be ', ' been ']
-    passive_count = sum(essay_text.lower().count(indicator) for indicator in passive_indicators)
-    passive_ratio = passive_count / max(len(sentences), 1)
-    
-    # Define our superheroes
-    heroes = [
-        {
-            "name": "Captain Clarity",
-            "description": "The master of crystal-clear communication! With your laser-focus powers, you can explain the most complicated ideas so anyone can understand them.",
-            "strengths": ["Clear communication", "Concise expression", "Logical organization"],
-            "tips": [
-                "Keep sharpening your clarity by using concrete examples",
-                "Try adding more sophisticated transitions between ideas",
-                "Challenge yourself with more complex vocabulary while maintaining clarity"
-            ],
-            "icon": "🔍"
-        },
-        {
-            "name": "Vocabulary Vanguard",
-            "description": "The word wizard extraordinaire! You command an army of impressive words and craft sentences that flow like magic spells.",
-            "strengths": ["Rich vocabulary", "Complex sentence structures", "Elegant expression"],
-            "tips": [
-                "Ensure your sophisticated style doesn't sacrifice clarity",
-                "Vary sentence length to create rhythm in your writing",
-                "Continue expanding your vocabulary in your specific domain"
-            ],
-            "icon": "📚"
-        },
-        {
-            "name": "Imagination Igniter",
-            "description": "The creative flame-thrower! Your words paint vivid mind-pictures that transport readers to new worlds and fresh perspectives.",
-            "strengths": ["Creative expression", "Vivid descriptions", "Engaging imagery"],
-            "tips": [
-                "Ensure metaphors enhance rather than obscure your message",
-                "Practice using similes and analogies to explain complex concepts",
-                "Balance creativity with structure for maximum impact"
-            ],
-            "icon": "🎨"
-        },
-        {
-            "name": "Reason Ranger",
-            "description": "The thought detective! You build rock-solid arguments that stand strong against any challenge, using evidence and clever thinking.",
-            "strengths": ["Logical reasoning", "Evidence-based writing", "Structured arguments"],
-            "tips": [
-                "Consider adding more emotional appeal to balance your logical approach",
-                "Use stories and examples to make your logical points more memorable",
-                "Practice varying your sentence structure for better engagement"
-            ],
-            "icon": "⚖️"
-        },
-        {
-            "name": "Authentic Avenger",
-            "description": "The genuine connection creator! Your true personality shines through your words, making readers feel like they've made a new friend.",
-            "strengths": ["Distinctive voice", "Authentic expression", "Reader engagement"],
-            "tips": [
-                "Maintain your voice while adapting to different writing contexts",
-                "Continue developing technical skills to support your strong voice",
-                "Study writers you admire to add new dimensions to your voice"
-            ],
-            "icon": "🎭"
-        }
-    ]
-    
-    # Determine hero based on text features
-    scores = {
-        "Captain Clarity": 0,
-        "Vocabulary Vanguard": 0, # Changed from "Professor Prose"
-        "Imagination Igniter": 0, # Changed from "Metaphor Master"
-        "Reason Ranger": 0,       # Changed from "Logic Launcher"
-        "Authentic Avenger": 0    # Changed from "Voice Virtuoso"
-    }
+    student = request.args.get('studentId') or None
+    try:
+        limit = int(request.args.get('limit') or DEFAULT_PROFILE_ESSAYS)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be at least 1'}), 400
+    limit = min(limit, MAX_PROFILE_ESSAYS)
     
-    # Captain Clarity tends to have medium-length sentences, good organization
-    if 12 <= avg_sentence_length <= 20:
-        scores["Captain Clarity"] += 2
-    
-    # Vocabulary Vanguard uses complex sentences and rich vocabulary
-    if avg_sentence_length > 20:
-        scores["Vocabulary Vanguard"] += 2
-    if vocabulary_richness > 0.6:
-        scores["Vocabulary Vanguard"] += 2
-    if complex_ratio > 0.3:
-        scores["Vocabulary Vanguard"] += 1
-        
-    # Imagination Igniter uses descriptive language
-    if descriptive_ratio > 0.05:
-        scores["Imagination Igniter"] += 3
-    
-    # Reason Ranger uses structured arguments, often with specific connectors
-    if any(x in essay_text.lower() for x in ['therefore', 'thus', 'consequently', 'as a result']):
-        scores["Reason Ranger"] += 2
-    if any(x in essay_text.lower() for x in ['first', 'second', 'third', 'finally', 'in conclusion']):
-        scores["Reason Ranger"] += 2
-        
-    # Authentic Avenger has a distinctive voice, often with first person or direct address
-    if essay_text.lower().count("i ") > len(sentences) * 0.2:
-        scores["Authentic Avenger"] += 2
-    if essay_text.lower().count("you ") > len(sentences) * 0.1:
-        scores["Authentic Avenger"] += 2
-        
-    # Get the hero with highest score (or random among ties)
-    max_score = max(scores.values())
-    top_heroes = [hero for hero, score in scores.items() if score == max_score]
-    chosen_hero_name = random.choice(top_heroes)
+    try:
+        with span('supabase'):
+            essays = fetch_essays(get_supabase_client(), student, limit)
+        with span('style'):
+            profiles = profile_essays(essays)
+    except StudentScopeError as e:
+        logger.error(str(e))
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.exception("Error building style profiles")
+        return jsonify({'error': str(e)}), 500
     
-    # Find the full hero data
-    chosen_hero = next(hero for hero in heroes if hero["name"] == chosen_hero_name)
+    logger.info(f"Style profiles built for {profiles['essayCount']} essays")
+    return conditional_json(*render({'success': True, 'student': student, **profiles}))
+
+@app.route('/api/grammar-precheck', methods=['POST'])
+def grammar_precheck():
+    """
+    Fast offline check for common spelling, capitalization and punctuation errors.
     
-    return chosen_hero
+    Takes the same body as /api/grammar-check and answers in milliseconds, so
+    the editor can show these while the full check runs.
+    """
+    data = request.json
+    if not data or not isinstance(data.get('essay'), str):
+        return jsonify({'error': 'No essay text provided'}), 400
+    with span("precheck"):
+        corrections = local_corrections(data['essay'])
+    return jsonify({'success': True, 'corrections': corrections})
 
 @app.route('/api/grammar-check', methods=['POST'])
 def grammar_check():
-    """Check essay text for grammar, punctuation, and spelling errors"""
+    """
+    Check essay text for grammar, punctuation, and spelling errors.
+    
+    JSON body: essay, incremental=true to check paragraph by paragraph,
+    reusing results for paragraphs that haven't changed since the last check,
+    and chunked=true/false to force chunked checking on or off (by default
+    essays longer than GRAMMAR_CHUNK_CHARS are chunked).
+    """
     logger.info("Received grammar check request")
     
     try:
@@ -498,18 +706,18 @@ def grammar_check():
             
         essay_text = data['essay']
         logger.info(f"Essay length: {len(essay_text)} characters")
-        logger.debug(f"Essay preview: {essay_text[:100]}...")
         
         if not essay_text or len(essay_text.strip()) < 10:
             logger.error("Essay text too short")
             return jsonify({'error': 'Essay text is too short'}), 400
             
-        # Call the grammar correction function
-        logger.info("Calling corrections_from_essay function")
-        corrections = corrections_from_essay(essay_text)
+        # Incremental mode checks paragraphs separately so unchanged ones come from the cache;
+        # long essays are checked in concurrent chunks
+        logger.info("Calling check_grammar function")
+        corrections = check_grammar(essay_text, incremental=bool(data.get('incremental')),
+                                    chunked=data.get('chunked'))
         
         logger.info("Grammar check completed")
-        logger.debug(f"Corrections: {corrections}")
         
         response_data = {
             'success': True,
@@ -517,7 +725,7 @@ def grammar_check():
         }
         
         logger.info("Sending successful response")
-        logger.debug(f"Response data: {response_data}")
+        log_payload(logger, "Grammar response", response_data)
         
         return jsonify(response_data)
         
@@ -525,60 +733,174 @@ def grammar_check():
         logger.exception("Error processing grammar check")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/essay-analysis', methods=['POST'])
+def essay_analysis():
+    """
+    Grade, grammar-check and style-profile an essay in one request.
+    
+    Grading and grammar run concurrently while the local style metrics are
+    computed, and each section is streamed back as one NDJSON line as soon as
+    it is ready: {"section": "style" | "analysis" | "corrections", ...}
+    """
+    logger.info("Received combined essay analysis request")
+    
+    data = request.json
+    if not data or 'essay' not in data:
+        logger.error("No essay text provided in request")
+        return jsonify({'error': 'No essay text provided'}), 400
+        
+    essay_text = data['essay']
+    logger.info(f"Essay length: {len(essay_text)} characters")
+    
+    if not essay_text or len(essay_text.strip()) < 10:
+        logger.error("Essay text too short")
+        return jsonify({'error': 'Essay text is too short'}), 400
+    
+    try:
+        rubric = get_registry().get(data.get('rubricVersion'))
+    except RubricError as e:
+        logger.error(str(e))
+        return jsonify({'error': str(e)}), 400
+    
+    # Start both model calls before doing any local work
+    # Each call runs in a copy of this request's context so its spans join the trace
+    futures = {
+        submit_analysis(grade_essay, essay_text, rubric['version']): 'analysis',
+        submit_analysis(check_grammar, essay_text): 'corrections',
+    }
+    
+    def section(name, payload):
+        return json.dumps({'section': name, 'success': True, name: payload}) + "\n"
+    
+    def section_error(name, error):
+        return json.dumps({'section': name, 'success': False, 'error': error}) + "\n"
+    
+    def generate():
+        if len(essay_text.strip()) < 50:
+            yield section_error('style', 'Essay text is too short for style analysis')
+        else:
+            try:
+                yield section('style', determine_writing_style_hero(essay_text))
+            except Exception as e:
+                logger.exception("Error analyzing writing style")
+                yield section_error('style', str(e))
+        
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.exception(f"Error computing {name} section")
+                yield section_error(name, str(e))
+                continue
+            if name == 'analysis' and isinstance(result, str):
+                try:
+                    result = json.loads(result)
+                except json.JSONDecodeError as e:
+                    logger.error(f"Failed to parse analysis result as JSON: {e}")
+            logger.info(f"Streaming {name} section")
+            yield section(name, result)
+    
+    return Response(generate(), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/student-progress', methods=['GET'])
 def student_progress():
-    """Analyze student essays to track progress and generate a personalized assignment PDF"""
+    """
+    Track a student's progress and start building a personalized assignment PDF.
+    
+    Query parameters: studentId (default: every essay in the table; filtering
+    needs STUDENT_COLUMN) and refresh=1 to look for newer essays even if a summary is cached.
+    
+    Returns as soon as the progress summary is ready; the assignment is
+    generated in the background and fetched from its 'url'.
+    """
     logger.info("Received student progress analysis request")
+    student = request.args.get('studentId') or None
     
     try:
-        supabase = get_supabase_client()
-        # Replace "essays" with your actual table name
-        supa_response = supabase.table("Essays").select("*").execute()
-        data = supa_response.data
-
-        essays = []
-        for item in data:
-            essays.append(item['essay_body'])
-
-        if not isinstance(essays, list) or len(essays) == 0:
-            logger.error("Essays must be provided as a non-empty list")
-            return jsonify({'error': 'Essays must be provided as a non-empty list'}), 400
+        # Only essays newer than the stored summary are sent to the model
+        summary = progress_tracker.get(get_supabase_client(), student,
+                                       refresh=request.args.get('refresh') == '1')
+        if summary is None:
+            logger.error("No essays found for progress analysis")
+            return jsonify({'error': 'No essays found for this student'}), 404
         
-        logger.info(f"Analyzing progress for {len(essays)} essays")
-        
-        # Analyze student progress
-        progress = analyze_student_progress(essays)
-        logger.info("Progress analysis completed")
+        progress = summary['progress']
+        logger.info(f"Progress summary covers {summary['essayCount']} essays")
         
         # Extract common mistakes and improvements separately
         common_mistakes = progress.get("common_mistakes", [])
         improvements = progress.get("improvements", [])
         
-        # Generate assignment questions based on common mistakes
-        assignment = generate_assignment_questions(common_mistakes)
-        logger.info("Assignment questions generated")
-        
-        # Generate PDF
-        pdf_blob = generate_assignment_pdf(assignment)
-        logger.info("Assignment PDF generated")
-        
-        # Encode PDF as base64 for JSON response
-        pdf_base64 = base64.b64encode(pdf_blob).decode('utf-8')
+        # Queue the assignment for these mistakes unless it is already built
+        try:
+            assignment_id = assignment_artifacts.request(common_mistakes)
+            assignment = {
+                'id': assignment_id,
+                'status': assignment_artifacts.status(assignment_id),
+                'url': f"/api/assignment-pdf/{assignment_id}"
+            }
+        except QueueFull:
+            logger.warning("Assignment queue is full, returning progress without an assignment")
+            assignment = None
         
         response_data = {
             'success': True,
             'common_mistakes': common_mistakes,
             'improvements': improvements,
-            'pdf': pdf_base64
+            'essayCount': summary['essayCount'],
+            'assignment': assignment
         }
         
-        logger.info("Sending successful response with progress data and PDF")
+        logger.info("Sending successful response with progress data")
         return jsonify(response_data)
         
+    except StudentScopeError as e:
+        logger.error(str(e))
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.exception("Error processing student progress analysis")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/assignment-pdf/<assignment_id>', methods=['GET'])
+def assignment_pdf(assignment_id):
+    """
+    Serve an assignment PDF started by /api/student-progress.
+    
+    A build still in progress is waited on for up to ASSIGNMENT_WAIT seconds
+    (or ?wait=<seconds>, e.g. wait=0 to poll); if it isn't done by then the
+    response is 202 with a Retry-After header.
+    """
+    if not ASSIGNMENT_ID_PATTERN.match(assignment_id):
+        return jsonify({'error': 'Assignment not found'}), 404
+    try:
+        wait = min(float(request.args.get('wait', app.config['ASSIGNMENT_WAIT'])), app.config['ASSIGNMENT_WAIT'])
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    
+    status = assignment_artifacts.wait(assignment_id, wait)
+    if status is None:
+        return jsonify({'error': 'Assignment not found'}), 404
+    if status == 'failed':
+        return jsonify({'status': status, 'error': assignment_artifacts.error(assignment_id)}), 500
+    if status == 'pending':
+        response = jsonify({'status': status})
+        response.status_code = 202
+        response.headers['Retry-After'] = '2'
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    
+    response = send_file(
+        assignment_artifacts.path(assignment_id),
+        mimetype='application/pdf',
+        download_name='writing_assignment.pdf',
+        conditional=True,
+        etag=True
+    )
+    response.headers['Cache-Control'] = f"private, max-age={app.config['ASSIGNMENT_MAX_AGE']}, immutable"
+    return response
+
 if __name__ == '__main__':
     logger.info("Starting Flask server")
     app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
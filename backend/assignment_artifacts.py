@@ -0,0 +1,209 @@
+"""
+Assignment PDFs, built in the background and kept as files.
+
+An assignment only depends on the list of common mistakes it targets, so it
+is stored under a digest of that list. /api/student-progress asks for the
+assignment and returns straight away; the questions and PDF are generated on
+a worker, and /api/assignment-pdf/<id> serves the file once it exists. Asking
+again for the same mistakes reuses the stored PDF.
+
+Builds in progress and failed builds are marked by <id>.pending and <id>.error
+files next to the PDFs, so every app worker sees the same state whichever one
+took the request.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from analyse_history import generate_assignment_questions, generate_assignment_pdf
+from result_cache import CACHE_DIR
+
+ASSIGNMENT_DIR = os.getenv("ASSIGNMENT_DIR", os.path.join(CACHE_DIR, "assignments"))
+# Bump when the assignment prompt or PDF layout changes so stored PDFs are rebuilt
+ASSIGNMENT_VERSION = "1"
+# Oldest PDFs are deleted once there are more than this many
+ASSIGNMENT_MAX_FILES = int(os.getenv("ASSIGNMENT_MAX_FILES", "500"))
+# A build marked pending for longer than this is assumed lost (its worker died)
+ASSIGNMENT_BUILD_TIMEOUT = float(os.getenv("ASSIGNMENT_BUILD_TIMEOUT", "600"))
+# Failures are reported for this long, then forgotten so the build can be retried
+ASSIGNMENT_ERROR_TTL = float(os.getenv("ASSIGNMENT_ERROR_TTL", "300"))
+# How often wait() looks for a build another process is running
+ASSIGNMENT_POLL_INTERVAL = 0.5
+ASSIGNMENT_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+def assignment_id(common_mistakes):
+    """Stable id for the assignment generated from a list of mistakes."""
+    normalized = [mistake.strip() for mistake in common_mistakes]
+    digest = hashlib.sha256(ASSIGNMENT_VERSION.encode('utf-8') + b'\0')
+    digest.update(json.dumps(normalized).encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+def _age(path):
+    """Seconds since the file was last modified, or None if it doesn't exist."""
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return None
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class AssignmentArtifacts:
+    """
+    Generates assignment PDFs on a JobQueue and tracks which are ready.
+
+    A PDF is written to a temporary file and renamed into place, so a file
+    under its final name is always complete. The marker files make the state
+    visible to every process; the events only let wait() in the process
+    running a build wake up as soon as it finishes.
+    """
+    def __init__(self, jobs, folder=ASSIGNMENT_DIR, max_files=ASSIGNMENT_MAX_FILES,
+                 build_timeout=ASSIGNMENT_BUILD_TIMEOUT, error_ttl=ASSIGNMENT_ERROR_TTL):
+        self.jobs = jobs
+        self.folder = folder
+        self.max_files = max_files
+        self.build_timeout = build_timeout
+        self.error_ttl = error_ttl
+        self.events = {}  # id -> Event set when a build in this process finishes
+        self.lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, artifact_id):
+        return os.path.join(self.folder, f"{artifact_id}.pdf")
+
+    def _marker(self, artifact_id, kind):
+        return os.path.join(self.folder, f"{artifact_id}.{kind}")
+
+    def _is_pending(self, artifact_id):
+        age = _age(self._marker(artifact_id, 'pending'))
+        return age is not None and age < self.build_timeout
+
+    def _is_failed(self, artifact_id):
+        age = _age(self._marker(artifact_id, 'error'))
+        return age is not None and age < self.error_ttl
+
+    def _claim(self, artifact_id):
+        """Create the pending marker; False if another build holds a live one."""
+        marker = self._marker(artifact_id, 'pending')
+        for _ in range(2):
+            try:
+                os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                if self._is_pending(artifact_id):
+                    return False
+                # Left behind by a build that never finished
+                _remove(marker)
+        return False
+
+    def request(self, common_mistakes):
+        """
+        Make sure the assignment for these mistakes exists or is being built.
+
+        Returns:
+            str: Assignment id
+
+        Raises:
+            QueueFull: If the build queue is at capacity
+        """
+        artifact_id = assignment_id(common_mistakes)
+        with self.lock:
+            if os.path.exists(self.path(artifact_id)) or not self._claim(artifact_id):
+                return artifact_id
+            _remove(self._marker(artifact_id, 'error'))
+            self.events[artifact_id] = threading.Event()
+        try:
+            self.jobs.submit(self._build, artifact_id, list(common_mistakes))
+        except Exception:
+            self._finish(artifact_id)
+            raise
+        return artifact_id
+
+    def status(self, artifact_id):
+        """'ready', 'pending', 'failed', or None for an unknown id."""
+        if os.path.exists(self.path(artifact_id)):
+            return 'ready'
+        if self._is_pending(artifact_id):
+            return 'pending'
+        if self._is_failed(artifact_id):
+            return 'failed'
+        return None
+
+    def error(self, artifact_id):
+        if not self._is_failed(artifact_id):
+            return None
+        try:
+            with open(self._marker(artifact_id, 'error'), 'r', encoding='utf-8') as file:
+                return file.read()
+        except OSError:
+            return None
+
+    def wait(self, artifact_id, timeout):
+        """Wait up to `timeout` seconds for a pending build, then return its status."""
+        deadline = time.monotonic() + timeout
+        status = self.status(artifact_id)
+        while status == 'pending':
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with self.lock:
+                event = self.events.get(artifact_id)
+            if event is not None:
+                event.wait(remaining)
+            else:
+                # Built by another process; watch its marker
+                time.sleep(min(ASSIGNMENT_POLL_INTERVAL, remaining))
+            status = self.status(artifact_id)
+        return status
+
+    def _finish(self, artifact_id):
+        _remove(self._marker(artifact_id, 'pending'))
+        with self.lock:
+            event = self.events.pop(artifact_id, None)
+        if event is not None:
+            event.set()
+
+    def _build(self, artifact_id, common_mistakes):
+        try:
+            assignment = generate_assignment_questions(common_mistakes)
+            if isinstance(assignment, str):
+                raise ValueError("Model returned assignment questions that are not valid JSON")
+            pdf = generate_assignment_pdf(assignment)
+            self._write(self.path(artifact_id), pdf)
+        except Exception as e:
+            self._write(self._marker(artifact_id, 'error'), str(e).encode('utf-8'))
+            raise
+        finally:
+            self._finish(artifact_id)
+            self._prune()
+        return {'id': artifact_id, 'bytes': len(pdf)}
+
+    def _write(self, path, data):
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, path)
+
+    def _prune(self):
+        """Delete expired error markers and the oldest PDFs past max_files."""
+        files = []
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            if name.endswith('.pdf'):
+                files.append(path)
+            elif name.endswith('.error'):
+                age = _age(path)
+                if age is not None and age >= self.error_ttl:
+                    _remove(path)
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=lambda path: _age(path) or 0, reverse=True)
+        for path in files[:len(files) - self.max_files]:
+            _remove(path)
@@ -0,0 +1,245 @@
+"""
+Grade many essays at once, e.g. a whole class at the end of term.
+
+Essays are graded by a small pool of workers. Their model calls run at batch
+priority in the shared llm_scheduler, which keeps them inside the model's
+per-minute quota, backs off on 429s and lets editor requests go first;
+llm_client retries transient failures. Every finished item is appended to a
+JSONL checkpoint, so an interrupted run picks up where it left off, and grades
+are written back to Supabase in chunks.
+
+Usage:
+    python batch_grading.py --from-supabase --checkpoint media/batch.jsonl
+    python batch_grading.py --input essays.jsonl --no-write
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from scorer import grade_essay
+from llm_scheduler import llm_priority, BATCH
+from metrics import span
+from result_cache import CACHE_DIR
+from supabase_functions import bulk_upsert, execute_with_retry
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_WRITE_CHUNK = 50
+# Rows fetched per Supabase request when looking for un-graded essays
+FETCH_PAGE_SIZE = 500
+# Checkpoints of runs started through /api/batch-grade
+BATCH_CHECKPOINT_DIR = os.getenv("BATCH_CHECKPOINT_DIR", os.path.join(CACHE_DIR, "batches"))
+CHECKPOINT_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+def checkpoint_path(name):
+    """Path of the named checkpoint in BATCH_CHECKPOINT_DIR; raises ValueError for an unsafe name."""
+    if not CHECKPOINT_NAME_PATTERN.match(name):
+        raise ValueError("checkpoint must be 1-64 letters, digits, '-' or '_'")
+    os.makedirs(BATCH_CHECKPOINT_DIR, exist_ok=True)
+    return os.path.join(BATCH_CHECKPOINT_DIR, f"{name}.jsonl")
+
+def is_ungraded(row):
+    grading = row.get('grading')
+    return grading in (None, '', '{}', '[]', {}, [])
+
+def fetch_ungraded_essays(supabase):
+    """Return [{'id', 'essay'}] for every Essays row without a grade."""
+    essays = []
+    start = 0
+    while True:
+        with span("supabase"):
+            response = execute_with_retry(lambda: supabase.table("Essays").select("id, essay_body, grading")
+                                          .order("id").range(start, start + FETCH_PAGE_SIZE - 1))
+        rows = response.data or []
+        essays.extend({'id': row['id'], 'essay': row['essay_body']}
+                      for row in rows if is_ungraded(row) and row.get('essay_body'))
+        if len(rows) < FETCH_PAGE_SIZE:
+            return essays
+        start += FETCH_PAGE_SIZE
+
+def write_grades(supabase, graded):
+    """
+    Write {'id', 'essay', 'grading'} items back to Essays, one upsert per chunk; returns ids written.
+
+    PostgREST can't update many rows to different values in one request, so
+    rows are upserted on id. Each row carries the essay body it was graded
+    from, which is the NOT NULL column an upsert's insert path needs; rows
+    already exist, so only their grading changes.
+    """
+    rows = [{'id': item['id'], 'essay_body': item['essay'], 'grading': item['grading']} for item in graded]
+    with span("supabase"):
+        bulk_upsert("Essays", rows, on_conflict="id", chunk_size=BATCH_WRITE_CHUNK, client=supabase)
+    return [item['id'] for item in graded]
+
+class Checkpoint:
+    """Append-only JSONL record of graded, failed and written-back items."""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = {}  # id -> grading
+        self.written = set()
+        if path and os.path.exists(path):
+            with open(path, 'r') as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if entry.get('status') == 'done':
+                        self.done[entry['id']] = entry['grading']
+                    elif entry.get('status') == 'written':
+                        self.written.add(entry['id'])
+
+    def record(self, entry):
+        if not self.path:
+            return
+        with self.lock:
+            with open(self.path, 'a') as file:
+                file.write(json.dumps(entry) + "\n")
+
+    def unwritten(self):
+        return [{'id': item_id, 'grading': grading} for item_id, grading in self.done.items()
+                if item_id not in self.written]
+
+def grade_batch(essays, concurrency=None, checkpoint_path=None,
+                supabase=None, report=None, rubric_version=None):
+    """
+    Grade a list of essays concurrently.
+
+    Args:
+        essays (list): [{'id': ..., 'essay': str}] items to grade
+        concurrency (int, optional): Essays graded at once
+        checkpoint_path (str, optional): JSONL file used to resume an interrupted run
+        supabase (Client, optional): When given, grades are written back to Essays
+        report (callable, optional): report(**progress) called as items finish
+        rubric_version (str, optional): Rubric to grade against
+
+    Returns:
+        dict: Counts, throughput in essays/minute and per-item failures
+    """
+    concurrency = concurrency or BATCH_CONCURRENCY
+    checkpoint = Checkpoint(checkpoint_path)
+    todo = [item for item in essays if item['id'] not in checkpoint.done]
+    skipped = len(essays) - len(todo)
+
+    lock = threading.Lock()
+    pending_writes = []
+    if supabase:
+        # Grades from an earlier run that never reached Supabase; still un-graded there, so in essays
+        bodies = {item['id']: item['essay'] for item in essays}
+        for item in checkpoint.unwritten():
+            if item['id'] in bodies:
+                pending_writes.append({**item, 'essay': bodies[item['id']]})
+    failures = {}
+    graded = 0
+    written = 0
+    start = time.monotonic()
+
+    def flush(force=False):
+        nonlocal pending_writes, written
+        with lock:
+            if not pending_writes or (not force and len(pending_writes) < BATCH_WRITE_CHUNK):
+                return
+            batch, pending_writes = pending_writes, []
+        try:
+            ids = write_grades(supabase, batch)
+        except Exception as e:
+            print(f"Failed to write {len(batch)} grades back: {str(e)}")
+            with lock:
+                pending_writes.extend(batch)
+            return
+        for item_id in ids:
+            checkpoint.record({'id': item_id, 'status': 'written'})
+        with lock:
+            written += len(ids)
+
+    def progress():
+        elapsed = time.monotonic() - start
+        if report:
+            report(total=len(essays), skipped=skipped, graded=graded, failed=len(failures),
+                   written=written, essaysPerMinute=round(graded / elapsed * 60, 2) if elapsed else 0.0)
+
+    def grade_one(item):
+        nonlocal graded
+        try:
+            # Editor requests go ahead of batch work in the shared scheduler
+            with llm_priority(BATCH):
+                result = grade_essay(item['essay'], rubric_version=rubric_version)
+            if isinstance(result, str):
+                raise ValueError("Model returned a response that is not valid JSON")
+        except Exception as e:
+            # Failed items aren't in the checkpoint's done set, so resuming retries them
+            checkpoint.record({'id': item['id'], 'status': 'failed', 'error': str(e)})
+            with lock:
+                failures[item['id']] = str(e)
+            progress()
+            return
+        checkpoint.record({'id': item['id'], 'status': 'done', 'grading': result})
+        with lock:
+            graded += 1
+            if supabase:
+                pending_writes.append({'id': item['id'], 'essay': item['essay'], 'grading': result})
+        if supabase:
+            flush()
+        progress()
+
+    progress()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch-grade') as executor:
+        list(executor.map(grade_one, todo))
+    if supabase:
+        flush(force=True)
+
+    elapsed = time.monotonic() - start
+    summary = {
+        'total': len(essays),
+        'skipped': skipped,
+        'graded': graded,
+        'failed': len(failures),
+        'written': written,
+        'seconds': round(elapsed, 1),
+        'essaysPerMinute': round(graded / elapsed * 60, 2) if elapsed else 0.0,
+        'failures': failures,
+    }
+    if report:
+        report(**{k: v for k, v in summary.items() if k != 'failures'})
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--from-supabase", action="store_true", help="grade every un-graded row in Essays")
+    source.add_argument("--input", help="JSONL file of {\"id\", \"essay\"} objects")
+    parser.add_argument("--checkpoint", help="JSONL checkpoint for resuming (default: none)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--rubric-version", help="rubric version to grade against (default: RUBRIC_VERSION)")
+    parser.add_argument("--no-write", action="store_true", help="with --from-supabase, don't write grades back")
+    args = parser.parse_args()
+
+    supabase = None
+    if args.from_supabase:
+        from supabase_functions import get_supabase_client
+        supabase = get_supabase_client()
+
+    if args.from_supabase:
+        essays = fetch_ungraded_essays(supabase)
+    else:
+        with open(args.input, 'r') as file:
+            essays = [json.loads(line) for line in file if line.strip()]
+        for i, item in enumerate(essays):
+            item.setdefault('id', i)
+
+    def report(**progress):
+        print(f"\r{progress.get('graded', 0)}/{progress.get('total', 0)} graded, "
+              f"{progress.get('failed', 0)} failed, {progress.get('essaysPerMinute', 0)} essays/min", end="")
+
+    summary = grade_batch(essays, concurrency=args.concurrency,
+                          checkpoint_path=args.checkpoint,
+                          supabase=None if args.no_write else supabase,
+                          report=report, rubric_version=args.rubric_version)
+    print()
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
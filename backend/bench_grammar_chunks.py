@@ -0,0 +1,94 @@
+"""
+Compare whole-essay and chunked grammar checking across essay lengths.
+
+Essays of each length are built by repeating the paragraphs of the sample
+essay. Each is checked once with a single corrections_from_essay call and
+once with corrections_from_chunks, reporting wall time, model calls, the
+number of corrections and how many of them point at their error text exactly.
+
+By default the model is a local fake_gemini_server whose response time grows
+with the length of the response (--output-latency), like real token
+generation. Pass --live to call Gemini with the key from the environment.
+
+Usage:
+    python bench_grammar_chunks.py
+    python bench_grammar_chunks.py --lengths 2000 8000 32000 --output-latency 1.5
+    python bench_grammar_chunks.py --live --lengths 4000 16000
+"""
+import argparse
+import os
+import time
+
+ESSAY_SAMPLE = os.path.join("media", "input.txt")
+DEFAULT_LENGTHS = [1000, 4000, 8000, 16000, 32000]
+
+def build_essay(sample, length):
+    """Repeat the sample's paragraphs until the essay is about `length` characters."""
+    paragraphs = [paragraph.strip() for paragraph in sample.split("\n\n") if paragraph.strip()]
+    parts = []
+    size = 0
+    index = 0
+    while size < length:
+        paragraph = paragraphs[index % len(paragraphs)]
+        parts.append(paragraph)
+        size += len(paragraph) + 2
+        index += 1
+    return "\n\n".join(parts)[:length]
+
+def exact(essay, corrections):
+    """How many corrections' starting_index points at their error text."""
+    if isinstance(corrections, str):
+        return 0
+    return sum(1 for correction in corrections
+               if essay[correction['starting_index']:correction['starting_index'] + len(correction['error'])]
+               == correction['error'])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", type=int, nargs="+", default=DEFAULT_LENGTHS, help="essay lengths in characters")
+    parser.add_argument("--chunk-chars", type=int, help="override GRAMMAR_CHUNK_CHARS")
+    parser.add_argument("--overlap-chars", type=int, help="override GRAMMAR_CHUNK_OVERLAP")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model latency in seconds")
+    parser.add_argument("--output-latency", type=float, default=1.0,
+                        help="fake model seconds per 1000 response characters")
+    parser.add_argument("--live", action="store_true", help="call Gemini instead of the fake server")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    fake = None
+    if not args.live:
+        from fake_gemini_server import start_fake_server
+        fake = start_fake_server(latency=args.latency, jitter=0.0, output_latency=args.output_latency,
+                                 seed=args.seed)
+        os.environ['GEMINI_BASE_URL'] = fake.url
+        os.environ['GEMINI_API_KEY'] = 'fake-key'
+        for name in ('LLM_DEFAULT_RPM', 'LLM_PRO_RPM', 'LLM_FLASH_RPM'):
+            os.environ.setdefault(name, '1000000')
+    # Every check should reach the model
+    os.environ['RESULT_CACHE_ENABLED'] = '0'
+
+    # Imported only now: these modules read the settings above at import time
+    from grammar import corrections_from_essay, corrections_from_chunks, chunk_text
+
+    with open(ESSAY_SAMPLE, 'r', encoding='utf-8') as file:
+        sample = file.read()
+
+    print(f"{'chars':>6} {'mode':<7} {'chunks':>6} {'calls':>5} {'seconds':>8} {'found':>6} {'exact':>6}")
+    for length in args.lengths:
+        essay = build_essay(sample, length)
+        chunks = len(chunk_text(essay, 0, args.chunk_chars, args.overlap_chars))
+        for mode in ("whole", "chunked"):
+            calls = fake.counts['requests'] if fake else 0
+            start = time.perf_counter()
+            if mode == "whole":
+                corrections = corrections_from_essay(essay)
+            else:
+                corrections = corrections_from_chunks(essay, args.chunk_chars, args.overlap_chars)
+            seconds = time.perf_counter() - start
+            found = len(corrections) if isinstance(corrections, list) else "n/a"
+            calls = f"{fake.counts['requests'] - calls}" if fake else "-"
+            print(f"{len(essay):>6} {mode:<7} {chunks if mode == 'chunked' else 1:>6} {calls:>5} "
+                  f"{seconds:>8.2f} {found:>6} {exact(essay, corrections):>6}")
+
+if __name__ == "__main__":
+    main()
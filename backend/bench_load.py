@@ -0,0 +1,251 @@
+"""
+End-to-end load test of the backend against the fake Gemini server.
+
+By default the app is started in this process on a free port, with the model
+and Supabase pointed at a local fake_gemini_server, the result cache off and
+the rate-limit scheduler's quotas lifted, so the numbers reflect the backend
+itself. Pass --target to drive an app that is already running instead.
+
+Each scenario sends --requests requests from --concurrency threads and
+reports p50/p95/p99 latency and requests/sec. The upload scenario measures
+from the upload POST until the extracted text arrives over SSE.
+
+Usage:
+    python bench_load.py
+    python bench_load.py --scenarios analyze-essay grammar-check --requests 200 --concurrency 32
+    python bench_load.py --latency 2 --error-rate 0.05 --rate-limit-rate 0.05
+    python bench_load.py --target http://127.0.0.1:5000
+"""
+import argparse
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+SCENARIOS = ["analyze-essay", "grammar-check", "upload-sse", "student-progress", "list-essays", "style-profiles"]
+UPLOAD_SAMPLE = os.path.join("media", "Anchor  - 1_page_1.png")
+ESSAY_SAMPLE = os.path.join("media", "input.txt")
+REQUEST_TIMEOUT = 300
+
+_counter = itertools.count()
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def load_essay():
+    with open(ESSAY_SAMPLE, 'r', encoding='utf-8') as file:
+        return file.read()
+
+def unique_essay(essay):
+    # A distinct essay per request, so caches on the target can't answer it
+    return f"{essay}\n\nSubmission {next(_counter)}."
+
+def post_json(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+        return json.loads(response.read())
+
+def multipart(field, filename, data, mime_type):
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: {mime_type}\r\n\r\n").encode('utf-8') + data + f"\r\n--{boundary}--\r\n".encode('utf-8')
+    return body, f"multipart/form-data; boundary={boundary}"
+
+def sse_events(response):
+    """Yield the JSON payload of each data: frame from an SSE response."""
+    for line in response:
+        line = line.decode('utf-8').strip()
+        if line.startswith('data:'):
+            yield json.loads(line[5:])
+
+def analyze_essay(base_url, essay, upload):
+    result = post_json(f"{base_url}/api/analyze-essay", {'essay': unique_essay(essay)})
+    if not result.get('success'):
+        raise RuntimeError(result.get('error', 'analysis failed'))
+
+def grammar_check(base_url, essay, upload):
+    result = post_json(f"{base_url}/api/grammar-check", {'essay': unique_essay(essay)})
+    if not isinstance(result.get('corrections'), list):
+        raise RuntimeError(result.get('error', 'grammar check failed'))
+
+def upload_sse(base_url, essay, upload):
+    session_id = uuid.uuid4().hex
+    # Subscribe first; the stream only carries events published after it opens
+    stream = urllib.request.urlopen(f"{base_url}/api/upload-status/{session_id}", timeout=REQUEST_TIMEOUT)
+    try:
+        events = sse_events(stream)
+        next(events)  # the initial 'waiting' event
+        body, content_type = multipart('file', 'page.png', upload, 'image/png')
+        request = urllib.request.Request(f"{base_url}/api/upload/{session_id}", data=body,
+                                         headers={'Content-Type': content_type})
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            response.read()
+        for event in events:
+            if event.get('status') == 'success':
+                return
+            if event.get('status') == 'error':
+                raise RuntimeError(event.get('message'))
+        raise RuntimeError("status stream closed before the upload finished")
+    finally:
+        stream.close()
+
+def student_progress(base_url, essay, upload):
+    with urllib.request.urlopen(f"{base_url}/api/student-progress", timeout=REQUEST_TIMEOUT) as response:
+        result = json.loads(response.read())
+    if not result.get('success'):
+        raise RuntimeError(result.get('error', 'progress analysis failed'))
+    # The assignment PDF is built in the background; wait for it like the editor does
+    if result.get('assignment'):
+        with urllib.request.urlopen(f"{base_url}{result['assignment']['url']}", timeout=REQUEST_TIMEOUT) as response:
+            if response.headers.get('Content-Type') != 'application/pdf':
+                raise RuntimeError("assignment PDF was not ready")
+
+def list_essays(base_url, essay, upload):
+    with urllib.request.urlopen(f"{base_url}/api/list-essays", timeout=REQUEST_TIMEOUT) as response:
+        result = json.loads(response.read())
+    if not isinstance(result.get('essays'), list):
+        raise RuntimeError(result.get('error', 'listing failed'))
+
+def style_profiles(base_url, essay, upload):
+    with urllib.request.urlopen(f"{base_url}/api/style-profiles", timeout=REQUEST_TIMEOUT) as response:
+        result = json.loads(response.read())
+    if not result.get('success'):
+        raise RuntimeError(result.get('error', 'style profiling failed'))
+
+SCENARIO_FUNCTIONS = {
+    "analyze-essay": analyze_essay,
+    "grammar-check": grammar_check,
+    "upload-sse": upload_sse,
+    "student-progress": student_progress,
+    "list-essays": list_essays,
+    "style-profiles": style_profiles,
+}
+
+def run_scenario(name, base_url, requests, concurrency, essay, upload):
+    """Send `requests` requests for one scenario and summarise their latencies."""
+    function = SCENARIO_FUNCTIONS[name]
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+
+    def one(_):
+        start = time.perf_counter()
+        try:
+            function(base_url, essay, upload)
+        except Exception as e:
+            with lock:
+                message = str(e)[:120]
+                errors[message] = errors.get(message, 0) + 1
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"load-{name}") as executor:
+        list(executor.map(one, range(requests)))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'scenario': name,
+        'requests': requests,
+        'ok': len(latencies),
+        'errors': sum(errors.values()),
+        'rps': round(len(latencies) / wall, 2) if wall else 0.0,
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'errorMessages': errors,
+    }
+
+def start_local_app(args):
+    """Start a fake model server and the app in this process; returns (app base URL, fake server)."""
+    from fake_gemini_server import start_fake_server
+    fake = start_fake_server(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                             rate_limit_rate=args.rate_limit_rate, essays=[load_essay()] * args.essays,
+                             seed=args.seed)
+    print(f"Fake Gemini and Supabase on {fake.url}")
+
+    os.environ['GEMINI_BASE_URL'] = fake.url
+    os.environ['GEMINI_API_KEY'] = 'fake-key'
+    os.environ['SUPABASE_URL'] = fake.url
+    # supabase-py insists on a JWT-shaped key
+    os.environ['SUPABASE_KEY'] = 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.ZmFrZQ'
+    if not args.cache:
+        os.environ['RESULT_CACHE_ENABLED'] = '0'
+    for name in ('LLM_DEFAULT_RPM', 'LLM_PRO_RPM', 'LLM_FLASH_RPM'):
+        os.environ.setdefault(name, '1000000')
+    os.environ.setdefault('LLM_MAX_ATTEMPTS', '2')
+    # Start without stored assignment PDFs so builds are part of the run
+    os.environ.setdefault('ASSIGNMENT_DIR', tempfile.mkdtemp(prefix='bench-assignments-'))
+
+    # Imported only now: the app reads the settings above at import time
+    import logging
+    from werkzeug.serving import make_server
+    from app import app
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    # Keep load-test uploads out of the real uploads folder
+    app.config['UPLOAD_FOLDER'] = tempfile.mkdtemp(prefix='bench-load-')
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-app", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", fake
+
+def format_seconds(value):
+    return "-" if value is None else f"{value * 1000:.0f}ms"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", help="base URL of a running app (default: start one in-process)")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=50, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--essays", type=int, default=5, help="rows in the fake Essays table")
+    parser.add_argument("--cache", action="store_true", help="leave the result cache on")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    fake = None
+    base_url = args.target.rstrip('/') if args.target else None
+    if base_url is None:
+        base_url, fake = start_local_app(args)
+
+    essay = load_essay()
+    with open(UPLOAD_SAMPLE, 'rb') as file:
+        upload = file.read()
+
+    results = []
+    for name in args.scenarios:
+        result = run_scenario(name, base_url, args.requests, args.concurrency, essay, upload)
+        results.append(result)
+        if not args.json:
+            print(f"{name:18} ok {result['ok']:>4}/{result['requests']:<4} errors {result['errors']:>4}  "
+                  f"{result['rps']:>7.2f} req/s  p50 {format_seconds(result['p50']):>7}  "
+                  f"p95 {format_seconds(result['p95']):>7}  p99 {format_seconds(result['p99']):>7}")
+            for message, count in result['errorMessages'].items():
+                print(f"{'':18} {count} x {message}")
+
+    if args.json:
+        print(json.dumps({'results': results, 'fake': fake.counts if fake else None}, indent=2))
+    elif fake:
+        print(f"Fake model calls: {json.dumps(fake.counts)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Compare OCR payload size, preprocessing time and transcription accuracy across
+image preprocessing settings, using the sample files in media/.
+
+Usage:
+    python bench_ocr_preprocess.py                 # payload bytes and preprocessing latency only
+    python bench_ocr_preprocess.py --transcribe    # also call Gemini and score accuracy
+
+Accuracy is the character-level similarity (difflib ratio) of each setting's
+transcription against the baseline render (zoom 4.0 PNG, the old pipeline).
+"""
+import argparse
+import difflib
+import glob
+import os
+import time
+
+from pdf_to_png import iter_pdf_images
+from image_preprocess import iter_ocr_pages, preprocess_image_file
+
+# (label, kwargs); None marks the old full-resolution PNG pipeline
+SETTINGS = [
+    ("baseline zoom4 png", None),
+    ("rgb 2048 no-crop", dict(max_long_edge=2048, grayscale=False, crop=False)),
+    ("gray 2048", dict(max_long_edge=2048)),
+    ("gray 1600", dict(max_long_edge=1600)),
+    ("gray 1280", dict(max_long_edge=1280)),
+    ("gray 1024", dict(max_long_edge=1024)),
+]
+
+def sample_files(media_dir):
+    """PDFs plus the standalone page images in the media folder."""
+    pdfs = sorted(glob.glob(os.path.join(media_dir, "Anchor*.pdf")))
+    images = sorted(glob.glob(os.path.join(media_dir, "Anchor*_page_*.png")))
+    return pdfs + images
+
+def render(path, options):
+    """Return the list of (bytes, mime type) payloads a setting produces for a file."""
+    if path.endswith(".pdf"):
+        if options is None:
+            return list(iter_pdf_images(path, fmt="png", zoom=4.0))
+        return list(iter_ocr_pages(path, **options))
+    if options is None:
+        with open(path, "rb") as f:
+            return [(f.read(), "image/png")]
+    return [preprocess_image_file(path, **options)]
+
+def transcribe(payloads):
+    """Transcribe payloads, returning (joined text, seconds spent in the model)."""
+    from transcribe_from_image import transcribe_image_bytes
+    start = time.perf_counter()
+    texts = [transcribe_image_bytes(data, mime_type) or "" for data, mime_type in payloads]
+    return "\n".join(texts), time.perf_counter() - start
+
+def similarity(a, b):
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--media", default="media", help="folder with the sample files")
+    parser.add_argument("--transcribe", action="store_true", help="call the model and score accuracy")
+    args = parser.parse_args()
+
+    files = sample_files(args.media)
+    if not files:
+        parser.error(f"no sample files found in {args.media}")
+
+    baselines = {}
+    header = f"{'setting':<20} {'file':<28} {'pages':>5} {'KB':>8} {'prep ms':>8}"
+    if args.transcribe:
+        header += f" {'ocr s':>7} {'accuracy':>8}"
+    print(header)
+    totals = {}
+
+    for label, options in SETTINGS:
+        for path in files:
+            start = time.perf_counter()
+            payloads = render(path, options)
+            prep_ms = (time.perf_counter() - start) * 1000
+            size_kb = sum(len(data) for data, _ in payloads) / 1024
+            row = f"{label:<20} {os.path.basename(path)[:28]:<28} {len(payloads):>5} {size_kb:>8.0f} {prep_ms:>8.0f}"
+
+            total = totals.setdefault(label, [0.0, 0.0, 0.0, 0.0])
+            total[0] += size_kb
+            total[1] += prep_ms
+
+            if args.transcribe:
+                text, ocr_s = transcribe(payloads)
+                if options is None:
+                    baselines[path] = text
+                accuracy = similarity(baselines.get(path, ""), text)
+                row += f" {ocr_s:>7.1f} {accuracy:>8.3f}"
+                total[2] += ocr_s
+                total[3] += accuracy / len(files)
+            print(row)
+
+    print()
+    print(f"{'setting':<20} {'total KB':>9} {'prep ms':>8}" + (f" {'ocr s':>7} {'mean acc':>8}" if args.transcribe else ""))
+    for label, (size_kb, prep_ms, ocr_s, accuracy) in totals.items():
+        row = f"{label:<20} {size_kb:>9.0f} {prep_ms:>8.0f}"
+        if args.transcribe:
+            row += f" {ocr_s:>7.1f} {accuracy:>8.3f}"
+        print(row)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Micro-benchmark of the writing-style feature extraction.
+
+Times style_features() against the previous implementation, which lowercased
+and rescanned the essay once per indicator, on essays of several lengths
+built from the sample essay.
+
+Usage:
+    python bench_writing_style.py
+    python bench_writing_style.py --lengths 500 5000 50000 --repeat 200
+"""
+import argparse
+import os
+import re
+import timeit
+
+from writing_style import style_features, style_profile
+
+ESSAY_SAMPLE = os.path.join("media", "input.txt")
+DEFAULT_LENGTHS = [500, 2000, 8000, 32000]
+
+def legacy_features(essay_text):
+    """The metrics as the old determine_writing_style_hero computed them."""
+    sentences = re.split(r'[.!?]+', essay_text)
+    sentences = [s.strip() for s in sentences if s.strip()]
+    words = essay_text.lower().split()
+    unique_words = set(words)
+    avg_sentence_length = sum(len(s.split()) for s in sentences) / max(len(sentences), 1)
+    vocabulary_richness = len(unique_words) / max(len(words), 1)
+    descriptive_words = ['beautiful', 'amazing', 'wonderful', 'incredible', 'stunning',
+                         'gorgeous', 'fascinating', 'lovely', 'colorful', 'vivid', 'bright',
+                         'brilliant', 'magnificent', 'fantastic', 'extraordinary']
+    descriptive_ratio = sum(1 for word in words if word in descriptive_words) / max(len(words), 1)
+    complex_indicators = [', which', ', where', ', when', ', who', ', because',
+                          '; however', '; therefore', ', though', ', although', ', yet']
+    complex_ratio = sum(1 for indicator in complex_indicators if indicator in essay_text.lower()) / max(len(sentences), 1)
+    passive_indicators = [' is ', ' are ', ' was ', ' were ', ' be ', ' been ']
+    passive_ratio = sum(essay_text.lower().count(indicator) for indicator in passive_indicators) / max(len(sentences), 1)
+    reasoning = any(x in essay_text.lower() for x in ['therefore', 'thus', 'consequently', 'as a result'])
+    ordering = any(x in essay_text.lower() for x in ['first', 'second', 'third', 'finally', 'in conclusion'])
+    first_person = essay_text.lower().count("i ")
+    second_person = essay_text.lower().count("you ")
+    return (avg_sentence_length, vocabulary_richness, descriptive_ratio, complex_ratio, passive_ratio,
+            reasoning, ordering, first_person, second_person)
+
+def build_essay(sample, length):
+    return (sample.strip() + "\n\n") * (length // max(len(sample), 1) + 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", type=int, nargs="+", default=DEFAULT_LENGTHS, help="essay lengths in characters")
+    parser.add_argument("--repeat", type=int, default=100, help="calls timed per measurement")
+    args = parser.parse_args()
+
+    with open(ESSAY_SAMPLE, 'r', encoding='utf-8') as file:
+        sample = file.read()
+
+    print(f"{'chars':>6} {'legacy us':>10} {'features us':>12} {'profile us':>11} {'speedup':>8}")
+    for length in args.lengths:
+        essay = build_essay(sample, length)[:length]
+        timings = []
+        for function in (legacy_features, style_features, style_profile):
+            # Best of 5 runs, per call
+            best = min(timeit.repeat(lambda: function(essay), number=args.repeat, repeat=5))
+            timings.append(best / args.repeat * 1e6)
+        print(f"{len(essay):>6} {timings[0]:>10.1f} {timings[1]:>12.1f} {timings[2]:>11.1f} "
+              f"{timings[0] / timings[1]:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
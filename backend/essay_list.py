@@ -0,0 +1,206 @@
+"""
+Paged, column-projected reads of the Essays table for the essay browser.
+
+Pages are keyset-paginated on id (newest first), so fetching any page costs
+the same however large the table grows, and only the columns needed for the
+requested fields are selected. Scores are read with JSON paths into the
+grading, so a list page doesn't download whole gradings; titles still need
+the essay body, as PostgREST can't select part of a text column. Rendered pages are kept for a few seconds so
+repeated opens of the browser don't each go to Supabase.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from supabase_functions import execute_with_retry
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Seconds a rendered page is served from memory before Supabase is asked again
+LIST_CACHE_TTL = float(os.getenv("LIST_CACHE_TTL", "10"))
+LIST_CACHE_MAX_ENTRIES = 256
+TITLE_MAX_CHARS = 80
+# Rubric categories read per essay for its scores
+MAX_SCORE_CATEGORIES = 12
+
+# Category and score of each RubricScore in the grading, as aliased JSON-path columns
+SCORE_COLUMNS = tuple(column for index in range(MAX_SCORE_CATEGORIES) for column in (
+    f"category_{index}:grading->{index}->>category", f"score_{index}:grading->{index}->score"))
+# Fields a client may ask for, and the Essays columns each one is built from
+FIELD_COLUMNS = {
+    'id': ('id',),
+    'created_at': ('created_at',),
+    'title': ('essay_body',),
+    'scores': SCORE_COLUMNS,
+    'essay_body': ('essay_body',),
+    'grading': ('grading',),
+}
+# What the list view needs: no full gradings
+DEFAULT_FIELDS = ('id', 'title', 'created_at', 'scores')
+
+class ListQueryError(ValueError):
+    """Raised for malformed fields, limit or cursor query parameters"""
+    pass
+
+def parse_fields(value):
+    """Parse a comma-separated fields parameter into a tuple of known field names."""
+    if not value:
+        return DEFAULT_FIELDS
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in FIELD_COLUMNS]
+    if unknown:
+        raise ListQueryError(f"Unknown fields: {', '.join(unknown)} (available: {', '.join(FIELD_COLUMNS)})")
+    return fields or DEFAULT_FIELDS
+
+def parse_limit(value):
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ListQueryError(f"limit must be an integer, got {value!r}")
+    if limit < 1:
+        raise ListQueryError("limit must be at least 1")
+    return min(limit, MAX_PAGE_SIZE)
+
+def parse_cursor(value):
+    """The cursor is the id of the last essay on the previous page."""
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ListQueryError(f"Invalid cursor: {value!r}")
+
+def essay_title(body):
+    """First non-empty line of the essay, shortened for display."""
+    for line in (body or '').splitlines():
+        line = line.strip()
+        if line:
+            return line if len(line) <= TITLE_MAX_CHARS else line[:TITLE_MAX_CHARS - 1].rstrip() + "…"
+    return ""
+
+def score_summary(grading):
+    """Reduce a stored grading (a JSON list of RubricScore) to [{'category', 'score'}]."""
+    if isinstance(grading, str):
+        try:
+            grading = json.loads(grading)
+        except json.JSONDecodeError:
+            return []
+    if not isinstance(grading, list):
+        return []
+    return [{'category': item.get('category'), 'score': item.get('score')}
+            for item in grading if isinstance(item, dict)]
+
+def selected_scores(row):
+    """[{'category', 'score'}] from a row's SCORE_COLUMNS, or None if they hold no scores."""
+    scores = [{'category': row.get(f"category_{index}"), 'score': row.get(f"score_{index}")}
+              for index in range(MAX_SCORE_CATEGORIES) if row.get(f"category_{index}") is not None]
+    return scores or None
+
+def project(row, fields):
+    """Build the client-facing dict for one Essays row."""
+    essay = {}
+    for field in fields:
+        if field == 'title':
+            essay['title'] = essay_title(row.get('essay_body'))
+        elif field == 'scores':
+            scores = selected_scores(row)
+            essay['scores'] = scores if scores is not None else score_summary(row.get('grading'))
+        else:
+            essay[field] = row.get(field)
+    return essay
+
+def _add_legacy_gradings(supabase, rows):
+    """
+    Fetch the full grading of rows whose scores the JSON paths didn't find.
+
+    Those are un-graded rows and gradings stored as a JSON-encoded string by
+    older versions, which JSON paths can't look into.
+    """
+    missing = [row['id'] for row in rows if selected_scores(row) is None and 'grading' not in row]
+    if not missing:
+        return
+    gradings = {item['id']: item.get('grading') for item in execute_with_retry(
+        lambda: supabase.table("Essays").select("id,grading").in_("id", missing)).data or []}
+    for row in rows:
+        if row['id'] in gradings:
+            row['grading'] = gradings[row['id']]
+
+def fetch_page(supabase, fields=DEFAULT_FIELDS, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """
+    Fetch one page of essays, newest first.
+
+    Args:
+        supabase (Client): Supabase client
+        fields (tuple): Fields to return for each essay
+        limit (int): Page size
+        cursor (int, optional): Return essays with ids below this one
+
+    Returns:
+        dict: {'essays': [...], 'nextCursor': str or None}
+    """
+    columns = sorted({'id'}.union(*(FIELD_COLUMNS[field] for field in fields)))
+    def query():
+        # One extra row tells us whether there is a next page without a count query
+        builder = supabase.table("Essays").select(",".join(columns)).order("id", desc=True).limit(limit + 1)
+        return builder if cursor is None else builder.lt("id", cursor)
+    rows = execute_with_retry(query).data or []
+    page = rows[:limit]
+    if 'scores' in fields:
+        _add_legacy_gradings(supabase, page)
+    return {
+        'essays': [project(row, fields) for row in page],
+        'nextCursor': str(page[-1]['id']) if len(rows) > limit else None,
+    }
+
+def fetch_essay(supabase, essay_id, fields=None):
+    """Fetch a single essay with the given fields (default: every column), or None."""
+    fields = fields or tuple(FIELD_COLUMNS)
+    columns = sorted({'id'}.union(*(FIELD_COLUMNS[field] for field in fields)))
+    rows = execute_with_retry(
+        lambda: supabase.table("Essays").select(",".join(columns)).eq("id", essay_id).limit(1)).data
+    if rows and 'scores' in fields:
+        _add_legacy_gradings(supabase, rows)
+    return project(rows[0], fields) if rows else None
+
+def render(payload):
+    """Serialize a payload once, returning (JSON bytes, ETag value)."""
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return body, hashlib.sha256(body).hexdigest()[:32]
+
+class PageCache:
+    """Small in-memory LRU of rendered pages that expire after `ttl` seconds."""
+    def __init__(self, ttl=LIST_CACHE_TTL, max_entries=LIST_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires, value)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every page, e.g. after essays were written."""
+        with self.lock:
+            self.entries.clear()
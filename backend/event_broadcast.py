@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+from collections import deque
+
+# Seconds between keep-alive comments on an idle stream; also how quickly a
+# dropped client is noticed, since the next write to it fails
+SSE_HEARTBEAT_INTERVAL = 15
+# Sessions with no listeners and no events for this long are dropped
+SSE_SESSION_IDLE_TTL = 30 * 60
+# Events kept per session for Last-Event-ID replay after a reconnect
+SSE_REPLAY_BUFFER = 50
+
+class Session:
+    """Event history and wake-up condition shared by every listener of one session"""
+    def __init__(self, buffer_size):
+        self.events = deque(maxlen=buffer_size)  # (event id, data)
+        self.last_id = 0
+        self.listeners = 0
+        self.last_activity = time.monotonic()
+        self.condition = threading.Condition()
+
+class SessionBroadcaster:
+    """
+    Fan-out of upload progress events to SSE listeners, grouped by session.
+
+    Unlike a queue per listener, every listener reads from the session's ring
+    buffer with its own cursor, so a slow client is never dropped and a client
+    that reconnects with Last-Event-ID gets the events it missed. Listeners
+    only block in Condition.wait(), which cooperates with gevent when the app
+    runs under an evented server (see wsgi.py), so open streams need not pin
+    one OS thread each.
+    """
+    def __init__(self, heartbeat_interval=SSE_HEARTBEAT_INTERVAL,
+                 idle_ttl=SSE_SESSION_IDLE_TTL, buffer_size=SSE_REPLAY_BUFFER):
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_ttl = idle_ttl
+        self.buffer_size = buffer_size
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def _session(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = self.sessions[session_id] = Session(self.buffer_size)
+            return session
+
+    def publish(self, session_id, data, event_id=None):
+        """
+        Append an event to the session's history and wake its listeners.
+
+        event_id lets a shared backend keep ids consistent across processes;
+        it must increase within a session. By default ids count up per session.
+        """
+        session = self._session(session_id)
+        with session.condition:
+            session.last_id = event_id if event_id is not None else session.last_id + 1
+            session.events.append((session.last_id, data))
+            session.last_activity = time.monotonic()
+            session.condition.notify_all()
+        self.evict_idle()
+        return session.last_id
+
+    def stream(self, session_id, last_event_id=None):
+        """
+        Generate SSE frames for a session until the client goes away.
+
+        Args:
+            session_id (str): Session to follow
+            last_event_id (str, optional): Last-Event-ID header sent by a reconnecting client
+
+        Yields:
+            str: Server-sent event frames, including keep-alive comments
+        """
+        self.evict_idle()
+        session = self._session(session_id)
+        with session.condition:
+            session.listeners += 1
+            session.last_activity = time.monotonic()
+            cursor = session.last_id
+            if last_event_id is not None:
+                try:
+                    cursor = min(int(last_event_id), session.last_id)
+                except ValueError:
+                    pass
+
+        try:
+            yield "retry: 3000\n\n"
+            if last_event_id is None:
+                yield f"data: {json.dumps({'status': 'waiting'})}\n\n"
+
+            while True:
+                with session.condition:
+                    if session.last_id <= cursor:
+                        session.condition.wait(timeout=self.heartbeat_interval)
+                    pending = [(event_id, data) for event_id, data in session.events if event_id > cursor]
+
+                if not pending:
+                    yield ": heartbeat\n\n"
+                    continue
+                for event_id, data in pending:
+                    cursor = event_id
+                    yield f"id: {event_id}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            with session.condition:
+                session.listeners -= 1
+                session.last_activity = time.monotonic()
+
+    def evict_idle(self, force=False):
+        """Drop sessions that have had no listeners or events for idle_ttl seconds."""
+        now = time.monotonic()
+        if not force and now - self._last_sweep < self.heartbeat_interval:
+            return 0
+        self._last_sweep = now
+        with self.lock:
+            idle = [session_id for session_id, session in self.sessions.items()
+                    if session.listeners == 0 and now - session.last_activity > self.idle_ttl]
+            for session_id in idle:
+                del self.sessions[session_id]
+        return len(idle)
+
+    def stats(self):
+        with self.lock:
+            sessions = list(self.sessions.values())
+        return {
+            'sessions': len(sessions),
+            'listeners': sum(session.listeners for session in sessions),
+        }
@@ -0,0 +1,106 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from event_broadcast import SessionBroadcaster
+
+# "memory" keeps events inside this process; "sqlite" shares them between
+# every worker process on the host through a local database file
+EVENT_BUS = os.getenv("EVENT_BUS", "memory")
+EVENT_BUS_PATH = os.getenv(
+    "EVENT_BUS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "events.sqlite3")
+)
+# How often each process checks the shared log for events from other workers
+EVENT_BUS_POLL_INTERVAL = float(os.getenv("EVENT_BUS_POLL_INTERVAL", "0.2"))
+# Events older than this are deleted from the shared log
+EVENT_BUS_RETENTION = 10 * 60
+
+class SQLiteEventBus(SessionBroadcaster):
+    """
+    Event bus shared by worker processes through an append-only SQLite log.
+
+    publish() only appends a row. A single tail thread per process reads new
+    rows and hands them to the in-process broadcaster, so SSE listeners in any
+    worker see events published by any other. Row ids double as SSE event ids,
+    which keeps Last-Event-ID replay valid when a client reconnects to a
+    different worker.
+    """
+    def __init__(self, path=EVENT_BUS_PATH, poll_interval=EVENT_BUS_POLL_INTERVAL,
+                 retention=EVENT_BUS_RETENTION, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created REAL NOT NULL
+            )""")
+        conn.commit()
+        # Only deliver events published after this process started
+        self.cursor = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+        conn.close()
+
+        self._local = threading.local()
+        self._tail = threading.Thread(target=self._tail_loop, name="event-bus-tail", daemon=True)
+        self._tail.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def publish(self, session_id, data, event_id=None):
+        """Append an event to the shared log; the tail thread delivers it locally."""
+        conn = self._conn()
+        cursor = conn.execute(
+            "INSERT INTO events (session_id, data, created) VALUES (?, ?, ?)",
+            (session_id, json.dumps(data), time.time())
+        )
+        conn.commit()
+        return cursor.lastrowid
+
+    def _tail_loop(self):
+        conn = self._connect()
+        last_prune = 0
+        while True:
+            try:
+                rows = conn.execute(
+                    "SELECT id, session_id, data FROM events WHERE id > ? ORDER BY id",
+                    (self.cursor,)
+                ).fetchall()
+                for event_id, session_id, data in rows:
+                    SessionBroadcaster.publish(self, session_id, json.loads(data), event_id=event_id)
+                    self.cursor = event_id
+
+                now = time.time()
+                if now - last_prune > self.retention:
+                    conn.execute("DELETE FROM events WHERE created < ?", (now - self.retention,))
+                    conn.commit()
+                    last_prune = now
+            except sqlite3.Error as e:
+                print(f"Event bus poll failed: {str(e)}")
+            time.sleep(self.poll_interval)
+
+def create_event_bus(kind=None):
+    """Build the event bus selected by EVENT_BUS ("memory" or "sqlite")."""
+    kind = kind or EVENT_BUS
+    if kind == "memory":
+        return SessionBroadcaster()
+    if kind == "sqlite":
+        return SQLiteEventBus()
+    raise ValueError(f"Unknown event bus: {kind}")
@@ -0,0 +1,376 @@
+"""
+Local stand-in for the Gemini API, so load tests don't spend real quota.
+
+It answers the generateContent, streamGenerateContent and cachedContents calls
+the google-genai client makes, producing responses that match the request's
+response schema: rubric scores and grammar corrections whose indexes point
+into the essay that was sent, EssayProgress and assignment objects, and plain
+text for transcriptions. Latency, server errors and 429s are configurable.
+
+It also serves a minimal Supabase (PostgREST) Essays table, so endpoints that
+read essays, like /api/student-progress, can run without a real project.
+
+Usage:
+    python fake_gemini_server.py --port 8089 --latency 0.8 --jitter 0.4 --error-rate 0.02
+    GEMINI_BASE_URL=http://127.0.0.1:8089 SUPABASE_URL=http://127.0.0.1:8089 python app.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+MODEL_PATH = re.compile(r"^/v1beta/models/([^:/]+):(generateContent|streamGenerateContent)$")
+ESSAY_TAG = re.compile(r"<essay>\s*(.*?)\s*</essay>", re.DOTALL)
+PARAGRAPH_TAG = re.compile(r'<paragraph number="(\d+)">\n(.*?)\n</paragraph>', re.DOTALL)
+WORD = re.compile(r"[A-Za-z']{3,}")
+
+# Same rough heuristics as llm_scheduler, so reported usage looks plausible
+CHARS_PER_TOKEN = 4
+TOKENS_PER_IMAGE = 258
+
+SAMPLE_SENTENCES = [
+    "The time we went to the beach was the best day of the summer.",
+    "My brother and me built a sandcastle that was taller than our dog.",
+    "When the waves came in they knocked it over but we didnt care.",
+    "After lunch we walked along the shore looking for shells.",
+    "I found a shell that was shaped like a star and I keeped it.",
+    "On the way home everyone fell asleep in the car except my dad.",
+]
+RUBRIC_CATEGORIES = ["Ideas", "Organization", "Voice", "Word Choice", "Sentence Fluency", "Conventions"]
+SAMPLE_MISTAKES = ["Run-on sentences", "Missing apostrophes in contractions",
+                   "Irregular past tense verbs", "Comma splices", "Subject-pronoun case"]
+
+def request_text(body):
+    """All text parts of a generateContent request, and how many inline images it had."""
+    texts = []
+    images = 0
+    contents = list(body.get('contents') or [])
+    if body.get('systemInstruction'):
+        contents.append(body['systemInstruction'])
+    for content in contents:
+        for part in content.get('parts') or []:
+            if 'text' in part:
+                texts.append(part['text'])
+            elif 'inlineData' in part or 'fileData' in part:
+                images += 1
+    return "\n".join(texts), images
+
+def select_column(row, column):
+    """(name, value) for a select entry: a column, or an aliased JSON path like alias:col->0->>key."""
+    alias, _, path = column.rpartition(':')
+    parts = re.split(r"(->>?)", path)
+    value = row.get(parts[0])
+    for arrow, key in zip(parts[1::2], parts[2::2]):
+        key = int(key) if key.isdigit() else key
+        if isinstance(value, list) and isinstance(key, int):
+            value = value[key] if key < len(value) else None
+        elif isinstance(value, dict) and not isinstance(key, int):
+            value = value.get(key)
+        else:
+            value = None
+        if arrow == '->>' and value is not None and not isinstance(value, str):
+            value = json.dumps(value)
+    return alias or parts[0], value
+
+def select_rows(rows, query):
+    """Apply the PostgREST select, eq/lt/gt/in filters, order, offset and limit parameters the app uses."""
+    tests = {'eq': lambda a, b: a == b, 'lt': lambda a, b: a < b, 'gt': lambda a, b: a > b,
+             'in': lambda a, b: str(a) in b.strip('()').split(',')}
+    for column, values in query.items():
+        for value in values:
+            operator, _, operand = value.partition('.')
+            if column in ('select', 'order', 'offset', 'limit') or operator not in tests:
+                continue
+            if operator != 'in':
+                operand = int(operand) if operand.lstrip('-').isdigit() else operand
+            rows = [row for row in rows if row.get(column) is not None and tests[operator](row[column], operand)]
+    order = query.get('order', ['id.asc'])[0]
+    column, _, direction = order.partition('.')
+    rows = sorted(rows, key=lambda row: row.get(column), reverse=direction.startswith('desc'))
+    offset = int(query.get('offset', ['0'])[0])
+    limit = int(query.get('limit', [str(len(rows))])[0])
+    rows = rows[offset:offset + limit]
+    columns = query.get('select', ['*'])[0]
+    if columns != '*':
+        names = columns.split(',')
+        rows = [dict(select_column(row, name) for name in names) for row in rows]
+    return rows
+
+def _type(schema):
+    return str(schema.get('type', '')).lower()
+
+class ResponseFactory:
+    """Builds schema-valid fake values for one request."""
+    def __init__(self, prompt, rng):
+        self.rng = rng
+        match = ESSAY_TAG.search(prompt)
+        self.essay = match.group(1) if match else ""
+        self.words = [(m.start(), m.group()) for m in WORD.finditer(self.essay)]
+        # Numbered paragraphs of a batched grammar check
+        self.paragraphs = [(int(m.group(1)), m.group(2)) for m in PARAGRAPH_TAG.finditer(prompt)]
+
+    def sentence(self):
+        return self.rng.choice(SAMPLE_SENTENCES)
+
+    def span(self, length=20):
+        if not self.essay:
+            return 0, 0
+        start = self.rng.randrange(len(self.essay))
+        return start, min(len(self.essay), start + length)
+
+    def value(self, schema, name=None):
+        kind = _type(schema)
+        if kind == 'array':
+            items = schema.get('items', {})
+            if 'category' in items.get('properties', {}):
+                return [self.rubric_score(items, category) for category in RUBRIC_CATEGORIES]
+            if 'paragraph' in items.get('properties', {}):
+                return [{'paragraph': number, **correction}
+                        for number, text in self.paragraphs for correction in self.corrections(text)]
+            if 'starting_index' in items.get('properties', {}):
+                return self.corrections()
+            if name == 'common_mistakes':
+                return self.rng.sample(SAMPLE_MISTAKES, 3)
+            return [self.value(items, name) for _ in range(self.rng.randint(2, 3))]
+        if kind == 'object':
+            properties = schema.get('properties', {})
+            result = {key: self.value(sub, key) for key, sub in properties.items()}
+            if 'start_index' in properties and 'end_index' in properties:
+                result['start_index'], result['end_index'] = self.span()
+            return result
+        if kind == 'integer':
+            return self.rng.randint(1, 5) if name == 'score' else self.rng.randint(0, 10)
+        if kind == 'number':
+            return round(self.rng.random(), 3)
+        if kind == 'boolean':
+            return self.rng.random() < 0.5
+        if schema.get('enum'):
+            return self.rng.choice(schema['enum'])
+        return self.sentence()
+
+    def rubric_score(self, schema, category):
+        score = self.value(schema)
+        score['category'] = category
+        return score
+
+    def corrections(self, text=None):
+        """Misspell-style corrections at real word offsets in the essay, or in `text`."""
+        words = self.words if text is None else [(m.start(), m.group()) for m in WORD.finditer(text)]
+        if not words:
+            return []
+        # Longer texts have proportionally more errors
+        count = self.rng.randint(1, 6) * max(1, len(words) // 150)
+        picked = sorted(self.rng.sample(words, min(len(words), count)))
+        return [{'error': word, 'starting_index': start, 'corrected': word.capitalize() if word.islower() else word.lower()}
+                for start, word in picked]
+
+    def transcription(self):
+        return "\n".join(self.rng.sample(SAMPLE_SENTENCES, 4))
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    """
+    HTTP server holding the fake's settings and counters.
+
+    Args:
+        address (tuple): (host, port); port 0 picks a free port
+        latency (float): Mean seconds before a response starts
+        jitter (float): Latency varies uniformly by +/- this many seconds
+        error_rate (float): Fraction of model calls answered with a 500
+        rate_limit_rate (float): Fraction of model calls answered with a 429
+        stream_chunks (int): Chunks a streamed response is split into
+        output_latency (float): Extra seconds per 1000 characters of response, like token generation
+        essays (list, optional): Essay bodies served from the Essays table
+        seed (int, optional): Seed for reproducible responses
+    """
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.5, jitter=0.2, error_rate=0.0, rate_limit_rate=0.0,
+                 stream_chunks=6, output_latency=0.0, essays=None, seed=None):
+        super().__init__(address, FakeGeminiHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.stream_chunks = stream_chunks
+        self.output_latency = output_latency
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.essays = [{'id': i + 1, 'essay_body': essay, 'grading': '{}', 'student_id': 'student-1',
+                        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() - 3600 * i))}
+                       for i, essay in enumerate(essays or [" ".join(SAMPLE_SENTENCES)])]
+        self.counts = {'requests': 0, 'errors': 0, 'rateLimited': 0}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def random(self):
+        """A per-request generator, so handler threads don't share one RNG state."""
+        with self.rng_lock:
+            return random.Random(self.rng.random())
+
+    def delay(self, rng):
+        return max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+
+    def count(self, key):
+        with self.rng_lock:
+            self.counts[key] += 1
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/rest/v1/Essays':
+            return self.send_json(200, select_rows(self.server.essays, parse_qs(url.query)))
+        self.send_json(404, {'error': {'code': 404, 'message': f'No fake for {url.path}', 'status': 'NOT_FOUND'}})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.read_json()
+        match = MODEL_PATH.match(url.path)
+        if match:
+            return self.model_call(match.group(1), match.group(2) == 'streamGenerateContent', body)
+        if url.path == '/v1beta/cachedContents':
+            return self.send_json(200, {
+                'name': f'cachedContents/{uuid.uuid4().hex}',
+                'model': body.get('model', ''),
+                'expireTime': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() + 3600)),
+            })
+        if url.path == '/rest/v1/Essays' and 'merge-duplicates' in (self.headers.get('Prefer') or ''):
+            # Upserts onto existing rows apply, so write-backs can be read again
+            rows = {row['id']: row for row in self.server.essays}
+            for item in body if isinstance(body, list) else [body]:
+                if item.get('id') in rows:
+                    rows[item['id']].update(item)
+            return self.send_json(201, [])
+        if url.path.startswith('/rest/v1/'):
+            # Inserts and other upserts are accepted and discarded
+            return self.send_json(201, [])
+        self.send_json(404, {'error': {'code': 404, 'message': f'No fake for {url.path}', 'status': 'NOT_FOUND'}})
+
+    def do_PATCH(self):
+        url = urlparse(self.path)
+        body = self.read_json()
+        if url.path == '/rest/v1/Essays':
+            # Updates apply to the matching rows, so write-backs can be read again
+            for row in select_rows(self.server.essays, parse_qs(url.query)):
+                row.update(body)
+        self.send_json(200, [])
+
+    def do_DELETE(self):
+        self.read_json()
+        self.send_json(200, [])
+
+    def model_call(self, model, stream, body):
+        server = self.server
+        rng = server.random()
+        server.count('requests')
+        time.sleep(server.delay(rng) / (server.stream_chunks if stream else 1))
+
+        roll = rng.random()
+        if roll < server.rate_limit_rate:
+            server.count('rateLimited')
+            return self.send_json(429, {'error': {'code': 429, 'message': 'Resource has been exhausted (fake quota).',
+                                                  'status': 'RESOURCE_EXHAUSTED'}})
+        if roll < server.rate_limit_rate + server.error_rate:
+            server.count('errors')
+            return self.send_json(500, {'error': {'code': 500, 'message': 'Internal error (fake).', 'status': 'INTERNAL'}})
+
+        prompt, images = request_text(body)
+        factory = ResponseFactory(prompt, rng)
+        config = body.get('generationConfig') or {}
+        schema = config.get('responseSchema') or config.get('responseJsonSchema')
+        if schema:
+            text = json.dumps(factory.value(schema))
+        elif images:
+            text = factory.transcription()
+        else:
+            text = factory.sentence()
+
+        if server.output_latency:
+            time.sleep(len(text) / 1000 * server.output_latency)
+
+        usage = {
+            'promptTokenCount': len(prompt) // CHARS_PER_TOKEN + images * TOKENS_PER_IMAGE,
+            'candidatesTokenCount': len(text) // CHARS_PER_TOKEN,
+        }
+        usage['totalTokenCount'] = usage['promptTokenCount'] + usage['candidatesTokenCount']
+        if not stream:
+            return self.send_json(200, self.response(model, text, usage))
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        size = max(1, -(-len(text) // server.stream_chunks))
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(server.delay(rng) / server.stream_chunks)
+            last = i == len(pieces) - 1
+            chunk = self.response(model, piece, usage, finished=last)
+            self.wfile.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode('utf-8'))
+            self.wfile.flush()
+
+    @staticmethod
+    def response(model, text, usage, finished=True):
+        candidate = {'content': {'parts': [{'text': text}], 'role': 'model'}, 'index': 0}
+        if finished:
+            candidate['finishReason'] = 'STOP'
+        return {'candidates': [candidate], 'usageMetadata': usage, 'modelVersion': model}
+
+def start_fake_server(host="127.0.0.1", port=0, **options):
+    """Start a FakeGeminiServer on a daemon thread and return it; see FakeGeminiServer for options."""
+    server = FakeGeminiServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name="fake-gemini", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.5, help="mean response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="latency varies by +/- this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls that return a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of calls that return a 429")
+    parser.add_argument("--output-latency", type=float, default=0.0, help="extra seconds per 1000 response characters")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = FakeGeminiServer((args.host, args.port), latency=args.latency, jitter=args.jitter,
+                              error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                              output_latency=args.output_latency, seed=args.seed)
+    print(f"Fake Gemini listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.counts))
+
+if __name__ == "__main__":
+    main()
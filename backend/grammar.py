@@ -1,10 +1,14 @@
-from google import genai
 from google.genai import types
-from dotenv import load_dotenv
-import os
+from llm_client import generate
 from typing_extensions import TypedDict, List
-
-load_dotenv()
+from result_cache import cached_call, cache_lookup, cache_store
+from metrics import timed
+from local_checks import local_corrections, LOCAL_CHECKS_VERSION
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import json
+import os
+import re
 
 class ErrorCorrection(TypedDict):
     """
@@ -19,18 +23,340 @@ class ErrorCorrection(TypedDict):
     starting_index: int
     corrected: str
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+class ParagraphCorrection(TypedDict):
+    """
+    An ErrorCorrection from a check of several paragraphs at once.
+    
+    Attributes:
+        paragraph (int): Number of the paragraph the error is in, from 1.
+        error (str): The error.
+        starting_index (int): The starting character index of the error in its paragraph.
+        corrected (str): The corrected version of the error.
+    """
+    paragraph: int
+    error: str
+    starting_index: int
+    corrected: str
+
+GRAMMAR_MODEL = "gemini-2.0-pro-exp-02-05"
+# Bump when the grammar prompt changes so cached results are not reused
+GRAMMAR_PROMPT_VERSION = "1"
+# The errors the local checks find are listed in the prompt; they depend only on
+# the text and the checks' version, so that version is part of the cache key too
+GRAMMAR_CACHE_VERSION = f"{GRAMMAR_PROMPT_VERSION}+local{LOCAL_CHECKS_VERSION}"
+# Paragraphs or chunks checked at once
+GRAMMAR_WORKERS = int(os.getenv("GRAMMAR_WORKERS", "4"))
+# Longer text is checked in chunks of about this many characters
+GRAMMAR_CHUNK_CHARS = int(os.getenv("GRAMMAR_CHUNK_CHARS", "4000"))
+# Characters of whole sentences each chunk repeats from the one before
+GRAMMAR_CHUNK_OVERLAP = int(os.getenv("GRAMMAR_CHUNK_OVERLAP", "300"))
+# Paragraphs are separated by blank lines, which is how the editor joins blocks
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n\s*")
+# End of a sentence: terminal punctuation (plus closing quotes/brackets) and whitespace, or a line break
+SENTENCE_BREAK = re.compile(r"[.!?]+[\"'\u201d\u2019)\]]*\s+|\n\s*")
 
+@timed("grammar")
 def corrections_from_essay(essay):
+    return _cached_corrections(essay)
+
+def _cached_corrections(text):
+    known = local_corrections(text)
+    return cached_call(
+        "corrections_from_essay", GRAMMAR_MODEL, GRAMMAR_CACHE_VERSION, text,
+        lambda: _corrections_from_essay(text, known),
+        should_cache=lambda result: not isinstance(result, str)
+    )
+
+def split_paragraphs(essay):
+    """Split text on blank lines into [(starting index, paragraph)], skipping empty paragraphs."""
+    paragraphs = []
+    start = 0
+    for match in PARAGRAPH_BREAK.finditer(essay):
+        if essay[start:match.start()].strip():
+            paragraphs.append((start, essay[start:match.start()]))
+        start = match.end()
+    if essay[start:].strip():
+        paragraphs.append((start, essay[start:]))
+    return paragraphs
+
+def locate(text, error, hint):
+    """Index of the occurrence of `error` in text closest to `hint`, or None if it doesn't occur."""
+    if not error:
+        return None
+    hint = hint if isinstance(hint, int) else 0
+    if hint >= 0 and text.startswith(error, hint):
+        return hint
+    best = None
+    index = text.find(error)
+    while index != -1:
+        if best is None or abs(index - hint) < abs(best - hint):
+            best = index
+        if index > hint:
+            break
+        index = text.find(error, index + 1)
+    return best
+
+def remap_corrections(corrections, text, offset):
+    """
+    Shift corrections found in `text` by `offset`, fixing each starting_index
+    to where its error text actually is. Corrections whose error text isn't in
+    `text` can't be highlighted and are dropped.
+    """
+    remapped = []
+    for correction in corrections:
+        if not isinstance(correction, dict):
+            continue
+        index = locate(text, correction.get('error'), correction.get('starting_index'))
+        if index is not None:
+            remapped.append({**correction, 'starting_index': offset + index})
+    return remapped
+
+def sentence_spans(text):
+    """[(start, end)] of the sentences in text, each including its trailing whitespace."""
+    spans = []
+    start = 0
+    for match in SENTENCE_BREAK.finditer(text):
+        if match.end() > start:
+            spans.append((start, match.end()))
+            start = match.end()
+    if start < len(text):
+        spans.append((start, len(text)))
+    return spans
+
+def _bounded_spans(text, max_chars):
+    """Sentence spans, with sentences longer than max_chars split at whitespace."""
+    for start, end in sentence_spans(text):
+        while end - start > max_chars:
+            cut = text.rfind(' ', start + 1, start + max_chars)
+            cut = cut + 1 if cut != -1 else start + max_chars
+            yield start, cut
+            start = cut
+        yield start, end
+
+def chunk_text(text, offset=0, chunk_chars=None, overlap_chars=None):
+    """
+    Split text into chunks of whole sentences for separate grammar checks.
+    
+    Each chunk after the first repeats the last sentences of the one before,
+    up to overlap_chars, so errors spanning a boundary are seen whole.
+    
+    Returns:
+        list: [(starting index in the essay, chunk text)]
+    """
+    chunk_chars = chunk_chars or GRAMMAR_CHUNK_CHARS
+    overlap_chars = GRAMMAR_CHUNK_OVERLAP if overlap_chars is None else overlap_chars
+    if len(text) <= chunk_chars:
+        return [(offset, text)]
+    spans = list(_bounded_spans(text, chunk_chars))
+    chunks = []
+    first = 0
+    while first < len(spans):
+        last = first
+        while last + 1 < len(spans) and spans[last + 1][1] - spans[first][0] <= chunk_chars:
+            last += 1
+        chunks.append((offset + spans[first][0], text[spans[first][0]:spans[last][1]]))
+        if last == len(spans) - 1:
+            break
+        # Step back over trailing sentences that fit in the overlap, always moving forward
+        next_first = last + 1
+        while next_first - 1 > first and spans[last][1] - spans[next_first - 1][0] <= overlap_chars:
+            next_first -= 1
+        first = next_first
+    return chunks
+
+def merge_corrections(found):
+    """
+    Combine corrections from overlapping pieces of an essay.
+    
+    Args:
+        found (list): (piece index, correction) pairs with whole-essay offsets
+    
+    Returns:
+        List[ErrorCorrection]: In document order; a correction found again by a
+        neighbouring piece, or overlapping one it found, is kept only once
+    """
+    merged = []
+    seen = set()
+    end, end_piece = 0, None  # furthest end of a kept correction, and its piece
+    for piece, correction in sorted(found, key=lambda item: (item[1]['starting_index'], -len(item[1]['error']))):
+        start = correction['starting_index']
+        key = (start, correction['error'])
+        if key in seen or (start < end and piece != end_piece):
+            continue
+        seen.add(key)
+        merged.append(correction)
+        if start + len(correction['error']) > end:
+            end, end_piece = start + len(correction['error']), piece
+    return merged
+
+def _run_concurrently(function, items, max_workers=None):
+    """function(item) for every item, on a thread pool, in item order."""
+    if len(items) == 1:
+        return [function(items[0])]
+    with ThreadPoolExecutor(max_workers=max_workers or GRAMMAR_WORKERS,
+                            thread_name_prefix='grammar') as executor:
+        # Copy the caller's context into each call so scheduler priority and spans carry over
+        futures = [executor.submit(contextvars.copy_context().run, function, item) for item in items]
+        return [future.result() for future in futures]
+
+def _merge_results(pieces, results):
+    """Merge the corrections found in each (starting index, text) piece of an essay."""
+    found = []
+    for piece, ((offset, text), result) in enumerate(zip(pieces, results)):
+        if isinstance(result, str):
+            # Not cached, so the piece is checked again on the next request
+            print(f"Skipping text at {offset}: grammar response was not valid JSON")
+            continue
+        found.extend((piece, correction) for correction in remap_corrections(result, text, offset))
+    return merge_corrections(found)
+
+def _check_pieces(pieces, max_workers=None):
+    """Check (starting index, text) pieces of an essay concurrently and merge their corrections."""
+    if not pieces:
+        return []
+    return _merge_results(pieces, _run_concurrently(_cached_corrections, [text for _, text in pieces], max_workers))
+
+def _batches(texts, max_chars):
+    """Group texts, in order, into lists of at most max_chars characters (a longer text is a batch of its own)."""
+    batches = []
+    size = 0
+    for text in texts:
+        if not batches or size + len(text) > max_chars:
+            batches.append([])
+            size = 0
+        batches[-1].append(text)
+        size += len(text)
+    return batches
+
+def _check_batch(texts):
+    """
+    Check several paragraphs in one model call and cache each one's corrections
+    as if it had been checked on its own.
+    
+    Returns:
+        list: Corrections per text, or the response text for every text if it
+        was not valid JSON
+    """
+    if len(texts) == 1:
+        return [_cached_corrections(texts[0])]
+    results = _corrections_from_paragraphs(texts)
+    if isinstance(results, str):
+        # Not cached, so the paragraphs are checked again on the next request
+        return [results] * len(texts)
+    for text, result in zip(texts, results):
+        cache_store("corrections_from_essay", GRAMMAR_MODEL, GRAMMAR_CACHE_VERSION, text, result)
+    return results
+
+@timed("grammar")
+def corrections_from_paragraphs(essay, max_workers=None):
+    """
+    Check an essay paragraph by paragraph.
+    
+    Corrections are cached per paragraph, keyed by its text, so after an edit
+    only the paragraphs that changed are sent to the model again. Those are
+    sent together, up to GRAMMAR_CHUNK_CHARS per call, so the first check of
+    an essay costs as many calls as a whole-essay or chunked check rather
+    than one per paragraph. Paragraphs longer than GRAMMAR_CHUNK_CHARS are
+    checked in chunks.
+    
+    Args:
+        essay (str): Full essay text
+        max_workers (int, optional): Calls made at once
+    
+    Returns:
+        List[ErrorCorrection]: Corrections with starting_index in whole-essay
+        coordinates, in document order
+    """
+    pieces = [piece for offset, text in split_paragraphs(essay) for piece in chunk_text(text, offset)]
+    results = {}
+    for _, text in pieces:
+        hit, result = cache_lookup("corrections_from_essay", GRAMMAR_MODEL, GRAMMAR_CACHE_VERSION, text)
+        if hit:
+            results[text] = result
+    # Identical paragraphs are only sent once
+    missing = list(dict.fromkeys(text for _, text in pieces if text not in results))
+    if missing:
+        batches = _batches(missing, GRAMMAR_CHUNK_CHARS)
+        for batch, batch_results in zip(batches, _run_concurrently(_check_batch, batches, max_workers)):
+            results.update(zip(batch, batch_results))
+    return _merge_results(pieces, [results[text] for _, text in pieces])
+
+@timed("grammar")
+def corrections_from_chunks(essay, chunk_chars=None, overlap_chars=None, max_workers=None):
+    """
+    Check a long essay in overlapping chunks of whole sentences, concurrently.
+    
+    Each call returns fewer corrections than one over the whole essay, so
+    responses come back sooner and aren't cut off mid-JSON.
+    
+    Args:
+        essay (str): Full essay text
+        chunk_chars (int, optional): Most characters per chunk
+        overlap_chars (int, optional): Most characters repeated from the previous chunk
+        max_workers (int, optional): Calls made at once
+    
+    Returns:
+        List[ErrorCorrection]: Corrections with starting_index in whole-essay
+        coordinates, in document order
+    """
+    return _check_pieces(chunk_text(essay, 0, chunk_chars, overlap_chars), max_workers)
+
+def merge_local(local, corrections):
+    """Add model corrections to the local ones, leaving out any that overlap a local correction."""
+    spans = [(item['starting_index'], item['starting_index'] + len(item['error'])) for item in local]
+    merged = list(local)
+    for correction in corrections:
+        start = correction['starting_index']
+        end = start + len(correction['error'])
+        if not any(start < span_end and span_start < end for span_start, span_end in spans):
+            merged.append(correction)
+    return sorted(merged, key=lambda correction: correction['starting_index'])
+
+def check_grammar(essay, incremental=False, chunked=None):
+    """
+    Check an essay with the mode that suits it, together with the local checks.
+    
+    Args:
+        essay (str): Full essay text
+        incremental (bool): Check paragraph by paragraph, reusing the results
+            for unchanged ones
+        chunked (bool, optional): Check in chunks; by default essays longer
+            than GRAMMAR_CHUNK_CHARS are
+    
+    Returns:
+        List[ErrorCorrection]: Local and model corrections in document order
+    """
+    if chunked is None:
+        chunked = len(essay) > GRAMMAR_CHUNK_CHARS
+    if incremental:
+        corrections = corrections_from_paragraphs(essay)
+    elif chunked:
+        corrections = corrections_from_chunks(essay)
+    else:
+        corrections = corrections_from_essay(essay)
+        if isinstance(corrections, str):
+            # Not cached, so the model is asked again on the next request
+            print("Grammar response was not valid JSON, returning local corrections only")
+            corrections = []
+        corrections = remap_corrections(corrections, essay, 0)
+    return merge_local(local_corrections(essay), corrections)
+
+def _corrections_from_essay(essay, known=()):
     prompt = f"""
             Analyze the essay and find all grammar, punctuation and spelling errors.
             
             <essay>
             {essay}
             </essay>"""
+    if known:
+        # Already reported to the student; leaving them out keeps the response short
+        prompt += f"""
+            
+            These errors were already found; do not report them again:
+            {json.dumps([{'error': item['error'], 'corrected': item['corrected']} for item in known])}"""
     
-    response = client.models.generate_content(
-        model="gemini-2.0-pro-exp-02-05",
+    response = generate(
+        model=GRAMMAR_MODEL,
         contents=[prompt],
         config=types.GenerateContentConfig(
             temperature=0,
@@ -40,13 +366,56 @@ def corrections_from_essay(essay):
     )
     
     # Parse the response text as JSON
-    import json
     try:
         return json.loads(response.text)
     except json.JSONDecodeError:
         print("Failed to parse response as JSON:", response.text)
         return response.text
 
+def _corrections_from_paragraphs(paragraphs):
+    numbered = "\n".join(f'<paragraph number="{number}">\n{text}\n</paragraph>'
+                         for number, text in enumerate(paragraphs, 1))
+    prompt = f"""
+            Analyze each numbered paragraph of the essay and find all grammar, punctuation and spelling errors.
+            Give the number of the paragraph each error is in, and its starting_index counted from the
+            start of that paragraph.
+            
+            {numbered}"""
+    known = [{'paragraph': number, 'error': item['error'], 'corrected': item['corrected']}
+             for number, text in enumerate(paragraphs, 1) for item in local_corrections(text)]
+    if known:
+        # Already reported to the student; leaving them out keeps the response short
+        prompt += f"""
+            
+            These errors were already found; do not report them again:
+            {json.dumps(known)}"""
+    
+    response = generate(
+        model=GRAMMAR_MODEL,
+        contents=[prompt],
+        config=types.GenerateContentConfig(
+            temperature=0,
+            response_mime_type="application/json",
+            response_schema=list[ParagraphCorrection]
+        ),
+    )
+    
+    try:
+        found = json.loads(response.text)
+    except json.JSONDecodeError:
+        print("Failed to parse response as JSON:", response.text)
+        return response.text
+    if not isinstance(found, list):
+        return response.text
+    
+    # Split into ErrorCorrections per paragraph
+    results = [[] for _ in paragraphs]
+    for item in found:
+        number = item.get('paragraph') if isinstance(item, dict) else None
+        if isinstance(number, int) and 1 <= number <= len(paragraphs):
+            results[number - 1].append({key: item.get(key) for key in ('error', 'starting_index', 'corrected')})
+    return results
+
 if __name__ == "__main__":
     from transcribe_from_image import extract_text_from_images_with_prefix
     essay_parts = extract_text_from_images_with_prefix("media\Anchor - 6")
@@ -0,0 +1,157 @@
+import fitz
+import PIL.Image
+import PIL.ImageOps
+from io import BytesIO
+import os
+
+from metrics import span, timed
+
+# Longest edge (in pixels) sent to the model. Gemini tiles images into 768px
+# squares, so going much past ~2-3k pixels only adds payload and latency.
+OCR_MAX_LONG_EDGE = int(os.getenv("OCR_MAX_LONG_EDGE", "2048"))
+# Below this, handwriting strokes start to merge and transcription degrades
+OCR_MIN_LONG_EDGE = int(os.getenv("OCR_MIN_LONG_EDGE", "1024"))
+OCR_JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "85"))
+
+# Pixels darker than this count as ink when looking for the content box
+INK_THRESHOLD = 200
+# Zoom used for the cheap preview render that locates page content
+PREVIEW_ZOOM = 0.5
+
+def content_bbox(image, threshold=INK_THRESHOLD, padding=0.02):
+    """
+    Find the bounding box of the ink on a page.
+
+    Args:
+        image (PIL.Image): Page image
+        threshold (int): Grey level below which a pixel counts as ink
+        padding (float): Margin kept around the content, as a fraction of the page size
+
+    Returns:
+        tuple: (left, top, right, bottom) in pixels, or None for a blank page
+    """
+    gray = image.convert("L")
+    # Ink becomes white on black so getbbox() finds it
+    mask = gray.point(lambda p: 255 if p < threshold else 0)
+    bbox = mask.getbbox()
+    if not bbox:
+        return None
+    pad_x = int(gray.width * padding)
+    pad_y = int(gray.height * padding)
+    left, top, right, bottom = bbox
+    return (max(0, left - pad_x), max(0, top - pad_y),
+            min(gray.width, right + pad_x), min(gray.height, bottom + pad_y))
+
+def prepare_image(image, max_long_edge=None, grayscale=True, crop=True):
+    """
+    Grayscale, crop margins from and downscale an image for transcription.
+
+    Images are only ever shrunk here; upscaling a photo adds bytes, not detail.
+
+    Args:
+        image (PIL.Image): Source image
+        max_long_edge (int, optional): Longest edge of the result in pixels
+        grayscale (bool): Drop colour information
+        crop (bool): Trim blank margins around the writing
+
+    Returns:
+        PIL.Image: The prepared image
+    """
+    image = PIL.ImageOps.exif_transpose(image)
+    image = image.convert("L" if grayscale else "RGB")
+    if crop:
+        bbox = content_bbox(image)
+        if bbox:
+            image = image.crop(bbox)
+    scale = (max_long_edge or OCR_MAX_LONG_EDGE) / max(image.width, image.height)
+    if scale < 1.0:
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, PIL.Image.LANCZOS)
+    return image
+
+def encode_image(image, quality=None):
+    """Encode a PIL image as JPEG, returning (bytes, mime type)."""
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=quality or OCR_JPEG_QUALITY, optimize=True)
+    return buffer.getvalue(), "image/jpeg"
+
+@timed("rasterize")
+def preprocess_image_file(image_path, max_long_edge=None, grayscale=True, crop=True, quality=None):
+    """
+    Load a photo or scan from disk and prepare it for transcription.
+
+    Returns:
+        tuple: (image bytes, mime type)
+    """
+    with PIL.Image.open(image_path) as image:
+        prepared = prepare_image(image, max_long_edge=max_long_edge, grayscale=grayscale, crop=crop)
+    return encode_image(prepared, quality=quality)
+
+def _native_scale(page):
+    """
+    Zoom at which the largest embedded raster image on the page is shown 1:1.
+
+    Scanned PDFs gain nothing from rendering above their scan resolution.
+    Returns None for pages without embedded images (vector or text content).
+    """
+    best = None
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info["bbox"])
+        if bbox.is_empty or bbox.width <= 0:
+            continue
+        scale = info["width"] / bbox.width
+        best = scale if best is None else max(best, scale)
+    return best
+
+def page_render_plan(page, max_long_edge=None, crop=True):
+    """
+    Choose the clip rectangle and zoom for rendering a PDF page for OCR.
+
+    A low-resolution preview locates the written content, then the zoom is picked
+    so the content's long edge hits the model limit, capped at the native
+    resolution of any scanned image on the page.
+
+    Returns:
+        tuple: (clip fitz.Rect, zoom float)
+    """
+    clip = page.rect
+    if crop:
+        preview = page.get_pixmap(matrix=fitz.Matrix(PREVIEW_ZOOM, PREVIEW_ZOOM), colorspace=fitz.csGRAY)
+        image = PIL.Image.frombytes("L", (preview.width, preview.height), preview.samples)
+        bbox = content_bbox(image)
+        if bbox:
+            clip = fitz.Rect(*(v / PREVIEW_ZOOM for v in bbox)) & page.rect
+
+    long_edge = max(clip.width, clip.height)
+    zoom = (max_long_edge or OCR_MAX_LONG_EDGE) / long_edge
+    native = _native_scale(page)
+    if native:
+        # No point rendering a scan above its own resolution, but keep it legible
+        zoom = min(zoom, max(native, OCR_MIN_LONG_EDGE / long_edge))
+    return clip, zoom
+
+def iter_ocr_pages(pdf_path, max_long_edge=None, grayscale=True, crop=True, quality=None):
+    """
+    Render PDF pages at a content-aware resolution, ready for transcription.
+
+    Each page is rasterized once, directly in the target colourspace, clipped to
+    its content and at the chosen zoom, then JPEG-encoded in memory.
+
+    Returns:
+        Generator of (image bytes, mime type) tuples in page order.
+    """
+    colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+    mode = "L" if grayscale else "RGB"
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            with span("rasterize"):
+                clip, zoom = page_render_plan(page, max_long_edge=max_long_edge, crop=crop)
+                pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip,
+                                      colorspace=colorspace, alpha=False)
+                image = PIL.Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+                encoded = encode_image(image, quality=quality)
+            yield encoded
+
+if __name__ == "__main__":
+    for data, mime_type in iter_ocr_pages(os.path.join("media", "Anchor - 6.pdf")):
+        print(mime_type, len(data))
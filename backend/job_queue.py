@@ -0,0 +1,114 @@
+import threading
+import time
+import uuid
+from queue import Queue, Full
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the pending queue is at capacity"""
+    pass
+
+class JobQueue:
+    """
+    Fixed pool of worker threads fed from a bounded queue.
+
+    submit() never blocks: once max_pending jobs are waiting it raises QueueFull,
+    so callers can push back on clients instead of piling up work. Finished
+    jobs are kept for `retention` seconds so their status can be polled.
+    """
+    def __init__(self, workers=2, max_pending=20, retention=3600, name="jobs"):
+        self.pending = Queue(maxsize=max_pending)
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.retention = retention
+        self.workers = []
+        for i in range(workers):
+            worker = threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queue fn(*args, **kwargs) for a background worker.
+
+        Returns:
+            str: Job id for status polling
+
+        Raises:
+            QueueFull: If the pending queue is at capacity
+        """
+        self._prune()
+        job_id = str(uuid.uuid4())
+        job = {
+            'id': job_id,
+            'status': 'queued',
+            'created': time.time(),
+            'started': None,
+            'finished': None,
+            'result': None,
+            'error': None,
+            'progress': None,
+        }
+        with self.lock:
+            self.jobs[job_id] = job
+        try:
+            self.pending.put_nowait((job_id, fn, args, kwargs))
+        except Full:
+            with self.lock:
+                del self.jobs[job_id]
+            raise QueueFull(f"{self.pending.maxsize} jobs already waiting")
+        return job_id
+
+    def submit_with_progress(self, fn, *args, **kwargs):
+        """
+        Like submit(), but fn is called as fn(report, *args, **kwargs) where
+        report(**fields) publishes progress into the job's 'progress' field.
+        """
+        holder = {}
+        def report(**fields):
+            job_id = holder.get('id')
+            if job_id:
+                with self.lock:
+                    if job_id in self.jobs:
+                        self.jobs[job_id]['progress'] = dict(self.jobs[job_id].get('progress') or {}, **fields)
+        holder['id'] = self.submit(fn, report, *args, **kwargs)
+        return holder['id']
+
+    def status(self, job_id):
+        """Return a copy of the job record, or None if it is unknown or expired."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+        if job['status'] == 'queued':
+            job['queueDepth'] = self.pending.qsize()
+        return job
+
+    def depth(self):
+        """Number of jobs waiting for a worker."""
+        return self.pending.qsize()
+
+    def _work(self):
+        while True:
+            job_id, fn, args, kwargs = self.pending.get()
+            self._update(job_id, status='running', started=time.time())
+            try:
+                result = fn(*args, **kwargs)
+                self._update(job_id, status='done', result=result, finished=time.time())
+            except Exception as e:
+                self._update(job_id, status='failed', error=str(e), finished=time.time())
+            finally:
+                self.pending.task_done()
+
+    def _update(self, job_id, **fields):
+        with self.lock:
+            if job_id in self.jobs:
+                self.jobs[job_id].update(fields)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items()
+                       if job['finished'] and job['finished'] < cutoff]
+            for job_id in expired:
+                del self.jobs[job_id]
@@ -0,0 +1,55 @@
+import json
+
+class JSONArrayStream:
+    """
+    Incremental parser for a streamed top-level JSON array of objects.
+
+    feed() takes raw text chunks as they arrive from the model and returns
+    every array element that has been completed so far, so callers can act on
+    the first item long before the closing bracket arrives.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.item_start = None
+        # Set once the top-level array's closing bracket has been read
+        self.closed = False
+
+    def feed(self, chunk):
+        """Consume a chunk of text, returning a list of newly completed elements."""
+        items = []
+        self.buffer += chunk
+        while self.pos < len(self.buffer):
+            char = self.buffer[self.pos]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '[{':
+                self.depth += 1
+                if self.depth == 2:
+                    self.item_start = self.pos
+            elif char in ']}':
+                self.depth -= 1
+                if self.depth == 1 and self.item_start is not None:
+                    items.append(json.loads(self.buffer[self.item_start:self.pos + 1]))
+                    self.item_start = None
+                elif self.depth == 0 and char == ']':
+                    self.closed = True
+            self.pos += 1
+
+        # Drop text that belongs to elements already returned
+        keep_from = self.item_start if self.item_start is not None else self.pos
+        self.buffer = self.buffer[keep_from:]
+        self.pos -= keep_from
+        if self.item_start is not None:
+            self.item_start = 0
+        return items
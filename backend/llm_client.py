@@ -0,0 +1,208 @@
+"""
+Shared Gemini client used by every module that calls the model.
+
+The client is created on first use rather than at import time, so modules can
+be imported (and tested) without credentials or network access. One client is
+shared by all threads, which lets them reuse its pooled HTTP connections.
+Timeouts, retries with jittered backoff and per-model concurrency limits are
+applied here so callers don't each reimplement them, and every call is
+admitted by the rate-limit scheduler in llm_scheduler first.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+
+from dotenv import load_dotenv
+from google import genai
+from google.genai import errors, types
+
+from llm_scheduler import scheduler, estimate_tokens
+from metrics import LLM_REQUESTS, LLM_REQUEST_SECONDS, record_llm_usage
+
+# Seconds before a single model request is abandoned
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "4"))
+LLM_BACKOFF_BASE = 1.0
+LLM_BACKOFF_MAX = 30.0
+# Requests in flight per model from this process; override per model below
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+MODEL_CONCURRENCY = {}
+# Size of the shared keep-alive connection pool
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+_client = None
+_client_lock = threading.Lock()
+_semaphores = {}
+_semaphore_lock = threading.Lock()
+
+def get_client():
+    """Return the process-wide genai client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                load_dotenv()
+                import httpx
+                limits = httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                      max_keepalive_connections=LLM_MAX_CONNECTIONS)
+                http_options = types.HttpOptions(
+                    timeout=int(LLM_TIMEOUT * 1000),
+                    client_args={'limits': limits},
+                    async_client_args={'limits': limits},
+                )
+                # Lets tests and load runs point the app at a local stand-in server
+                if os.getenv("GEMINI_BASE_URL"):
+                    http_options.base_url = os.getenv("GEMINI_BASE_URL")
+                _client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"), http_options=http_options)
+    return _client
+
+def _semaphore(model):
+    with _semaphore_lock:
+        if model not in _semaphores:
+            _semaphores[model] = threading.BoundedSemaphore(MODEL_CONCURRENCY.get(model, LLM_MAX_CONCURRENCY))
+        return _semaphores[model]
+
+def is_retryable(error):
+    """Whether a failed call is worth retrying (rate limits, server errors, timeouts)."""
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS
+    import httpx
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError, TimeoutError, ConnectionError))
+
+def is_rate_limited(error):
+    return isinstance(error, errors.APIError) and error.code == 429
+
+def _total_tokens(response):
+    usage = getattr(response, 'usage_metadata', None)
+    return getattr(usage, 'total_token_count', None) if usage else None
+
+def _observe(model, start, error=None, response=None):
+    """Record a finished call's latency, outcome and token usage."""
+    LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, model=model)
+    if error is None:
+        LLM_REQUESTS.inc(model=model, outcome='ok')
+        record_llm_usage(model, response)
+    else:
+        LLM_REQUESTS.inc(model=model, outcome='rate_limited' if is_rate_limited(error) else 'error')
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff: uniform in [0, base * 2^attempt], capped."""
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+def generate(model, contents, config=None, max_attempts=None):
+    """
+    Call generate_content with the shared client, concurrency limit and retries.
+
+    Args:
+        model (str): Model name
+        contents (list): Prompt parts
+        config (GenerateContentConfig, optional): Generation config
+        max_attempts (int, optional): Attempts before the last error is raised
+
+    Returns:
+        GenerateContentResponse: The model response
+    """
+    max_attempts = max_attempts or LLM_MAX_ATTEMPTS
+    client = get_client()
+    tokens = estimate_tokens(contents, config)
+    for attempt in range(max_attempts):
+        scheduler.acquire(model, tokens)
+        start = None
+        try:
+            with _semaphore(model):
+                start = time.perf_counter()
+                response = client.models.generate_content(model=model, contents=contents, config=config)
+            _observe(model, start, response=response)
+            scheduler.record_usage(model, tokens, _total_tokens(response))
+            return response
+        except Exception as e:
+            if start is not None:
+                _observe(model, start, error=e)
+            if is_rate_limited(e):
+                scheduler.on_rate_limited(model)
+            if attempt == max_attempts - 1 or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt)
+            print(f"{model} call failed ({str(e)}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def generate_stream(model, contents, config=None, max_attempts=None):
+    """
+    Streaming counterpart of generate(), yielding response chunks.
+
+    Retries only happen before the first chunk arrives; after that a failure is
+    raised, since the caller has already consumed part of the response.
+    """
+    max_attempts = max_attempts or LLM_MAX_ATTEMPTS
+    client = get_client()
+    tokens = estimate_tokens(contents, config)
+    for attempt in range(max_attempts):
+        scheduler.acquire(model, tokens)
+        received = False
+        last_chunk = None
+        start = None
+        try:
+            with _semaphore(model):
+                start = time.perf_counter()
+                for chunk in client.models.generate_content_stream(model=model, contents=contents, config=config):
+                    received = True
+                    last_chunk = chunk
+                    yield chunk
+            # Usage is reported cumulatively, the final chunk carries the total
+            _observe(model, start, response=last_chunk)
+            scheduler.record_usage(model, tokens, _total_tokens(last_chunk))
+            return
+        except Exception as e:
+            if start is not None:
+                _observe(model, start, error=e)
+            if is_rate_limited(e):
+                scheduler.on_rate_limited(model)
+            if received or attempt == max_attempts - 1 or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt)
+            print(f"{model} stream failed ({str(e)}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+_async_semaphores = {}
+
+def _async_semaphore(model):
+    # asyncio semaphores belong to one event loop, so key them by loop as well
+    key = (id(asyncio.get_running_loop()), model)
+    if key not in _async_semaphores:
+        _async_semaphores[key] = asyncio.Semaphore(MODEL_CONCURRENCY.get(model, LLM_MAX_CONCURRENCY))
+    return _async_semaphores[key]
+
+async def agenerate(model, contents, config=None, max_attempts=None):
+    """Async counterpart of generate() using the client's asyncio transport."""
+    max_attempts = max_attempts or LLM_MAX_ATTEMPTS
+    client = get_client()
+    tokens = estimate_tokens(contents, config)
+    for attempt in range(max_attempts):
+        # The scheduler blocks, so wait for budget off the event loop
+        await asyncio.to_thread(scheduler.acquire, model, tokens)
+        start = None
+        try:
+            async with _async_semaphore(model):
+                start = time.perf_counter()
+                response = await client.aio.models.generate_content(model=model, contents=contents, config=config)
+            _observe(model, start, response=response)
+            scheduler.record_usage(model, tokens, _total_tokens(response))
+            return response
+        except Exception as e:
+            if start is not None:
+                _observe(model, start, error=e)
+            if is_rate_limited(e):
+                scheduler.on_rate_limited(model)
+            if attempt == max_attempts - 1 or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt)
+            print(f"{model} call failed ({str(e)}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+def create_cached_content(model, config):
+    """Create a model-side context cache (see scorer._cached_prefix)."""
+    return get_client().caches.create(model=model, config=config)
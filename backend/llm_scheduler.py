@@ -0,0 +1,193 @@
+"""
+Token-bucket admission control for model calls.
+
+Every call made through llm_client first asks the scheduler for one request
+and an estimated number of tokens from the model's per-minute budget. When the
+budget is exhausted callers wait in priority order, so an interactive editor
+request overtakes queued batch work. The budget adapts to the quota actually
+observed: a 429 halves the effective rate and each success wins a little back.
+"""
+import contextlib
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from google.genai import types
+
+INTERACTIVE = 0
+BATCH = 10
+
+# Per-minute quotas (requests, tokens) per model; others use the defaults
+LLM_DEFAULT_RPM = float(os.getenv("LLM_DEFAULT_RPM", "60"))
+LLM_DEFAULT_TPM = float(os.getenv("LLM_DEFAULT_TPM", "1000000"))
+MODEL_LIMITS = {
+    "gemini-2.0-pro-exp-02-05": (float(os.getenv("LLM_PRO_RPM", "5")), float(os.getenv("LLM_PRO_TPM", "1000000"))),
+    "gemini-2.0-flash-thinking-exp-01-21": (float(os.getenv("LLM_FLASH_RPM", "10")), float(os.getenv("LLM_FLASH_TPM", "4000000"))),
+}
+# Longest a call may wait for budget before giving up
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "300"))
+
+# Rough prompt-size heuristics: ~4 characters per token, a flat cost per image,
+# and an allowance for the response since it counts against the same quota
+CHARS_PER_TOKEN = 4
+TOKENS_PER_IMAGE = 258 * 4
+OUTPUT_TOKEN_ALLOWANCE = 1024
+
+# Multiplicative decrease on 429, additive increase on success
+MIN_RATE_FACTOR = 0.1
+RECOVERY_STEP = 0.05
+
+_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+class SchedulerTimeout(Exception):
+    """Raised when a call waited longer than LLM_QUEUE_TIMEOUT for rate-limit budget"""
+    pass
+
+@contextlib.contextmanager
+def llm_priority(priority):
+    """Run model calls made inside the block at the given priority (INTERACTIVE or BATCH)."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def estimate_tokens(contents, config=None):
+    """Estimate the tokens a request will consume from its prompt parts."""
+    chars = 0
+    images = 0
+    parts = list(contents) if isinstance(contents, (list, tuple)) else [contents]
+    system_instruction = getattr(config, 'system_instruction', None)
+    if isinstance(system_instruction, str):
+        parts.append(system_instruction)
+    for part in parts:
+        if isinstance(part, str):
+            chars += len(part)
+        elif isinstance(part, types.Part):
+            if part.text:
+                chars += len(part.text)
+            elif part.inline_data is not None:
+                images += 1
+        else:
+            # PIL images and other media
+            images += 1
+    return chars // CHARS_PER_TOKEN + images * TOKENS_PER_IMAGE + OUTPUT_TOKEN_ALLOWANCE
+
+class ModelBudget:
+    """Request and token buckets for one model, refilled continuously."""
+    def __init__(self, rpm, tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.factor = 1.0
+        self.requests = rpm
+        self.tokens = tpm
+        self.updated = time.monotonic()
+        self.waiters = []  # heap of (priority, sequence)
+        self.rate_limited = 0
+
+    def refill(self, now):
+        elapsed = now - self.updated
+        self.updated = now
+        self.requests = min(self.rpm * self.factor, self.requests + elapsed * self.rpm * self.factor / 60)
+        self.tokens = min(self.tpm * self.factor, self.tokens + elapsed * self.tpm * self.factor / 60)
+
+    def wait_time(self, tokens):
+        """Seconds until one request and `tokens` tokens are available."""
+        # A request bigger than the whole bucket is admitted once the bucket is full
+        tokens = min(tokens, self.tpm * self.factor)
+        need_requests = max(0.0, 1 - self.requests) * 60 / (self.rpm * self.factor)
+        need_tokens = max(0.0, tokens - self.tokens) * 60 / (self.tpm * self.factor)
+        return max(need_requests, need_tokens)
+
+class LLMScheduler:
+    """Priority-ordered token-bucket scheduler shared by every model call in the process."""
+    def __init__(self, limits=None, default_limits=(LLM_DEFAULT_RPM, LLM_DEFAULT_TPM),
+                 queue_timeout=LLM_QUEUE_TIMEOUT):
+        self.limits = MODEL_LIMITS if limits is None else limits
+        self.default_limits = default_limits
+        self.queue_timeout = queue_timeout
+        self.budgets = {}
+        self.condition = threading.Condition()
+        self.sequence = itertools.count()
+
+    def _budget(self, model):
+        if model not in self.budgets:
+            self.budgets[model] = ModelBudget(*self.limits.get(model, self.default_limits))
+        return self.budgets[model]
+
+    def acquire(self, model, tokens, priority=None):
+        """
+        Block until the model's budget covers one request of `tokens` tokens.
+
+        Waiters are served lowest priority value first, then in arrival order.
+
+        Raises:
+            SchedulerTimeout: If the budget doesn't free up within queue_timeout
+        """
+        priority = _priority.get() if priority is None else priority
+        deadline = time.monotonic() + self.queue_timeout
+        with self.condition:
+            budget = self._budget(model)
+            entry = (priority, next(self.sequence))
+            heapq.heappush(budget.waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    budget.refill(now)
+                    if budget.waiters[0] == entry:
+                        wait = budget.wait_time(tokens)
+                        if wait <= 0:
+                            budget.requests -= 1
+                            budget.tokens -= tokens
+                            return
+                    else:
+                        wait = self.queue_timeout
+                    if now >= deadline:
+                        raise SchedulerTimeout(f"Waited {self.queue_timeout:g}s for {model} rate-limit budget")
+                    self.condition.wait(timeout=max(0.01, min(wait, deadline - now)))
+            finally:
+                budget.waiters.remove(entry)
+                heapq.heapify(budget.waiters)
+                self.condition.notify_all()
+
+    def record_usage(self, model, estimated, actual):
+        """
+        Record a successful call: charge or refund the difference between the
+        estimated and reported token usage, and win back some of the rate.
+        """
+        with self.condition:
+            budget = self._budget(model)
+            if actual is not None:
+                budget.tokens -= actual - estimated
+            budget.factor = min(1.0, budget.factor + RECOVERY_STEP)
+            self.condition.notify_all()
+
+    def on_rate_limited(self, model):
+        """Halve the model's effective rate and empty its buckets after a 429."""
+        with self.condition:
+            budget = self._budget(model)
+            budget.refill(time.monotonic())
+            budget.factor = max(MIN_RATE_FACTOR, budget.factor / 2)
+            budget.requests = min(budget.requests, 0)
+            budget.tokens = min(budget.tokens, 0)
+            budget.rate_limited += 1
+
+    def stats(self):
+        with self.condition:
+            now = time.monotonic()
+            stats = {}
+            for model, budget in self.budgets.items():
+                budget.refill(now)
+                stats[model] = {
+                    'rateFactor': round(budget.factor, 3),
+                    'requestsAvailable': round(budget.requests, 2),
+                    'tokensAvailable': round(budget.tokens),
+                    'waiting': len(budget.waiters),
+                    'rateLimited': budget.rate_limited,
+                }
+            return stats
+
+scheduler = LLMScheduler()
@@ -0,0 +1,168 @@
+"""
+Offline grammar and spelling checks that run in a few milliseconds.
+
+These catch the unambiguous mistakes (common misspellings, repeated words,
+a/an, lowercase "i", sentences starting in lowercase, spacing around
+punctuation) without a model call. Results use the ErrorCorrection shape, so
+the editor can show them straight away and merge in the model's corrections
+when they arrive. The model is told which errors were already found here, so
+it doesn't spend output on them.
+"""
+import re
+
+# Bump when the rules or word list change; it is part of the grammar cache key
+LOCAL_CHECKS_VERSION = "3"
+
+# Frequent misspellings and their corrections (lowercase); only strings that are never
+# a correct English word, so a hit is always a real error ("cant" and "wont" are words)
+MISSPELLINGS = {
+    'accomodate': 'accommodate', 'acheive': 'achieve', 'acheivement': 'achievement', 'accross': 'across',
+    'agressive': 'aggressive', 'alot': 'a lot', 'apparantly': 'apparently', 'appearence': 'appearance',
+    'arguement': 'argument', 'basicly': 'basically', 'becuase': 'because', 'begining': 'beginning',
+    'beleive': 'believe', 'belive': 'believe', 'buisness': 'business', 'calender': 'calendar',
+    'carefull': 'careful', 'catagory': 'category', 'cemetary': 'cemetery',
+    'changable': 'changeable', 'collegue': 'colleague', 'comming': 'coming', 'commited': 'committed',
+    'completly': 'completely', 'concious': 'conscious', 'definately': 'definitely', 'definatly': 'definitely',
+    'dilemna': 'dilemma', 'dissapoint': 'disappoint', 'dissapointed': 'disappointed', 'doesnt': "doesn't",
+    'dont': "don't", 'embarass': 'embarrass', 'embarassed': 'embarrassed', 'enviroment': 'environment',
+    'especialy': 'especially', 'exagerate': 'exaggerate', 'excercise': 'exercise', 'existance': 'existence',
+    'experiance': 'experience', 'familar': 'familiar', 'finaly': 'finally', 'foriegn': 'foreign',
+    'freind': 'friend', 'freinds': 'friends', 'goverment': 'government', 'gaurd': 'guard',
+    'happend': 'happened', 'harrass': 'harass', 'havent': "haven't", 'heighth': 'height',
+    'hopefuly': 'hopefully', 'humerous': 'humorous', 'immediatly': 'immediately', 'independant': 'independent',
+    'interupt': 'interrupt', 'irrelevent': 'irrelevant', 'isnt': "isn't", 'knowlege': 'knowledge',
+    'libary': 'library', 'lisence': 'license', 'maintainance': 'maintenance', 'millenium': 'millennium',
+    'mischievious': 'mischievous', 'mispell': 'misspell', 'neccessary': 'necessary', 'necesary': 'necessary',
+    'neice': 'niece', 'noticable': 'noticeable', 'occassion': 'occasion', 'occured': 'occurred',
+    'occurence': 'occurrence', 'occuring': 'occurring', 'oppurtunity': 'opportunity', 'opertunity': 'opportunity',
+    'persistant': 'persistent', 'posession': 'possession', 'potatos': 'potatoes', 'prefered': 'preferred',
+    'probaly': 'probably', 'probly': 'probably', 'publically': 'publicly', 'realy': 'really',
+    'recieve': 'receive', 'recieved': 'received', 'reccomend': 'recommend', 'recomend': 'recommend',
+    'refered': 'referred', 'relevent': 'relevant', 'religous': 'religious', 'remeber': 'remember',
+    'resistence': 'resistance', 'responsability': 'responsibility', 'rythm': 'rhythm', 'seperate': 'separate',
+    'seperated': 'separated', 'sieze': 'seize', 'similiar': 'similar', 'sincerly': 'sincerely',
+    'speach': 'speech', 'succesful': 'successful', 'successfull': 'successful', 'suprise': 'surprise',
+    'suprised': 'surprised', 'tatoo': 'tattoo', 'tendancy': 'tendency', 'therefor': 'therefore',
+    'threshhold': 'threshold', 'tommorow': 'tomorrow', 'tommorrow': 'tomorrow', 'tounge': 'tongue',
+    'truely': 'truly', 'twelth': 'twelfth', 'tyrany': 'tyranny', 'untill': 'until', 'unfortunatly': 'unfortunately',
+    'usualy': 'usually', 'vaccum': 'vacuum', 'wasnt': "wasn't", 'wierd': 'weird', 'whereever': 'wherever',
+    'wich': 'which', 'writting': 'writing', 'wouldnt': "wouldn't", 'youre': "you're",
+    'teh': 'the', 'thier': 'their', 'theyre': "they're", 'tho': 'though', 'thru': 'through',
+}
+# Words where a repeat is usually intended ("had had", "that that")
+REPEATABLE_WORDS = frozenset({'had', 'that'})
+# Abbreviations that end in a period without ending the sentence; single letters
+# and dotted initialisms ("U.S.", "a.m.") are treated the same way
+ABBREVIATIONS = frozenset({'e.g', 'i.e', 'etc', 'vs', 'mr', 'mrs', 'ms', 'dr', 'st', 'approx', 'cf'})
+# Vowel-initial words that take "a", and consonant-initial ones that take "an"
+A_PREFIXES = ('uni', 'use', 'usu', 'uti', 'ure', 'eu', 'one', 'once', 'ufo')
+AN_WORDS = frozenset({'hour', 'hours', 'honest', 'honestly', 'honor', 'honour', 'honorable', 'heir', 'herb',
+                      'historic', 'historical'})
+
+WORD = re.compile(r"\b[A-Za-z]+(?:'[A-Za-z]+)?\b")
+REPEATED_WORD = re.compile(r"\b([A-Za-z]+)\s+\1\b", re.IGNORECASE)
+# Not when a period follows, as in "i.e."
+LOWERCASE_I = re.compile(r"\bi(?:'(?:m|ve|ll|d))?\b(?!\.)")
+# Start of the text, of a paragraph (after a blank line) or of a sentence; single line
+# breaks are not sentence boundaries, as transcribed essays keep the page's line breaks
+SENTENCE_START = re.compile(r"(?:\A\s*|\n[ \t]*\n\s*|(?<![.])([.!?])([\"'”’)\]]*)\s+)([a-z][a-z']*)\b")
+SPACE_BEFORE_PUNCTUATION = re.compile(r"([A-Za-z]+)[ \t]+([,;:!?]|\.(?!\.))")
+MISSING_SPACE_AFTER_COMMA = re.compile(r"\b([A-Za-z]+)([,;])([A-Za-z]+)\b")
+DOTTED_INITIALISM = re.compile(r"(?:[A-Za-z]\.)+[A-Za-z]")
+ARTICLE = re.compile(r"\b(an?|An?) ([A-Za-z]+)\b")
+
+def _match_case(word, replacement):
+    if word.isupper() and len(word) > 1:
+        return replacement.upper()
+    if word[0].isupper():
+        return replacement[0].upper() + replacement[1:]
+    return replacement
+
+def _misspellings(text):
+    for match in WORD.finditer(text):
+        correction = MISSPELLINGS.get(match.group().lower())
+        if correction:
+            yield match.start(), match.group(), _match_case(match.group(), correction)
+
+def _repeated_words(text):
+    for match in REPEATED_WORD.finditer(text):
+        if match.group(1).lower() not in REPEATABLE_WORDS:
+            yield match.start(), match.group(), match.group(1)
+
+def _lowercase_i(text):
+    for match in LOWERCASE_I.finditer(text):
+        yield match.start(), match.group(), "I" + match.group()[1:]
+
+def _is_abbreviation(token):
+    token = token.lstrip('("\'')
+    return len(token) == 1 or token.lower() in ABBREVIATIONS or DOTTED_INITIALISM.fullmatch(token) is not None
+
+def _sentence_starts(text):
+    for match in SENTENCE_START.finditer(text):
+        if match.group(1) == '.':
+            before = text[:match.start(1)].rsplit(None, 1)
+            if before and _is_abbreviation(before[-1]):
+                continue
+        elif match.group(1) and match.group(2):
+            # A quoted question or exclamation usually goes on ('"Why?" she asked')
+            continue
+        word = match.group(3)
+        yield match.start(3), word, word[0].upper() + word[1:]
+
+def _punctuation_spacing(text):
+    for match in SPACE_BEFORE_PUNCTUATION.finditer(text):
+        yield match.start(), match.group(), match.group(1) + match.group(2)
+    for match in MISSING_SPACE_AFTER_COMMA.finditer(text):
+        yield match.start(), match.group(), f"{match.group(1)}{match.group(2)} {match.group(3)}"
+
+def _articles(text):
+    for match in ARTICLE.finditer(text):
+        article, word = match.group(1), match.group(2)
+        if word.isupper():
+            # Acronyms go by how they are spoken ("a URL", "an FBI agent"), which we can't tell
+            continue
+        lower = word.lower()
+        if article.lower() == 'a' and lower[0] in 'aeiou' and not lower.startswith(A_PREFIXES):
+            yield match.start(), match.group(), f"{article}n {word}"
+        elif (article.lower() == 'an' and word[0] in 'bcdfghjklmnpqrstvwxyz'
+              and lower not in AN_WORDS and not lower.startswith('histor')):
+            yield match.start(), match.group(), f"{article[0]} {word}"
+
+CHECKS = (_misspellings, _repeated_words, _lowercase_i, _sentence_starts, _punctuation_spacing, _articles)
+
+def local_corrections(text):
+    """
+    Run every local check over the text.
+
+    Returns:
+        List[ErrorCorrection]: In document order, at most one per span of text
+    """
+    found = sorted((item for check in CHECKS for item in check(text)), key=lambda item: (item[0], -len(item[1])))
+    corrections = []
+    end = 0
+    for start, error, corrected in found:
+        if start < end or error == corrected:
+            continue
+        corrections.append({'error': error, 'starting_index': start, 'corrected': corrected})
+        end = start + len(error)
+    return corrections
+
+# Correct text the checks must leave alone, and mistakes they must still find
+REGRESSION_CASES = (
+    ("That is, i.e. the short form, is fine.", []),
+    ("He moved to the U.S. in 1990 and stayed.", []),
+    ("She works at 9 a.m. every day.", []),
+    ("Paste a URL here, or an FBI report.", []),
+    ('"Why?" she asked.', []),
+    ('He said "Stop!" and we ran.', []),
+    ("The cant of the roof, and a wont to wander.", []),
+    ("Then i went home.", [("i", "I")]),
+    ("It was a apple. the end", [("a apple", "an apple"), ("the", "The")]),
+    ("Is it late? we should go.", [("we", "We")]),
+)
+
+if __name__ == "__main__":
+    for text, expected in REGRESSION_CASES:
+        found = [(item['error'], item['corrected']) for item in local_corrections(text)]
+        assert found == expected, f"{text!r}: expected {expected}, got {found}"
+    print(f"{len(REGRESSION_CASES)} local check cases passed")
@@ -0,0 +1,271 @@
+"""
+In-process metrics rendered in the Prometheus text format, and timing spans.
+
+Code wraps each processing stage in span("grade") (or decorates it with
+@timed("grade")). Every span is observed in the flair_stage_seconds histogram,
+and when a trace is active, e.g. for the duration of an HTTP request or an
+upload job, it is also appended to that trace so the whole request can be
+logged as one structured line. Values that already live elsewhere, such as
+queue depths, are read by callback metrics only when /metrics is scraped.
+"""
+import bisect
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+# Upper bounds in seconds; model calls dominate, so the range runs to minutes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Fraction of request/response payloads logged at DEBUG, and how much of each
+PAYLOAD_LOG_RATE = float(os.getenv("PAYLOAD_LOG_RATE", "0.01"))
+PAYLOAD_LOG_MAX_CHARS = 2000
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """Base for metrics with a fixed set of label names."""
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """Return [(suffix, label values, extra labels, value)] for rendering."""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+class Counter(Metric):
+    """Monotonically increasing count per label set."""
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [("", key, (), value) for key, value in sorted(self.values.items())]
+
+class Histogram(Metric):
+    """Cumulative bucket counts, sum and count per label set."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, list(entry)) for key, entry in self.values.items())
+        samples = []
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                samples.append(("_bucket", key, (("le", _format_value(float(bound))),), cumulative))
+            samples.append(("_bucket", key, (("le", "+Inf"),), entry[-1]))
+            samples.append(("_sum", key, (), entry[-2]))
+            samples.append(("_count", key, (), entry[-1]))
+        return samples
+
+class CallbackMetric(Metric):
+    """
+    A gauge or counter whose values are read from elsewhere at scrape time.
+
+    `function` returns {label values tuple: value}, or a plain number when the
+    metric has no labels.
+    """
+    def __init__(self, name, documentation, labelnames=(), function=None, kind="gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+        self.kind = kind
+
+    def samples(self):
+        values = self.function()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [("", tuple(str(v) for v in key), (), value) for key, value in sorted(values.items())]
+
+class Registry:
+    """The set of metrics exposed on /metrics."""
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, labelnames=(), function=None, kind="gauge"):
+        return self.register(CallbackMetric(name, documentation, labelnames, function, kind))
+
+    def render(self):
+        """The Prometheus text exposition of every metric; a failing callback is skipped."""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        blocks = []
+        for metric in metrics:
+            try:
+                blocks.append(metric.render())
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Skipping metric {metric.name}: {str(e)}")
+        return "\n".join(blocks) + "\n"
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "flair_stage_seconds", "Time spent in each processing stage", ["stage"])
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "flair_http_request_seconds", "HTTP request latency until the response is returned",
+    ["method", "endpoint", "status"])
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "flair_llm_request_seconds", "Model call latency, excluding time spent waiting for rate-limit budget",
+    ["model"])
+LLM_REQUESTS = REGISTRY.counter(
+    "flair_llm_requests_total", "Model calls by outcome (ok, error, rate_limited)", ["model", "outcome"])
+LLM_TOKENS = REGISTRY.counter(
+    "flair_llm_tokens_total", "Tokens reported by the model (prompt, output, cached)", ["model", "kind"])
+
+_trace = contextvars.ContextVar("metrics_trace", default=None)
+
+@contextlib.contextmanager
+def span(stage):
+    """Time a block as one occurrence of `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        spans = _trace.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+def timed(stage):
+    """Decorator form of span()."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def start_trace():
+    """Start collecting spans in the current context; returns a token for end_trace()."""
+    return _trace.set([])
+
+def end_trace(token):
+    """
+    Stop collecting spans and summarise them.
+
+    Returns:
+        dict: {stage: {'ms': total milliseconds, 'count': occurrences}}
+    """
+    spans = _trace.get() or []
+    _trace.reset(token)
+    summary = {}
+    for stage, elapsed in spans:
+        entry = summary.setdefault(stage, {'ms': 0.0, 'count': 0})
+        entry['ms'] += elapsed * 1000
+        entry['count'] += 1
+    for entry in summary.values():
+        entry['ms'] = round(entry['ms'], 1)
+    return summary
+
+@contextlib.contextmanager
+def trace(logger, event, **fields):
+    """Collect the spans of a block and log them as one structured line when it ends."""
+    token = start_trace()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        log_event(logger, event, ms=round((time.perf_counter() - start) * 1000, 1),
+                  spans=end_trace(token), **fields)
+
+def log_event(logger, event, **fields):
+    logger.info(json.dumps({'event': event, **fields}, default=str))
+
+def record_llm_usage(model, response):
+    """Count the prompt, output and cached tokens reported on a model response."""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return
+    for kind, attribute in (('prompt', 'prompt_token_count'), ('output', 'candidates_token_count'),
+                            ('cached', 'cached_content_token_count')):
+        count = getattr(usage, attribute, None)
+        if count:
+            LLM_TOKENS.inc(count, model=model, kind=kind)
+
+def log_payload(logger, label, payload):
+    """
+    Log a payload at DEBUG for a sample of calls.
+
+    Nothing is serialized unless DEBUG is enabled and the call is sampled, so
+    leaving this in hot paths is cheap.
+    """
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= PAYLOAD_LOG_RATE:
+        return
+    text = payload if isinstance(payload, str) else json.dumps(payload, default=str)
+    if len(text) > PAYLOAD_LOG_MAX_CHARS:
+        text = text[:PAYLOAD_LOG_MAX_CHARS] + f"... ({len(text)} chars)"
+    logger.debug(f"{label} (sampled): {text}")
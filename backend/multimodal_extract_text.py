@@ -1,10 +1,27 @@
-from pdf_to_png import pdf_to_images
-from transcribe_from_image import extract_text_from_image
+from pdf_to_png import iter_pdf_images, pdf_page_count
+from image_preprocess import iter_ocr_pages, preprocess_image_file
+from transcribe_from_image import extract_text_from_image, transcribe_image, transcribe_image_bytes
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from collections import deque
+from llm_client import LLM_TIMEOUT
+from metrics import span, timed
+import contextvars
+import PIL.Image
 import os
-import tempfile
-import shutil
+import threading
+import time
 import re
 
+# Bounds for concurrent page transcription (overridable through the environment)
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", "4"))
+# Each page attempt makes a single model call (transcribe_pages owns the retries),
+# so an attempt gets the client's request timeout plus time to wait for a rate-limit slot
+OCR_PAGE_TIMEOUT = float(os.getenv("OCR_PAGE_TIMEOUT", str(LLM_TIMEOUT + 30)))
+OCR_PAGE_RETRIES = int(os.getenv("OCR_PAGE_RETRIES", "2"))
+# Grayscale, crop and resize images before they are sent for transcription
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "1") != "0"
+
+@timed("clean")
 def clean_extracted_text(text):
     """Clean and normalize extracted text for better paragraphing"""
     if not text:
@@ -49,49 +66,200 @@ def clean_extracted_text(text):
     # Join with proper paragraph separation
     return '\n\n'.join(paragraphs)
 
-def extract_text(input_file, notify_callback=None):
+@timed("ocr")
+def _transcribe_page(page):
+    """Transcribe one page, raising so the caller can retry.
+    
+    A page is either an in-memory (bytes, mime type) buffer or an image path.
+    """
+    if isinstance(page, tuple):
+        data, mime_type = page
+        return transcribe_image_bytes(data, mime_type, max_attempts=1)
+    with PIL.Image.open(page) as image:
+        return transcribe_image(image, max_attempts=1)
+
+def _start_attempt(page):
+    """Start one transcription attempt on its own thread and return its Future.
+    
+    A running attempt can't be interrupted, so one that times out is abandoned
+    rather than cancelled. With a thread per attempt, an abandoned attempt
+    doesn't hold a pool worker that retries and later pages are queued behind,
+    and every attempt starts (and starts its timeout) as soon as it is submitted.
+    """
+    future = Future()
+    # Run in a copy of the caller's context so OCR spans join its trace
+    context = contextvars.copy_context()
+    
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(context.run(_transcribe_page, page))
+        except BaseException as e:
+            future.set_exception(e)
+    
+    threading.Thread(target=run, name="ocr-page", daemon=True).start()
+    return future
+
+def transcribe_pages(pages, notify_callback=None, max_workers=None,
+                     page_timeout=None, max_retries=None, total=None):
+    """
+    Transcribe page images concurrently, with at most max_workers attempts running.
+    
+    Pages are pulled from the iterable only when a slot is free, so a
+    generator such as iter_pdf_images renders later pages while earlier
+    ones are being transcribed, and only in-flight pages are held in memory.
+    
+    Args:
+        pages (iterable): Page images in page order, as paths or (bytes, mime type) buffers
+        notify_callback (function, optional): Callback for progress updates
+        max_workers (int, optional): Maximum number of pages transcribed at once
+        page_timeout (float, optional): Seconds to wait for a single attempt on a page,
+            from when the attempt starts
+        max_retries (int, optional): Extra attempts for a page that failed or timed out
+        total (int, optional): Number of pages, for progress messages when pages is a generator
+    
+    Returns:
+        list: Transcribed text per page, in page order ("" for pages that failed)
+    """
+    max_workers = max(1, max_workers or OCR_MAX_WORKERS)
+    page_timeout = page_timeout or OCR_PAGE_TIMEOUT
+    max_retries = OCR_PAGE_RETRIES if max_retries is None else max_retries
+    
+    if total is None and hasattr(pages, '__len__'):
+        total = len(pages)
+    page_iter = enumerate(pages)
+    exhausted = False
+    
+    texts = {}
+    buffers = {}  # page index -> page, kept until the page is finished
+    retries = deque()  # (page index, attempt)
+    running = {}  # future -> (page index, attempt, deadline); counts against max_workers
+    completed = 0
+    
+    def finish(index, text):
+        nonlocal completed
+        texts[index] = text
+        buffers.pop(index, None)
+        completed += 1
+    
+    def retry_or_give_up(index, attempt, reason):
+        if attempt < max_retries:
+            print(f"Page {index+1} {reason}, retrying ({attempt+1}/{max_retries})")
+            retries.append((index, attempt + 1))
+            return
+        print(f"Page {index+1} {reason}, giving up")
+        finish(index, "")
+        if notify_callback:
+            notify_callback({
+                'status': 'processing',
+                'message': f'Could not read page {index+1}, continuing with the rest ({completed} of {total or "?"} done)...'
+            })
+    
+    while True:
+        while len(running) < max_workers:
+            if retries:
+                index, attempt = retries.popleft()
+            elif not exhausted:
+                try:
+                    index, page = next(page_iter)
+                except StopIteration:
+                    exhausted = True
+                    continue
+                buffers[index] = page
+                attempt = 0
+            else:
+                break
+            future = _start_attempt(buffers[index])
+            running[future] = (index, attempt, time.monotonic() + page_timeout)
+        
+        if not running:
+            break
+        
+        next_deadline = min(deadline for _, _, deadline in running.values())
+        done, _ = wait(running, timeout=max(0, next_deadline - time.monotonic()),
+                       return_when=FIRST_COMPLETED)
+        
+        for future in done:
+            index, attempt, _ = running.pop(future)
+            try:
+                text = future.result() or ""
+            except Exception as e:
+                retry_or_give_up(index, attempt, f"failed: {str(e)}")
+                continue
+            finish(index, text)
+            if notify_callback:
+                notify_callback({
+                    'status': 'processing',
+                    'message': f'Processed page {index+1} ({completed} of {total or "?"} done)...'
+                })
+        
+        # Timed-out attempts are abandoned: their threads finish (bounded by the
+        # client's request timeout) in the background and the result is discarded
+        now = time.monotonic()
+        for future, (index, attempt, deadline) in list(running.items()):
+            if deadline <= now:
+                del running[future]
+                retry_or_give_up(index, attempt, f"timed out after {page_timeout:g}s")
+    
+    return [texts[i] for i in range(len(texts))]
+
+def extract_text(input_file, notify_callback=None, max_workers=None,
+                 page_timeout=None, max_retries=None, preprocess=None):
     """
     Extract text from either PDF or image files
     
     Args:
         input_file (str): Path to the input file (PDF or image)
         notify_callback (function, optional): Callback for progress updates
+        max_workers (int, optional): Concurrent page transcriptions for PDFs
+        page_timeout (float, optional): Per-page attempt timeout in seconds for PDFs
+        max_retries (int, optional): Per-page retries for PDFs
+        preprocess (bool, optional): Render/downscale images for OCR (defaults to OCR_PREPROCESS)
     
     Returns:
         list: List of extracted text strings
     """
     results = []
+    if preprocess is None:
+        preprocess = OCR_PREPROCESS
 
     try:
         if input_file.endswith('.pdf'):
-            # Create a temporary directory for the images
-            with tempfile.TemporaryDirectory() as temp_dir:
-                # Convert PDF to images
-                if notify_callback:
-                    notify_callback({'status': 'processing', 'message': 'Converting PDF to images...'})
-                
-                image_files = pdf_to_images(input_file, output_folder=temp_dir)
-                
-                # Extract text from each image
-                for i, img_path in enumerate(image_files):
-                    if notify_callback:
-                        notify_callback({
-                            'status': 'processing', 
-                            'message': f'Processing page {i+1} of {len(image_files)}...'
-                        })
-                    
-                    # Use the single image extraction function directly
-                    text = extract_text_from_image(img_path)
-                    if text:
-                        # Clean text before adding to results
-                        results.append(clean_extracted_text(text))
+            total = pdf_page_count(input_file)
+            if notify_callback:
+                notify_callback({
+                    'status': 'processing',
+                    'message': f'Processing {total} pages...'
+                })
+            
+            # Pages are rendered to memory on demand and transcribed concurrently;
+            # texts come back in page order
+            pages = iter_ocr_pages(input_file) if preprocess else iter_pdf_images(input_file)
+            texts = transcribe_pages(pages, notify_callback=notify_callback,
+                                     max_workers=max_workers, page_timeout=page_timeout,
+                                     max_retries=max_retries, total=total)
+            for text in texts:
+                if text:
+                    # Clean text before adding to results
+                    results.append(clean_extracted_text(text))
         
         elif input_file.endswith(('.png', '.jpg', '.jpeg')):
             # For a single image, just extract text directly
             if notify_callback:
                 notify_callback({'status': 'processing', 'message': 'Extracting text from image...'})
             
-            text = extract_text_from_image(input_file)
+            if preprocess:
+                try:
+                    page = preprocess_image_file(input_file)
+                    with span("ocr"):
+                        text = transcribe_image_bytes(*page)
+                except Exception as e:
+                    print(f"Error extracting text: {str(e)}")
+                    text = ""
+            else:
+                with span("ocr"):
+                    text = extract_text_from_image(input_file)
             if text:
                 # Clean text before adding to results
                 results.append(clean_extracted_text(text))
@@ -1,6 +1,7 @@
 import fitz
 from pathlib import Path
 import os
+from metrics import span
 
 def pdf_to_images(pdf_path, output_folder="media", fmt="png", zoom=4.0):
     """
@@ -30,6 +31,44 @@ def pdf_to_images(pdf_path, output_folder="media", fmt="png", zoom=4.0):
 
     return image_paths
 
+IMAGE_MIME_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+}
+
+def iter_pdf_images(pdf_path, fmt="jpeg", zoom=4.0, jpg_quality=90):
+    """
+    Render PDF pages to in-memory image buffers, one page at a time.
+    
+    Nothing is written to disk: each page is rasterized and encoded straight
+    from the pixmap, so the caller can hand the bytes to the transcriber
+    without a save/open round-trip.
+    
+    :param pdf_path: Path to the input PDF file.
+    :param fmt: Encoding for the buffers ('jpeg' or 'png').
+    :param zoom: Scaling factor to increase resolution (e.g., 2.0 = 200% resolution).
+    :param jpg_quality: JPEG quality when fmt is 'jpeg'.
+    :return: Generator of (image bytes, mime type) tuples in page order.
+    """
+    fmt = fmt.lower()
+    if fmt not in IMAGE_MIME_TYPES:
+        raise ValueError(f"Unsupported image format: {fmt}")
+    output = "jpg" if fmt in ("jpg", "jpeg") else fmt
+
+    with fitz.open(pdf_path) as doc:
+        mat = fitz.Matrix(zoom, zoom)
+        for page in doc:
+            with span("rasterize"):
+                pix = page.get_pixmap(matrix=mat)
+                data = pix.tobytes(output=output, jpg_quality=jpg_quality)
+            yield data, IMAGE_MIME_TYPES[fmt]
+
+def pdf_page_count(pdf_path):
+    """Return the number of pages in a PDF without rendering them."""
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
 # Only run this code when the script is executed directly
 if __name__ == "__main__":
     # Example usage:
@@ -0,0 +1,214 @@
+"""
+Per-student progress summaries, kept up to date incrementally.
+
+A rolling EssayProgress summary is stored for each student together with the
+id of the newest essay it covers. The first summary is built from the whole
+history; after that a request only fetches essays newer than the stored one
+and folds them into the summary in size-bounded batches, so prompts never
+grow with the student's history. Finished summaries are also held in
+memory for a short while so repeat requests don't go to Supabase at all.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from postgrest.exceptions import APIError
+
+from analyse_history import analyze_student_progress, update_student_progress, PROGRESS_PROMPT_VERSION
+from essay_list import PageCache
+from metrics import span
+from result_cache import CACHE_DIR
+from supabase_functions import execute_with_retry
+
+PROGRESS_STORE_PATH = os.getenv("PROGRESS_STORE_PATH", os.path.join(CACHE_DIR, "progress.sqlite3"))
+# Essays column identifying the student who wrote an essay. Essays aren't linked to
+# students out of the box, so per-student requests need the column created and named here
+STUDENT_COLUMN = os.getenv("STUDENT_COLUMN") or None
+# Postgres error code PostgREST reports for a column that doesn't exist
+UNDEFINED_COLUMN = "42703"
+# Seconds a summary is served from memory without checking for newer essays
+PROGRESS_CACHE_TTL = float(os.getenv("PROGRESS_CACHE_TTL", "60"))
+# Most essay text sent to the model in one update
+PROGRESS_BATCH_CHARS = int(os.getenv("PROGRESS_BATCH_CHARS", "60000"))
+FETCH_PAGE_SIZE = 200
+# Scope used when no student is given: every essay in the table
+ALL_STUDENTS = "*"
+
+class StudentScopeError(ValueError):
+    """Raised when essays are requested for one student but Essays has no student column"""
+    pass
+
+def scope_to_student(builder, student):
+    """Restrict an Essays query to one student's essays; student None leaves it unrestricted."""
+    if student is None:
+        return builder
+    if not STUDENT_COLUMN:
+        raise StudentScopeError("Essays are not linked to students; set STUDENT_COLUMN to the Essays "
+                                "column holding the student id to filter by studentId")
+    return builder.eq(STUDENT_COLUMN, student)
+
+def execute_scoped(build_query, student):
+    """execute_with_retry for a query built with scope_to_student, failing clearly if the column is missing."""
+    try:
+        return execute_with_retry(build_query)
+    except APIError as e:
+        if student is not None and str(e.code) == UNDEFINED_COLUMN:
+            raise StudentScopeError(f"Essays has no {STUDENT_COLUMN!r} column; set STUDENT_COLUMN to the "
+                                    "column holding the student id") from e
+        raise
+
+class ProgressStore:
+    """SQLite table of the latest summary per student."""
+    def __init__(self, path=PROGRESS_STORE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS summaries (
+                student TEXT PRIMARY KEY,
+                prompt_version TEXT NOT NULL,
+                last_essay_id INTEGER NOT NULL,
+                essay_count INTEGER NOT NULL,
+                progress TEXT NOT NULL,
+                updated REAL NOT NULL
+            )""")
+        self.conn.commit()
+
+    def get(self, student):
+        """Return the stored summary record for a student, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT prompt_version, last_essay_id, essay_count, progress, updated FROM summaries WHERE student = ?",
+                (student,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'prompt_version': row[0],
+            'last_essay_id': row[1],
+            'essay_count': row[2],
+            'progress': json.loads(row[3]),
+            'updated': row[4],
+        }
+
+    def put(self, student, record):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?, ?)",
+                (student, record['prompt_version'], record['last_essay_id'], record['essay_count'],
+                 json.dumps(record['progress']), record['updated'])
+            )
+            self.conn.commit()
+
+def fetch_new_essays(supabase, student=None, after_id=0):
+    """Return [{'id', 'essay_body'}] for a student's essays with ids above after_id, oldest first."""
+    essays = []
+    while True:
+        def query():
+            builder = supabase.table("Essays").select("id, essay_body").gt("id", after_id)
+            return scope_to_student(builder, student).order("id").limit(FETCH_PAGE_SIZE)
+        rows = execute_scoped(query, student).data or []
+        essays.extend(row for row in rows if row.get('essay_body'))
+        if len(rows) < FETCH_PAGE_SIZE:
+            return essays
+        after_id = rows[-1]['id']
+
+def essay_batches(essays, max_chars=None):
+    """Group essays, in order, into batches of at most max_chars of text (one essay minimum)."""
+    max_chars = max_chars or PROGRESS_BATCH_CHARS
+    batch = []
+    size = 0
+    for essay in essays:
+        length = len(essay['essay_body'])
+        if batch and size + length > max_chars:
+            yield batch
+            batch, size = [], 0
+        batch.append(essay)
+        size += length
+    if batch:
+        yield batch
+
+class ProgressTracker:
+    """
+    Builds and caches per-student progress summaries.
+
+    Updates for one student are serialized, so concurrent requests wait for a
+    single model call instead of each making their own.
+    """
+    def __init__(self, store=None, cache_ttl=PROGRESS_CACHE_TTL):
+        self.store = store or ProgressStore()
+        self.cache = PageCache(ttl=cache_ttl)
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+
+    def _lock(self, key):
+        with self.locks_lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def get(self, supabase, student=None, refresh=False):
+        """
+        Return the progress summary for a student, updated with any newer essays.
+
+        Args:
+            supabase (Client): Supabase client
+            student (str, optional): Student id; None covers every essay
+            refresh (bool): Check for newer essays even if a summary is cached
+
+        Returns:
+            dict: {'student', 'progress': EssayProgress, 'essayCount', 'lastEssayId', 'updated'},
+            or None when the student has no essays
+        """
+        key = ALL_STUDENTS if student is None else str(student)
+        if not refresh:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        with self._lock(key):
+            if not refresh:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return cached
+
+            record = self.store.get(key)
+            if record and record['prompt_version'] != PROGRESS_PROMPT_VERSION:
+                record = None
+            with span("supabase"):
+                essays = fetch_new_essays(supabase, student, record['last_essay_id'] if record else 0)
+
+            # A first summary covers the whole history at once (map-reduce when it
+            # is long); later ones fold newer essays into the stored summary
+            batches = [essays] if record is None and essays else essay_batches(essays)
+            for batch in batches:
+                bodies = [essay['essay_body'] for essay in batch]
+                if record is None:
+                    progress = analyze_student_progress(bodies)
+                else:
+                    progress = update_student_progress(record['progress'], bodies)
+                if isinstance(progress, str):
+                    raise ValueError("Model returned a progress summary that is not valid JSON")
+                # Saved after every batch, so a failure later on doesn't redo this one
+                record = {
+                    'prompt_version': PROGRESS_PROMPT_VERSION,
+                    'last_essay_id': batch[-1]['id'],
+                    'essay_count': (record['essay_count'] if record else 0) + len(batch),
+                    'progress': progress,
+                    'updated': time.time(),
+                }
+                self.store.put(key, record)
+
+            if record is None:
+                return None
+            result = {
+                'student': student,
+                'progress': record['progress'],
+                'essayCount': record['essay_count'],
+                'lastEssayId': record['last_essay_id'],
+                'updated': record['updated'],
+            }
+            self.cache.set(key, result)
+            return result
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Where cached model results live; one SQLite file shared by all workers on the host
+CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") != "0"
+
+def cache_key(function, model, prompt_version, input_bytes, rubric_version=""):
+    """
+    Content-addressed key for a model call.
+
+    Args:
+        function (str): Name of the calling function, e.g. "grade_essay"
+        model (str): Model name the call goes to
+        prompt_version (str): Version of the prompt template
+        input_bytes (bytes | str): Essay text or encoded image
+        rubric_version (str, optional): Version of the rubric used, if any
+
+    Returns:
+        str: Hex digest identifying the call
+    """
+    if isinstance(input_bytes, str):
+        input_bytes = input_bytes.encode('utf-8')
+    digest = hashlib.sha256()
+    for part in (function, model, prompt_version, rubric_version):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    digest.update(input_bytes)
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    On-disk cache of JSON-serializable results with LRU eviction and a TTL.
+
+    Entries are evicted least-recently-used first once the stored values exceed
+    max_bytes, and treated as misses once they are older than ttl seconds.
+    """
+    def __init__(self, path, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'expired': 0}
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self.conn.commit()
+
+    def get(self, key):
+        """Return (hit, value) for a key, dropping it if it has expired."""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.counters['misses'] += 1
+                return False, None
+            value, created = row
+            if self.ttl and now - created > self.ttl:
+                self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.conn.commit()
+                self.counters['expired'] += 1
+                self.counters['misses'] += 1
+                return False, None
+            self.conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.counters['hits'] += 1
+        return True, json.loads(value)
+
+    def set(self, key, value, namespace=""):
+        """Store a value, evicting least-recently-used entries past the size bound."""
+        encoded = json.dumps(value)
+        size = len(encoded.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, namespace, value, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, namespace, encoded, size, now, now)
+            )
+            self.counters['sets'] += 1
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute(
+            "SELECT key, size FROM entries ORDER BY accessed ASC"
+        ).fetchall():
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.counters['evictions'] += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.commit()
+
+    def stats(self):
+        """Hit/miss counters for this process plus the current size of the store."""
+        with self.lock:
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'hit_rate': stats['hits'] / lookups if lookups else 0.0,
+        })
+        return stats
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Return the process-wide cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache(os.path.join(CACHE_DIR, "results.sqlite3"))
+    return _cache
+
+def cached_call(function, model, prompt_version, input_bytes, compute,
+                rubric_version="", should_cache=None):
+    """
+    Return a cached result for a model call, computing and storing it on a miss.
+
+    Args:
+        function, model, prompt_version, input_bytes, rubric_version: Parts of the cache key
+        compute (callable): Zero-argument function that makes the real call
+        should_cache (callable, optional): Predicate deciding whether a result is worth keeping
+
+    Returns:
+        The cached or freshly computed result
+    """
+    if not CACHE_ENABLED:
+        return compute()
+
+    cache = get_cache()
+    key = cache_key(function, model, prompt_version, input_bytes, rubric_version)
+    try:
+        hit, value = cache.get(key)
+        if hit:
+            return value
+    except sqlite3.Error as e:
+        print(f"Result cache read failed: {str(e)}")
+        return compute()
+
+    value = compute()
+    if should_cache is None or should_cache(value):
+        try:
+            cache.set(key, value, namespace=function)
+        except sqlite3.Error as e:
+            print(f"Result cache write failed: {str(e)}")
+    return value
+
+def cache_lookup(function, model, prompt_version, input_bytes, rubric_version=""):
+    """Return (hit, value) for a model call without computing it on a miss."""
+    if not CACHE_ENABLED:
+        return False, None
+    try:
+        return get_cache().get(cache_key(function, model, prompt_version, input_bytes, rubric_version))
+    except sqlite3.Error as e:
+        print(f"Result cache read failed: {str(e)}")
+        return False, None
+
+def cache_store(function, model, prompt_version, input_bytes, value, rubric_version=""):
+    """Store a result computed outside cached_call, such as one part of a batched model call."""
+    if not CACHE_ENABLED:
+        return
+    try:
+        get_cache().set(cache_key(function, model, prompt_version, input_bytes, rubric_version),
+                        value, namespace=function)
+    except sqlite3.Error as e:
+        print(f"Result cache write failed: {str(e)}")
+
+def cached_stream(function, model, prompt_version, input_bytes, compute_stream,
+                  rubric_version="", should_cache=None):
+    """
+    Streaming counterpart of cached_call for generators of JSON-serializable items.
+
+    On a hit the cached items are replayed; on a miss the items are yielded as
+    they are produced and the full list is stored once the stream completes.
+
+    Args:
+        should_cache (callable, optional): Predicate on (items, the generator's
+            return value) deciding whether the list is worth keeping, e.g. only
+            when the response was complete
+    """
+    if not CACHE_ENABLED:
+        yield from compute_stream()
+        return
+
+    cache = get_cache()
+    key = cache_key(function, model, prompt_version, input_bytes, rubric_version)
+    try:
+        hit, items = cache.get(key)
+    except sqlite3.Error as e:
+        print(f"Result cache read failed: {str(e)}")
+        hit, items = False, None
+    if hit:
+        yield from items
+        return
+
+    items = []
+    stream = compute_stream()
+    while True:
+        try:
+            item = next(stream)
+        except StopIteration as stop:
+            returned = stop.value
+            break
+        items.append(item)
+        yield item
+    if items and (should_cache is None or should_cache(items, returned)):
+        try:
+            cache.set(key, items, namespace=function)
+        except sqlite3.Error as e:
+            print(f"Result cache write failed: {str(e)}")
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from typing_extensions import TypedDict
+
+RUBRIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "media")
+RUBRIC_FILE_PATTERN = re.compile(r"^rubrics_(v\d+)\.txt$")
+DEFAULT_RUBRIC_VERSION = os.getenv("RUBRIC_VERSION", "v2")
+# How often the rubric folder is re-scanned for edited, added or removed files
+RUBRIC_RELOAD_INTERVAL = 2.0
+
+class Rubric(TypedDict):
+    """
+    A loaded rubric file.
+
+    Attributes:
+        version (str): Version taken from the file name, e.g. "v2"
+        text (str): Rubric contents sent to the model
+        digest (str): SHA-256 of the contents, changes whenever the file is edited
+        path (str): File the rubric was loaded from
+        mtime (float): Modification time of the file when it was loaded
+    """
+    version: str
+    text: str
+    digest: str
+    path: str
+    mtime: float
+
+class RubricError(ValueError):
+    """Raised for unknown rubric versions or rubric files that fail validation"""
+    pass
+
+def validate_rubric(text, path):
+    """Check that a rubric file has content and describes the full 1-5 score range."""
+    if not text.strip():
+        raise RubricError(f"Rubric file is empty: {path}")
+    missing = [score for score in range(1, 6) if f"({score})" not in text]
+    if missing:
+        raise RubricError(f"Rubric file {path} has no descriptors for scores {missing}")
+
+class RubricRegistry:
+    """
+    All rubrics_v*.txt files, loaded and validated once and reloaded when they change.
+
+    Files are re-checked at most every `reload_interval` seconds, and only files
+    whose modification time changed are read again. A file that fails
+    validation on reload keeps serving its last good version.
+    """
+    def __init__(self, folder=RUBRIC_FOLDER, reload_interval=RUBRIC_RELOAD_INTERVAL):
+        self.folder = folder
+        self.reload_interval = reload_interval
+        self.rubrics = {}
+        self.lock = threading.Lock()
+        self._last_check = 0
+        self.reload(force=True)
+
+    def reload(self, force=False):
+        """Re-scan the rubric folder, reading only new or modified files."""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.reload_interval:
+            return
+        with self.lock:
+            self._last_check = now
+            found = {}
+            for filename in os.listdir(self.folder):
+                match = RUBRIC_FILE_PATTERN.match(filename)
+                if match:
+                    found[match.group(1)] = os.path.join(self.folder, filename)
+
+            rubrics = {}
+            for version, path in found.items():
+                mtime = os.path.getmtime(path)
+                current = self.rubrics.get(version)
+                if current and current['mtime'] == mtime:
+                    rubrics[version] = current
+                    continue
+                with open(path, 'r', encoding='utf-8') as file:
+                    text = file.read()
+                try:
+                    validate_rubric(text, path)
+                except RubricError as e:
+                    if force and not current:
+                        raise
+                    print(f"Keeping previous rubric {version}: {str(e)}")
+                    if current:
+                        rubrics[version] = current
+                    continue
+                rubrics[version] = Rubric(
+                    version=version,
+                    text=text,
+                    digest=hashlib.sha256(text.encode('utf-8')).hexdigest(),
+                    path=path,
+                    mtime=mtime,
+                )
+            self.rubrics = rubrics
+
+    def get(self, version=None):
+        """Return the rubric for a version (default DEFAULT_RUBRIC_VERSION)."""
+        self.reload()
+        version = version or DEFAULT_RUBRIC_VERSION
+        rubric = self.rubrics.get(version)
+        if rubric is None:
+            raise RubricError(f"Unknown rubric version: {version} (available: {', '.join(self.versions())})")
+        return rubric
+
+    def versions(self):
+        self.reload()
+        return sorted(self.rubrics, key=lambda version: int(version[1:]))
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    """Return the process-wide rubric registry, loading it on first use."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = RubricRegistry()
+    return _registry
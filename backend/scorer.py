@@ -1,10 +1,14 @@
-from google import genai
 from google.genai import types
-from dotenv import load_dotenv
+from llm_client import generate, generate_stream, create_cached_content
 import os
 from typing_extensions import TypedDict, List
-
-load_dotenv()
+from result_cache import cached_call, cached_stream
+from json_stream import JSONArrayStream
+from rubrics import get_registry
+from metrics import timed
+import threading
+import time
+import json
 
 class Comment(TypedDict):
     """Comment on a specific portion of text"""
@@ -19,14 +23,17 @@ class RubricScore(TypedDict):
     explanation: List[str]
     comments: List[Comment]
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+GRADING_MODEL = "gemini-2.0-pro-exp-02-05"
+# Bump when the grading prompt changes so cached results are not reused
+GRADING_PROMPT_VERSION = "2"
+# Lifetime of the model-side cache holding the instructions and rubric
+PROMPT_CACHE_TTL = int(os.getenv("PROMPT_CACHE_TTL", "3600"))
+# After the model refuses to create a context cache, wait this long before trying again
+PROMPT_CACHE_RETRY_AFTER = 600
 
-def grade_essay(essay):
-    with open('media/rubrics_v2.txt', 'r') as file:
-        rubrics = file.read()
-    prompt = f"""
+GRADING_INSTRUCTIONS = """
             You are an expert in evaluating essays. Your task is to evaluate the given essay based on the provided rubrics.
-            The essay is provided in the 'essay' variable and the rubrics are provided in the 'rubrics' variable.
+            The rubrics are provided in the <rubrics> tags and the essay is provided in the <essay> tags.
             Please read the essay and rubrics carefully and provide a detailed evaluation of the essay based on the rubrics.
             You should provide a score for each rubric and a detailed explanation for each score.
             For comments, limit to a maximum of 3 comments per rubric category.
@@ -36,28 +43,186 @@ def grade_essay(essay):
             4 = Good
             3 = Satisfactory
             2 = Needs Improvement
-            1 = Poor
-            
-            <essay>
-            {essay}
-            </essay>
+            1 = Poor"""
+
+def _rubric_cache_version(rubric):
+    # Editing a rubric file in place also invalidates cached grades
+    return f"{rubric['version']}:{rubric['digest'][:16]}"
+
+@timed("grade")
+def grade_essay(essay, rubric_version=None):
+    rubric = get_registry().get(rubric_version)
+    return cached_call(
+        "grade_essay", GRADING_MODEL, GRADING_PROMPT_VERSION, essay,
+        lambda: _grade_essay(essay, rubric),
+        rubric_version=_rubric_cache_version(rubric),
+        should_cache=lambda result: not isinstance(result, str)
+    )
+
+def grade_essay_stream(essay, rubric_version=None):
+    """
+    Grade an essay, yielding each RubricScore as soon as the model has finished it.
+    
+    Shares its cache entries with grade_essay, so a graded essay replays
+    instantly. A stream is only stored when the model closed the array, so
+    the entry is the same list grade_essay would have parsed; a cut-off
+    response is never served to grade_essay as a full grading.
+    """
+    rubric = get_registry().get(rubric_version)
+    return cached_stream(
+        "grade_essay", GRADING_MODEL, GRADING_PROMPT_VERSION, essay,
+        lambda: _grade_essay_stream(essay, rubric),
+        rubric_version=_rubric_cache_version(rubric),
+        should_cache=lambda items, closed: closed
+    )
+
+def _grading_prefix(rubric):
+    """Static part of the grading prompt, identical for every essay graded against a rubric"""
+    return f"""{GRADING_INSTRUCTIONS}
             
             <rubrics>
-            {rubrics}
+            {rubric['text']}
             </rubrics>"""
+
+_prefix_caches = {}  # rubric digest -> (cached content name, expiry)
+_prefix_locks = {}  # rubric digest -> Lock held while its cache is created
+_prefix_cache_lock = threading.Lock()  # guards the two dicts above, never held over a call
+_prefix_cache_disabled_until = 0
+
+def _fresh_prefix(digest, now):
+    """(known, name): the live cache for a rubric, or None while caching is disabled."""
+    with _prefix_cache_lock:
+        entry = _prefix_caches.get(digest)
+        if entry and entry[1] > now:
+            return True, entry[0]
+        if now < _prefix_cache_disabled_until:
+            return True, None
+        return False, None
+
+def _cached_prefix(rubric):
+    """
+    Name of a model-side context cache holding the instructions and rubric.
+    
+    The prefix is uploaded once per rubric and reused until shortly before it
+    expires, so each grading call only sends the essay. Returns None when the
+    model does not support context caching, in which case the prefix is sent
+    inline as a system instruction.
     
-    response = client.models.generate_content(
-        model="gemini-2.0-pro-exp-02-05",
-        contents=[prompt],
-        config=types.GenerateContentConfig(
+    Only callers needing the same rubric's cache wait for it to be created;
+    grading against other rubrics carries on.
+    """
+    global _prefix_cache_disabled_until
+    digest = rubric['digest']
+    known, name = _fresh_prefix(digest, time.time())
+    if known:
+        return name
+    with _prefix_cache_lock:
+        lock = _prefix_locks.setdefault(digest, threading.Lock())
+    with lock:
+        # Another caller may have created it while this one waited
+        now = time.time()
+        known, name = _fresh_prefix(digest, now)
+        if known:
+            return name
+        try:
+            cache = create_cached_content(
+                model=GRADING_MODEL,
+                config=types.CreateCachedContentConfig(
+                    display_name=f"grading-{_rubric_cache_version(rubric)}",
+                    system_instruction=_grading_prefix(rubric),
+                    ttl=f"{PROMPT_CACHE_TTL}s",
+                ),
+            )
+        except Exception as e:
+            print(f"Context caching unavailable, sending rubric inline: {str(e)}")
+            with _prefix_cache_lock:
+                _prefix_cache_disabled_until = now + PROMPT_CACHE_RETRY_AFTER
+            return None
+        # Renew a minute early so an in-flight request never references an expired cache
+        with _prefix_cache_lock:
+            _prefix_caches[digest] = (cache.name, now + PROMPT_CACHE_TTL - 60)
+        return cache.name
+
+def _forget_prefix(rubric):
+    with _prefix_cache_lock:
+        _prefix_caches.pop(rubric['digest'], None)
+
+def _grading_config(cached_prefix, rubric):
+    if cached_prefix:
+        return types.GenerateContentConfig(
+            cached_content=cached_prefix,
             temperature=0,
             response_mime_type="application/json",
             response_schema=list[RubricScore]
-        ),
+        )
+    return types.GenerateContentConfig(
+        system_instruction=_grading_prefix(rubric),
+        temperature=0,
+        response_mime_type="application/json",
+        response_schema=list[RubricScore]
     )
+
+def _essay_contents(essay):
+    return [f"""
+            <essay>
+            {essay}
+            </essay>"""]
+
+def _generate_with_prefix(essay, rubric):
+    """Grade using the cached prefix, falling back to an inline prefix if the cache is gone"""
+    cached_prefix = _cached_prefix(rubric)
+    try:
+        return generate(
+            model=GRADING_MODEL,
+            contents=_essay_contents(essay),
+            config=_grading_config(cached_prefix, rubric),
+        )
+    except Exception as e:
+        if not cached_prefix:
+            raise
+        print(f"Cached grading prefix failed, retrying inline: {str(e)}")
+        _forget_prefix(rubric)
+        return generate(
+            model=GRADING_MODEL,
+            contents=_essay_contents(essay),
+            config=_grading_config(None, rubric),
+        )
+
+def _grade_essay_stream(essay, rubric):
+    """Yield RubricScores as they complete; returns whether the response array was closed."""
+    cached_prefix = _cached_prefix(rubric)
+    parser = JSONArrayStream()
+    received = False
+    try:
+        for chunk in generate_stream(
+            model=GRADING_MODEL,
+            contents=_essay_contents(essay),
+            config=_grading_config(cached_prefix, rubric),
+        ):
+            if chunk.text:
+                received = True
+                yield from parser.feed(chunk.text)
+        return parser.closed
+    except Exception as e:
+        # Streams fail lazily; only fall back if nothing was produced yet
+        if not cached_prefix or received:
+            raise
+        print(f"Cached grading prefix failed, retrying inline: {str(e)}")
+        _forget_prefix(rubric)
+    
+    for chunk in generate_stream(
+        model=GRADING_MODEL,
+        contents=_essay_contents(essay),
+        config=_grading_config(None, rubric),
+    ):
+        if chunk.text:
+            yield from parser.feed(chunk.text)
+    return parser.closed
+
+def _grade_essay(essay, rubric):
+    response = _generate_with_prefix(essay, rubric)
     
     # Parse the response text as JSON
-    import json
     try:
         return json.loads(response.text)
     except json.JSONDecodeError:
@@ -0,0 +1,102 @@
+"""
+Writing-style profiles for many essays at once: a class, or one student's history.
+
+Each essay is reduced to its raw counts (writing_style.style_counts); the
+counts for every essay form one NumPy matrix, and features, hero scores, the
+hero choice and the distribution statistics are computed over whole columns
+rather than essay by essay.
+"""
+import numpy as np
+
+from progress_tracker import scope_to_student, execute_scoped
+from writing_style import HEROES, COUNT_FIELDS, style_counts, features_from_counts, hero_scores, tie_break
+
+DEFAULT_PROFILE_ESSAYS = 500
+MAX_PROFILE_ESSAYS = 2000
+FETCH_PAGE_SIZE = 500
+# Percentiles reported for every feature
+PERCENTILES = (0, 25, 50, 75, 100)
+
+def fetch_essays(supabase, student=None, limit=DEFAULT_PROFILE_ESSAYS):
+    """Return [{'id', 'essay_body'}] for up to `limit` of the newest essays, optionally for one student."""
+    essays = []
+    cursor = None
+    while len(essays) < limit:
+        page_size = min(FETCH_PAGE_SIZE, limit - len(essays))
+        def query():
+            builder = supabase.table("Essays").select("id, essay_body").order("id", desc=True).limit(page_size)
+            builder = scope_to_student(builder, student)
+            return builder if cursor is None else builder.lt("id", cursor)
+        rows = execute_scoped(query, student).data or []
+        essays.extend(row for row in rows if row.get('essay_body'))
+        if len(rows) < page_size:
+            break
+        cursor = rows[-1]['id']
+    return essays
+
+def choose_heroes(scores, ties):
+    """
+    Index of the chosen hero for each essay.
+
+    Args:
+        scores (ndarray): (essays, heroes) scores
+        ties (ndarray): tie_break() of each essay's text
+
+    Returns:
+        ndarray: Hero indexes; among equally scored heroes the same one
+        writing_style.choose_hero picks
+    """
+    top = scores == scores.max(axis=1, keepdims=True)
+    # The (tie % number of top heroes)-th top hero, counting in HEROES order
+    rank = ties % top.sum(axis=1)
+    return np.argmax(top & (np.cumsum(top, axis=1) == rank[:, None] + 1), axis=1)
+
+def distribution(values):
+    """Summary statistics of one feature across essays."""
+    low, p25, median, p75, high = np.percentile(values, PERCENTILES)
+    return {
+        'mean': float(values.mean()),
+        'std': float(values.std()),
+        'min': float(low),
+        'p25': float(p25),
+        'median': float(median),
+        'p75': float(p75),
+        'max': float(high),
+    }
+
+def profile_essays(essays):
+    """
+    Style features and heroes for a set of essays.
+
+    Args:
+        essays (list): [{'id', 'essay_body'}]
+
+    Returns:
+        dict: {'essayCount', 'essays': [{'id', 'hero', 'features'}],
+        'heroes': [{'name', 'icon', 'count'}], 'distribution': {feature: stats}}
+    """
+    if not essays:
+        return {'essayCount': 0, 'essays': [], 'heroes': [], 'distribution': {}}
+
+    counts = np.array([style_counts(essay['essay_body']) for essay in essays], dtype=np.float64)
+    features = features_from_counts(dict(zip(COUNT_FIELDS, counts.T)))
+    scores = np.stack(list(hero_scores(features).values()), axis=1)
+    ties = np.array([tie_break(essay['essay_body']) for essay in essays], dtype=np.int64)
+    chosen = choose_heroes(scores, ties)
+    hero_counts = np.bincount(chosen, minlength=len(HEROES))
+
+    names = list(features)
+    # One row per essay, converted to Python floats in one go
+    rows = np.column_stack([features[name] for name in names]).tolist()
+    return {
+        'essayCount': len(essays),
+        'essays': [
+            {'id': essay['id'], 'hero': HEROES[hero]['name'], 'features': dict(zip(names, row))}
+            for essay, hero, row in zip(essays, chosen.tolist(), rows)
+        ],
+        'heroes': [
+            {'name': hero['name'], 'icon': hero['icon'], 'count': int(count)}
+            for hero, count in zip(HEROES, hero_counts)
+        ],
+        'distribution': {name: distribution(features[name]) for name in names},
+    }
@@ -1,36 +1,181 @@
+import json
 import os
-from supabase import create_client, Client
+import random
+import threading
+import time
+
+import httpx
+from supabase import create_client, Client, ClientOptions
 from dotenv import load_dotenv
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Seconds before a single PostgREST request is abandoned
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "30"))
+SUPABASE_MAX_ATTEMPTS = int(os.getenv("SUPABASE_MAX_ATTEMPTS", "4"))
+SUPABASE_BACKOFF_BASE = 0.5
+SUPABASE_BACKOFF_MAX = 10.0
+# Bulk writes are split into requests of at most this many rows / bytes of JSON
+SUPABASE_CHUNK_SIZE = int(os.getenv("SUPABASE_CHUNK_SIZE", "500"))
+SUPABASE_CHUNK_BYTES = 1024 * 1024
+
+# PostgREST codes for "couldn't reach / get a connection to the database"
+RETRYABLE_POSTGREST_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003"}
+RETRYABLE_STATUS = {"408", "429", "500", "502", "503", "504"}
+# Failures where the request never reached PostgREST, or was refused before it was
+# processed; the only ones safe to retry for writes that aren't idempotent (inserts)
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+REJECTED_STATUS = {"429"}
+
+_client = None
+_client_lock = threading.Lock()
+
 def get_supabase_client() -> Client:
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_KEY")
-    supabase: Client = create_client(url, key)
-    return supabase
+    """
+    Return the process-wide Supabase client, creating it on first use.
+
+    The client's PostgREST session is a keep-alive httpx connection pool that
+    is safe to share between threads, so every request reuses it instead of
+    opening new connections.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                url = os.getenv("SUPABASE_URL")
+                key = os.getenv("SUPABASE_KEY")
+                client = create_client(url, key, options=ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT))
+                # The PostgREST client is created lazily; do it here, under the lock
+                client.postgrest
+                _client = client
+    return _client
+
+def is_retryable(error, idempotent=True):
+    """
+    Whether a failed request is worth retrying.
+
+    Idempotent requests (selects, upserts, updates, deletes) are retried on
+    connection problems, timeouts, 5xx and 429. Other requests may already
+    have been applied when a response times out or fails, so they are only
+    retried when they were never sent or were refused with a 429.
+    """
+    if not idempotent:
+        if isinstance(error, UNSENT_ERRORS):
+            return True
+        return isinstance(error, APIError) and str(error.code or "") in REJECTED_STATUS
+    if isinstance(error, (httpx.TimeoutException, httpx.TransportError)):
+        return True
+    if isinstance(error, APIError):
+        code = str(error.code or "")
+        return code in RETRYABLE_POSTGREST_CODES or code in RETRYABLE_STATUS
+    return False
+
+def execute_with_retry(build_query, max_attempts=None, idempotent=True):
+    """
+    Execute a query, retrying transient failures with jittered backoff.
+
+    Args:
+        build_query (callable): Zero-argument function returning the query builder to execute
+        max_attempts (int, optional): Attempts before the last error is raised
+        idempotent (bool): False for inserts, which a retry after a lost
+            response would apply twice
+
+    Returns:
+        APIResponse: The query response
+    """
+    max_attempts = max_attempts or SUPABASE_MAX_ATTEMPTS
+    for attempt in range(max_attempts):
+        try:
+            return build_query().execute()
+        except Exception as e:
+            if attempt == max_attempts - 1 or not is_retryable(e, idempotent):
+                raise
+            delay = random.uniform(0, min(SUPABASE_BACKOFF_MAX, SUPABASE_BACKOFF_BASE * 2 ** attempt))
+            print(f"Supabase request failed ({str(e)}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def chunked(rows, chunk_size=None, max_bytes=SUPABASE_CHUNK_BYTES):
+    """Split rows into chunks bounded by row count and approximate JSON size."""
+    chunk_size = chunk_size or SUPABASE_CHUNK_SIZE
+    chunk = []
+    size = 0
+    for row in rows:
+        row_size = len(json.dumps(row, default=str))
+        if chunk and (len(chunk) >= chunk_size or size + row_size > max_bytes):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(row)
+        size += row_size
+    if chunk:
+        yield chunk
+
+def bulk_insert(table_name, rows, chunk_size=None, client=None):
+    """
+    Insert rows in chunks, one request per chunk.
+
+    Returns:
+        int: Number of rows inserted
+    """
+    client = client or get_supabase_client()
+    written = 0
+    for chunk in chunked(rows, chunk_size):
+        execute_with_retry(lambda: client.table(table_name).insert(chunk, returning=ReturnMethod.minimal),
+                           idempotent=False)
+        written += len(chunk)
+    return written
+
+def bulk_upsert(table_name, rows, on_conflict="", chunk_size=None, client=None):
+    """
+    Insert or update rows in chunks, one request per chunk.
+
+    Upserts are idempotent, so a chunk that failed part-way is safe to retry.
+
+    Returns:
+        int: Number of rows written
+    """
+    client = client or get_supabase_client()
+    written = 0
+    for chunk in chunked(rows, chunk_size):
+        execute_with_retry(lambda: client.table(table_name).upsert(
+            chunk, on_conflict=on_conflict, returning=ReturnMethod.minimal))
+        written += len(chunk)
+    return written
+
+def bulk_delete(table_name, column_name, values, chunk_size=None, client=None):
+    """
+    Delete the rows whose column matches any of the values, in chunks.
 
-# Initialize the Supabase client
-supabase: Client = get_supabase_client()
+    Returns:
+        int: Number of values processed
+    """
+    client = client or get_supabase_client()
+    values = list(values)
+    for i in range(0, len(values), chunk_size or SUPABASE_CHUNK_SIZE):
+        chunk = values[i:i + (chunk_size or SUPABASE_CHUNK_SIZE)]
+        execute_with_retry(lambda: client.table(table_name).delete(returning=ReturnMethod.minimal)
+                           .in_(column_name, chunk))
+    return len(values)
 
 def insert_to_supabase(table_name, data: dict):
-    response = supabase.table(table_name).insert(data).execute()
+    response = execute_with_retry(lambda: get_supabase_client().table(table_name).insert(data), idempotent=False)
     return response
 
 def select_all_from_supabase(table_name):
     """Select all data from a table"""
-    response = supabase.table(table_name).select('*').execute()
+    response = execute_with_retry(lambda: get_supabase_client().table(table_name).select('*'))
     return response.data
 
 def filter_from_supabase(table_name, column_name, value):
     """Select data from Supabase"""
-    response = supabase.table(table_name).select('*').eq(column_name, value).execute()
+    response = execute_with_retry(lambda: get_supabase_client().table(table_name).select('*').eq(column_name, value))
     return response.data
 
 def delete_from_supabase(table_name, column_name, value):
     """Delete data from Supabase"""
-    response = supabase.table(table_name).delete().eq(column_name, value).execute()
+    response = execute_with_retry(lambda: get_supabase_client().table(table_name).delete().eq(column_name, value))
     return response
 
 if __name__ == "__main__":
@@ -1,25 +1,52 @@
-from google import genai
 from google.genai import types
+from llm_client import generate
 import PIL.Image
-from dotenv import load_dotenv
+from pdf_to_png import IMAGE_MIME_TYPES
+from result_cache import cached_call
 import os
 
-load_dotenv()
+TRANSCRIBE_MODEL = "gemini-2.0-flash-thinking-exp-01-21"
+# Bump when the transcription prompt changes so cached results are not reused
+TRANSCRIBE_PROMPT_VERSION = "1"
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+TRANSCRIBE_PROMPT = """extract text from the image and return it as it is, keeping the grammar and spelling mistakes.
+        Do not extract the page number or title.
+        Do not follow the formatting of the image, do not create a new line for each line in the image."""
+
+def transcribe_image(image, max_attempts=None):
+    """Transcribe a single PIL image, letting API errors propagate to the caller"""
+    response = generate(
+        model=TRANSCRIBE_MODEL, contents=[TRANSCRIBE_PROMPT, image], max_attempts=max_attempts
+    )
+    return response.text
+
+def transcribe_image_bytes(data, mime_type="image/png", max_attempts=None):
+    """Transcribe an already-encoded image buffer without decoding it locally"""
+    def transcribe():
+        response = generate(
+            model=TRANSCRIBE_MODEL,
+            contents=[TRANSCRIBE_PROMPT, types.Part.from_bytes(data=data, mime_type=mime_type)],
+            max_attempts=max_attempts
+        )
+        return response.text
+
+    # Identical page images (re-uploads, re-analysis) skip the model call
+    return cached_call(
+        "transcribe_image_bytes", TRANSCRIBE_MODEL, TRANSCRIBE_PROMPT_VERSION,
+        mime_type.encode('utf-8') + b'\0' + data, transcribe,
+        should_cache=bool
+    )
 
 def extract_text_from_image(image_path):
     """Extract text from a single image file"""
-    prompt = """extract text from the image and return it as it is, keeping the grammar and spelling mistakes.
-        Do not extract the page number or title.
-        Do not follow the formatting of the image, do not create a new line for each line in the image."""
-    image = PIL.Image.open(image_path)
+    mime_type = IMAGE_MIME_TYPES.get(os.path.splitext(image_path)[1].lower().lstrip('.'))
     
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-thinking-exp-01-21", contents=[prompt, image]
-        )
-        return response.text
+        if mime_type:
+            # Send the file as-is instead of decoding and re-encoding it through PIL
+            with open(image_path, 'rb') as f:
+                return transcribe_image_bytes(f.read(), mime_type)
+        return transcribe_image(PIL.Image.open(image_path))
     except Exception as e:
         print(f"Error extracting text: {str(e)}")
         return ""
@@ -40,8 +67,8 @@ def extract_text_from_images_with_prefix(prefix):
             print(f"Checking file: {full_filename}")
             if prefix in full_filename and filename.lower().endswith(('.png', '.jpg', '.jpeg')):
                 image = PIL.Image.open(full_filename)
-                response = client.models.generate_content(
-                    model="gemini-2.0-flash-thinking-exp-01-21", 
+                response = generate(
+                    model=TRANSCRIBE_MODEL, 
                     contents=[prompt, image],
                     config=types.GenerateContentConfig(
                         temperature=0,
@@ -0,0 +1,32 @@
+"""
+Evented entry point for production.
+
+Open /api/upload-status streams spend nearly all their time waiting, so serving
+them from greenlets instead of OS threads lets one process hold hundreds of
+classroom sessions. Run with either:
+
+    gunicorn -k gevent -w 1 wsgi:app
+    python wsgi.py
+
+gevent must patch the standard library before app (and its locks) is imported.
+"""
+import os
+
+try:
+    from gevent import monkey
+    monkey.patch_all()
+    HAVE_GEVENT = True
+except ImportError:
+    HAVE_GEVENT = False
+
+from app import app, logger
+
+if __name__ == '__main__':
+    port = int(os.getenv('PORT', '5000'))
+    if HAVE_GEVENT:
+        from gevent.pywsgi import WSGIServer
+        logger.info(f"Starting gevent server on port {port}")
+        WSGIServer(('0.0.0.0', port), app).serve_forever()
+    else:
+        logger.warning("gevent is not installed, falling back to the threaded Flask server")
+        app.run(host='0.0.0.0', port=port, threaded=True)
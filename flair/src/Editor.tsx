@@ -73,6 +73,7 @@ const Editor: React.FC = () => {
   const [showComments, setShowComments] = useState(false);
   const [showFileBrowser, setShowFileBrowser] = useState(false);
   const [essays, setEssays] = useState<any[]>([]);
+  const [essaysCursor, setEssaysCursor] = useState<string | null>(null);
   const [isLoadingEssays, setIsLoadingEssays] = useState(false);
 
   const [wordCount, setWordCount] = useState(0);
@@ -85,7 +86,7 @@ const Editor: React.FC = () => {
   const [currentAnalysis, setCurrentAnalysis] = useState<RubricScore[]>([]);
   const [currentWritingHero, setCurrentWritingHero] = useState<WritingHero | null>(null);
   const [studentProgress, setStudentProgress] = useState<StudentProgress | null>(null);
-  const [assignmentPdfBase64, setAssignmentPdfBase64] = useState<string | null>(null);
+  const [assignmentPdfUrl, setAssignmentPdfUrl] = useState<string | null>(null);
   
   // Loading states
   const [isLoadingProgress, setIsLoadingProgress] = useState(false);
@@ -170,28 +171,30 @@ const Editor: React.FC = () => {
         return;
       }
 
-      // Call the Flask endpoint
-      const response = await axios.post('http://localhost:5000/api/grammar-check', {
-        essay: text,
-      });
+      type Correction = {
+        error: string;
+        starting_index: number;
+        corrected: string;
+      };
 
-      if (response.data.success && response.data.corrections) {
-        const corrections = response.data.corrections as {
-          error: string;
-          starting_index: number;
-          corrected: string;
-        }[];
+      // Corrections already highlighted, so the full check doesn't add them twice
+      const applied = new Set<string>();
 
-        // We'll highlight each "error" text with a comment so user can see suggested correction
+      // We'll highlight each "error" text with a comment so user can see suggested correction
+      const highlight = (corrections: Correction[]) => {
         // For safety, sort them in ascending order of `starting_index` to avoid confusion
         const sorted = corrections.slice().sort((a, b) => a.starting_index - b.starting_index);
 
         sorted.forEach((item) => {
           const from = item.starting_index;
           const to = from + item.error.length;
+          const key = `${from}:${item.error}`;
+          if (applied.has(key)) return;
 
           // Safety check
           if (from >= 0 && to <= text.length && from < to) {
+            applied.add(key);
+
             // Create unique ID for the new comment
             const commentId = uuidv4();
 
@@ -216,6 +219,27 @@ const Editor: React.FC = () => {
             console.warn('Grammar check index out of range:', item);
           }
         });
+      };
+
+      // Offline checks answer in milliseconds; show them while the model runs
+      try {
+        const precheck = await axios.post('http://localhost:5000/api/grammar-precheck', { essay: text });
+        if (precheck.data.success && precheck.data.corrections) {
+          highlight(precheck.data.corrections as Correction[]);
+        }
+      } catch (err) {
+        console.warn('Grammar pre-check failed:', err);
+      }
+
+      // Call the Flask endpoint
+      const response = await axios.post('http://localhost:5000/api/grammar-check', {
+        essay: text,
+        // Only paragraphs edited since the last check go to the model
+        incremental: true,
+      });
+
+      if (response.data.success && response.data.corrections) {
+        highlight(response.data.corrections as Correction[]);
 
         alert('Grammar check complete! See new highlights in Comments.');
       } else {
@@ -283,13 +307,16 @@ const Editor: React.FC = () => {
     }
   };
 
-  // Add this function to fetch essays from Supabase
-  const fetchEssays = async () => {
+  // Add this function to fetch essays from Supabase, one page at a time
+  const fetchEssays = async (cursor: string | null = null) => {
     setIsLoadingEssays(true);
     try {
-      const response = await axios.get('http://localhost:5000/api/list-essays');
-      console.log('Retrieved essays:', response.data);
-      setEssays(response.data);
+      const response = await axios.get('http://localhost:5000/api/list-essays', {
+        params: cursor ? { cursor } : {}
+      });
+      const { essays: page, nextCursor } = response.data;
+      setEssays(cursor ? (previous) => [...previous, ...page] : page);
+      setEssaysCursor(nextCursor);
     } catch (error) {
       console.error('Error fetching essays:', error);
       alert('Failed to load essays from database');
@@ -298,10 +325,23 @@ const Editor: React.FC = () => {
     }
   };
 
-  // Add this function to load an essay into the editor
-  const loadEssay = (essayContent: string) => {
+  // Add this function to load an essay into the editor; the list only has
+  // titles, so the body is fetched when an essay is picked
+  const loadEssay = async (essayId: number) => {
     if (!editor) return;
     
+    let essayContent: string;
+    try {
+      const response = await axios.get(`http://localhost:5000/api/essays/${essayId}`, {
+        params: { fields: 'essay_body' }
+      });
+      essayContent = response.data.essay_body || '';
+    } catch (error) {
+      console.error('Error loading essay:', error);
+      alert('Failed to load essay from database');
+      return;
+    }
+    
     // First clear all comments
     setComments([]);
     setActiveCommentId(null);
@@ -320,7 +360,7 @@ const Editor: React.FC = () => {
       const response = await axios.get('http://localhost:5000/api/student-progress');
       
       if (response.data && response.data.success) {
-        const { common_mistakes, improvements, pdf } = response.data;
+        const { common_mistakes, improvements, assignment } = response.data;
         
         // Store the progress data
         setStudentProgress({
@@ -328,8 +368,8 @@ const Editor: React.FC = () => {
           improvements
         });
         
-        // Store the PDF data
-        setAssignmentPdfBase64(pdf);
+        // The PDF is built in the background; its URL waits for it to finish
+        setAssignmentPdfUrl(assignment ? `http://localhost:5000${assignment.url}` : null);
       }
     } catch (error) {
       console.error('Error fetching student progress:', error);
@@ -341,7 +381,7 @@ const Editor: React.FC = () => {
 
   // Add a function to open the assignment PDF in a new tab
   const openAssignmentPdf = () => {
-    if (!assignmentPdfBase64) {
+    if (!assignmentPdfUrl) {
       alert('No assignment available. Please generate assignments first.');
       return;
     }
@@ -380,7 +420,7 @@ const Editor: React.FC = () => {
       <body>
         <div class="controls">
           <button onclick="document.getElementById('pdfObj').print()">Print Assignment</button>
-          <a href="data:application/pdf;base64,${assignmentPdfBase64}" download="writing_assignment.pdf">
+          <a href="${assignmentPdfUrl}" download="writing_assignment.pdf">
             <button>Download PDF</button>
           </a>
         </div>
@@ -388,12 +428,12 @@ const Editor: React.FC = () => {
         <div class="pdf-container">
           <object 
             id="pdfObj"
-            data="data:application/pdf;base64,${assignmentPdfBase64}" 
+            data="${assignmentPdfUrl}" 
             type="application/pdf" 
             width="100%" 
             height="100%">
             <p>It appears you don't have a PDF plugin for this browser. 
-            <a href="data:application/pdf;base64,${assignmentPdfBase64}">Click here to download the PDF file.</a></p>
+            <a href="${assignmentPdfUrl}">Click here to download the PDF file.</a></p>
           </object>
         </div>
       </body>
@@ -499,11 +539,11 @@ const Editor: React.FC = () => {
           </button>
                       {/* Generate / View Assignment */}
           <button
-            onClick={isLoadingProgress ? undefined : (assignmentPdfBase64 ? openAssignmentPdf : fetchStudentProgress)}
+            onClick={isLoadingProgress ? undefined : (assignmentPdfUrl ? openAssignmentPdf : fetchStudentProgress)}
             disabled={isLoadingProgress}
             className={`flex items-center gap-1 px-3 py-1 text-sm font-medium rounded transition-colors text-white
               ${
-                assignmentPdfBase64 
+                assignmentPdfUrl 
                 ? 'bg-green-600 hover:bg-green-700' 
                 : 'bg-orange-500 hover:bg-orange-600'
               }
@@ -515,7 +555,7 @@ const Editor: React.FC = () => {
                 <div className="animate-spin rounded-full h-4 w-4 border-b-2 border-white mr-1"></div>
                 Loading...
               </span>
-            ) : assignmentPdfBase64 ? (
+            ) : assignmentPdfUrl ? (
               <>
                 <FaEye className="w-4 h-4" />
                 View Assignment
@@ -628,7 +668,7 @@ const Editor: React.FC = () => {
                   Select an essay to load from your saved files:
                 </p>
                 
-                {isLoadingEssays ? (
+                {isLoadingEssays && essays.length === 0 ? (
                   <div className="flex items-center justify-center h-32">
                     <div className="animate-spin rounded-full h-8 w-8 border-b-2 border-blue-600"></div>
                   </div>
@@ -641,7 +681,7 @@ const Editor: React.FC = () => {
                     {essays.map((essay) => (
                       <button
                         key={essay.id}
-                        onClick={() => loadEssay(essay.essay_body)}
+                        onClick={() => loadEssay(essay.id)}
                         className="w-full px-4 py-3 text-left hover:bg-slate-100 flex items-center gap-3 transition-colors"
                       >
                         <FaFile className="text-blue-500" />
@@ -655,6 +695,14 @@ const Editor: React.FC = () => {
                         </div>
                       </button>
                     ))}
+                    {essaysCursor && (
+                      <button
+                        onClick={() => fetchEssays(essaysCursor)}
+                        className="w-full px-4 py-2 text-sm text-blue-600 hover:bg-slate-100 transition-colors"
+                      >
+                        Load more
+                      </button>
+                    )}
                   </div>
                 )}
               </div>
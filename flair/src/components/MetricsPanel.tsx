@@ -135,7 +135,8 @@ const MetricsPanel: React.FC<MetricsPanelProps> = ({
   
       try {
         console.log("Sending essay for analysis...");
-        const response = await fetch('http://localhost:5000/api/analyze-essay', {
+        // Scores come back as NDJSON, one line per category as soon as it is scored
+        const response = await fetch('http://localhost:5000/api/analyze-essay-stream', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
@@ -145,22 +146,42 @@ const MetricsPanel: React.FC<MetricsPanelProps> = ({
           }),
         });
   
-        if (!response.ok) {
+        if (!response.ok || !response.body) {
           const errorText = await response.text();
           throw new Error(`Analysis failed: ${errorText}`);
         }
   
-        const data = await response.json();
-        console.log("Received analysis:", data);
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        const scores: RubricScore[] = [];
+        let buffer = '';
+        let finished = false;
+        while (!finished) {
+          const { value, done } = await reader.read();
+          buffer += decoder.decode(value, { stream: !done });
+          const lines = buffer.split('\n');
+          buffer = done ? '' : lines.pop() ?? '';
+          for (const line of lines) {
+            if (!line.trim()) continue;
+            const message = JSON.parse(line);
+            if (message.type === 'score') {
+              scores.push(message.score);
+              // Show each category as it arrives instead of waiting for all of them
+              setAnalysis([...scores]);
+              setIsLoading(false);
+            } else if (message.type === 'error') {
+              throw new Error(message.error || 'Failed to analyze essay');
+            }
+          }
+          finished = done;
+        }
         
-        if (data.success && data.analysis) {
-          // Update analysis and notify parent
-          updateAnalysis(data.analysis);
-          
-          console.log("Analysis complete, sending to parent:", data.analysis);
-        } else {
-          throw new Error(data.error || 'Failed to analyze essay');
+        if (scores.length === 0) {
+          throw new Error('Failed to analyze essay');
         }
+        // Update analysis and notify parent
+        updateAnalysis(scores);
+        console.log("Analysis complete, sending to parent:", scores);
       } catch (err) {
         console.error('Error analyzing essay:', err);
         setError(err instanceof Error ? err.message : String(err));